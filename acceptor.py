@@ -0,0 +1,26 @@
+import argparse
+
+from app.acceptor.sim_acceptor import (SimAcceptorSession)
+from app.utils.backends import (STORE_BACKENDS, LOG_BACKENDS)
+
+def main():
+	parser = argparse.ArgumentParser(description='Simulated FIX acceptor')
+	parser.add_argument('-cfg', '--config', type=str, default='config/acceptor_local.cfg', help='Configuration filename')
+	parser.add_argument('--fill-prob', type=float, default=0.5, help='Chance of outside liquidity filling an order on arrival and per liquidity tick')
+	parser.add_argument('--fill-all', action='store_true', help='Outside liquidity fills the whole remaining quantity instead of a random part')
+	parser.add_argument('--reject-prob', type=float, default=0.0, help='Chance of rejecting a valid new order')
+	parser.add_argument('--latency-ms', type=float, default=0.0, help='Latency added before each report is sent')
+	parser.add_argument('--jitter-ms', type=float, default=0.0, help='Up to this much extra random latency per report')
+	parser.add_argument('--max-rate', type=float, default=0.0, help='Maximum reports sent per second, 0 for unlimited')
+	parser.add_argument('--liquidity-interval', type=float, default=0.5, help='Seconds between outside liquidity ticks on resting orders')
+	parser.add_argument('--duration', type=float, default=0.0, help='Seconds to run for, 0 to run until interrupted')
+	parser.add_argument('--store', choices=STORE_BACKENDS, default=None, help='Message store backend, overrides StoreBackend in the configuration (default file)')
+	parser.add_argument('--log-backend', choices=LOG_BACKENDS, default=None, help='FIX message log backend, overrides LogBackend in the configuration (default file)')
+	parser.add_argument('--seed', type=int, default=None, help='Seed for fills, rejects and latency jitter')
+	args = parser.parse_args()
+
+	session = SimAcceptorSession(args)
+	session.start()
+
+if __name__ == "__main__":
+	main()
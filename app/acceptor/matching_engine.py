@@ -0,0 +1,343 @@
+import bisect
+import random
+import threading
+from collections import deque
+
+import quickfix as fix
+
+
+_buy_sides = (fix.Side_BUY,)
+_sell_sides = (fix.Side_SELL, fix.Side_SELL_SHORT)
+
+
+class ExecutionEvent:
+	"""
+	Order state change produced by the matching engine, to be sent as an
+	execution report (or an order cancel reject if cancel_reject is set)
+
+	Attributes  
+	order: BookOrder - Order the event applies to, after the change  
+	exec_type: str - Tag 150  
+	ord_status: str - Tag 39  
+	last_qty: float, default=0 - Tag 32  
+	last_px: float, default=0.0 - Tag 31  
+	cl_ord_id: str, default=None - Tag 11 when it differs from the order's, e.g. the cancel request id  
+	orig_cl_ord_id: str, default=None - Tag 41  
+	text: str, default=None - Tag 58  
+	cancel_reject: bool, default=False - Send as OrderCancelReject  
+
+	The order's cumulative quantity, leaves quantity and average price are
+	captured when the event is created, as the order keeps changing
+	"""
+	__slots__ = ("order", "exec_type", "ord_status", "last_qty", "last_px",
+				 "cl_ord_id", "orig_cl_ord_id", "text", "cancel_reject",
+				 "cum_qty", "leaves_qty", "avg_px")
+
+	def __init__(self, order, exec_type, ord_status, last_qty=0, last_px=0.0,
+				 cl_ord_id=None, orig_cl_ord_id=None, text=None, cancel_reject=False):
+		self.order = order
+		self.exec_type = exec_type
+		self.ord_status = ord_status
+		self.last_qty = last_qty
+		self.last_px = last_px
+		self.cl_ord_id = cl_ord_id
+		self.orig_cl_ord_id = orig_cl_ord_id
+		self.text = text
+		self.cancel_reject = cancel_reject
+
+		self.cum_qty = order.cum_qty
+		self.avg_px = order.avg_px
+		if ord_status in (fix.OrdStatus_CANCELED, fix.OrdStatus_REJECTED):
+			self.leaves_qty = 0
+		else:
+			self.leaves_qty = order.leaves_qty
+
+
+class BookOrder:
+	"""
+	Order held by the matching engine
+
+	Attributes  
+	order_id: str - Tag 37 assigned by the engine  
+	cl_ord_id: str - Tag 11  
+	session: object - Session the order arrived on, reports are sent back to it  
+	symbol: str - Tag 55  
+	side: str - Tag 54  
+	ord_type: str - Tag 40  
+	qty: float - Tag 38  
+	price: float - Tag 44, 0.0 for market orders  
+	"""
+	__slots__ = ("order_id", "cl_ord_id", "session", "symbol", "side", "ord_type",
+				 "qty", "price", "cum_qty", "notional", "ord_status")
+
+	def __init__(self, order_id, cl_ord_id, session, symbol, side, ord_type, qty, price):
+		self.order_id = order_id
+		self.cl_ord_id = cl_ord_id
+		self.session = session
+		self.symbol = symbol
+		self.side = side
+		self.ord_type = ord_type
+		self.qty = qty
+		self.price = price
+		self.cum_qty = 0
+		self.notional = 0.0
+		self.ord_status = fix.OrdStatus_NEW
+
+	@property
+	def leaves_qty(self):
+		return self.qty - self.cum_qty
+
+	@property
+	def avg_px(self):
+		return self.notional / self.cum_qty if self.cum_qty else 0.0
+
+	def fill(self, qty, price):
+		self.cum_qty += qty
+		self.notional += qty * price
+		self.ord_status = fix.OrdStatus_FILLED if self.leaves_qty <= 0 else fix.OrdStatus_PARTIALLY_FILLED
+
+	def fill_event(self, qty, price):
+		# Apply a fill and describe it as an execution event
+		self.fill(qty, price)
+		exec_type = fix.ExecType_FILL if self.ord_status == fix.OrdStatus_FILLED else fix.ExecType_PARTIAL_FILL
+		return ExecutionEvent(self, exec_type, self.ord_status, qty, price)
+
+
+class _BookSide:
+	"""
+	One side of an order book as price levels of FIFO queues, with the
+	level prices kept sorted for best price lookup
+	"""
+	def __init__(self, is_bid):
+		self.is_bid = is_bid
+		self.prices = []		# ascending
+		self.levels = {}		# {price: deque[BookOrder]}
+
+	def __bool__(self):
+		return bool(self.prices)
+
+	def best_price(self):
+		return self.prices[-1] if self.is_bid else self.prices[0]
+
+	def best_queue(self):
+		return self.levels[self.best_price()]
+
+	def add(self, order):
+		level = self.levels.get(order.price)
+		if level is None:
+			level = self.levels[order.price] = deque()
+			bisect.insort(self.prices, order.price)
+		level.append(order)
+
+	def remove(self, order):
+		level = self.levels[order.price]
+		level.remove(order)
+		if not level:
+			self._drop_level(order.price)
+
+	def pop_best(self):
+		price = self.best_price()
+		level = self.levels[price]
+		order = level.popleft()
+		if not level:
+			self._drop_level(price)
+		return order
+
+	def _drop_level(self, price):
+		del self.levels[price]
+		del self.prices[bisect.bisect_left(self.prices, price)]
+
+	def crosses(self, order):
+		# Whether an incoming order of the opposite side can trade against the best level
+		if not self.prices:
+			return False
+		if order.ord_type == fix.OrdType_MARKET:
+			return True
+		best = self.best_price()
+		return best >= order.price if self.is_bid else best <= order.price
+
+	def __iter__(self):
+		for price in self.prices:
+			yield from self.levels[price]
+
+
+class OrderBook:
+	"""
+	Price-time priority limit order book for one symbol
+
+	Attributes  
+	symbol: str  
+	"""
+	def __init__(self, symbol):
+		self.symbol = symbol
+		self.bids = _BookSide(is_bid=True)
+		self.asks = _BookSide(is_bid=False)
+		self.last_px = None
+
+	def _sides_for(self, order):
+		# (own side, contra side)
+		if order.side in _buy_sides:
+			return self.bids, self.asks
+		return self.asks, self.bids
+
+	def match(self, order):
+		"""
+		Match an incoming order against resting contra orders, best price
+		first and oldest first within a price. Trades at the resting price
+
+		:param order: BookOrder
+		Returns a list of ExecutionEvent for both sides of every trade
+		"""
+		events = []
+		_, contra = self._sides_for(order)
+		while order.leaves_qty > 0 and contra.crosses(order):
+			resting = contra.best_queue()[0]
+			qty = min(order.leaves_qty, resting.leaves_qty)
+			price = resting.price
+			events.append(resting.fill_event(qty, price))
+			events.append(order.fill_event(qty, price))
+			if resting.leaves_qty <= 0:
+				contra.pop_best()
+			self.last_px = price
+		return events
+
+	def rest(self, order):
+		own, _ = self._sides_for(order)
+		own.add(order)
+
+	def remove(self, order):
+		own, _ = self._sides_for(order)
+		own.remove(order)
+
+	def resting_orders(self):
+		return list(self.bids) + list(self.asks)
+
+
+class MatchingEngine:
+	"""
+	Matching engine of the simulated acceptor. Client orders first match
+	against each other in price-time priority. Whatever is left can then
+	be filled by simulated outside liquidity with a configurable probability,
+	so a single client still sees partial fills and fills
+
+	Attributes  
+	fill_probability: float, default=0.5 - Chance of outside liquidity filling an order on arrival and on every liquidity tick  
+	reject_probability: float, default=0.0 - Chance of rejecting a valid new order  
+	fill_all: bool, default=False - Outside liquidity fills the whole remaining quantity instead of a random part  
+	reference_prices: dict{symbol: float}, default=None - Price for market orders before a symbol has traded  
+	seed: int, default=None - Seed of the engine's random number generator  
+	"""
+	def __init__(self, fill_probability=0.5, reject_probability=0.0, fill_all=False, reference_prices=None, seed=None):
+		self.fill_probability = fill_probability
+		self.reject_probability = reject_probability
+		self.fill_all = fill_all
+		self.reference_prices = reference_prices or {}
+		self.books = {}		# {symbol: OrderBook}
+		self.orders = {}	# {cl_ord_id: BookOrder} for open orders
+		self._rng = random.Random(seed)
+		self._order_seq = 0
+		# quickfix callbacks and the liquidity ticker both drive the engine
+		self._lock = threading.Lock()
+
+	def _book(self, symbol):
+		book = self.books.get(symbol)
+		if book is None:
+			book = self.books[symbol] = OrderBook(symbol)
+		return book
+
+	def _reference_price(self, book):
+		if book.last_px is not None:
+			return book.last_px
+		if book.symbol not in self.reference_prices:
+			self.reference_prices[book.symbol] = round(self._rng.uniform(10, 500), 2)
+		return self.reference_prices[book.symbol]
+
+	def _outside_fill(self, book, order):
+		# Simulated counterparty fills some or all of the remaining quantity
+		leaves = order.leaves_qty
+		qty = leaves if (self.fill_all or leaves <= 1) else self._rng.randint(1, int(leaves))
+		price = order.price if order.ord_type == fix.OrdType_LIMIT else self._reference_price(book)
+		book.last_px = price
+		return order.fill_event(qty, price)
+
+	def new_order(self, session, cl_ord_id, symbol, side, ord_type, qty, price):
+		"""
+		Accept, match or reject a NewOrderSingle
+
+		Returns a list of ExecutionEvent
+		"""
+		with self._lock:
+			self._order_seq += 1
+			order = BookOrder("SIM-{}".format(self._order_seq), cl_ord_id, session,
+							  symbol, side, ord_type, qty, price if ord_type == fix.OrdType_LIMIT else 0.0)
+
+			text = None
+			if cl_ord_id in self.orders:
+				text = "Duplicate ClOrdID"
+			elif side not in _buy_sides + _sell_sides:
+				text = "Unsupported side"
+			elif ord_type not in (fix.OrdType_LIMIT, fix.OrdType_MARKET):
+				text = "Unsupported order type"
+			elif qty <= 0:
+				text = "Invalid order quantity"
+			elif ord_type == fix.OrdType_LIMIT and price <= 0:
+				text = "Invalid limit price"
+			elif self._rng.random() < self.reject_probability:
+				text = "Simulated reject"
+			if text is not None:
+				order.ord_status = fix.OrdStatus_REJECTED
+				return [ExecutionEvent(order, fix.ExecType_REJECTED, fix.OrdStatus_REJECTED, text=text)]
+
+			book = self._book(symbol)
+			events = [ExecutionEvent(order, fix.ExecType_NEW, fix.OrdStatus_NEW)]
+			events.extend(book.match(order))
+			for event in events:
+				if event.order is not order and event.order.leaves_qty <= 0:
+					del self.orders[event.order.cl_ord_id]
+
+			if order.leaves_qty > 0:
+				if order.ord_type == fix.OrdType_MARKET:
+					# Market orders always complete against outside liquidity
+					while order.leaves_qty > 0:
+						events.append(self._outside_fill(book, order))
+				elif self._rng.random() < self.fill_probability:
+					events.append(self._outside_fill(book, order))
+			if order.leaves_qty > 0:
+				book.rest(order)
+				self.orders[cl_ord_id] = order
+			return events
+
+	def cancel_order(self, session, cl_ord_id, orig_cl_ord_id):
+		"""
+		Cancel an open order
+
+		Returns a list holding a CANCELED ExecutionEvent or a cancel reject
+		"""
+		with self._lock:
+			order = self.orders.pop(orig_cl_ord_id, None)
+			if order is None:
+				unknown = BookOrder("NONE", orig_cl_ord_id, session, None, None, None, 0, 0.0)
+				unknown.ord_status = fix.OrdStatus_REJECTED
+				return [ExecutionEvent(unknown, None, fix.OrdStatus_REJECTED, cl_ord_id=cl_ord_id,
+									   orig_cl_ord_id=orig_cl_ord_id, text="Unknown order", cancel_reject=True)]
+			self.books[order.symbol].remove(order)
+			order.ord_status = fix.OrdStatus_CANCELED
+			return [ExecutionEvent(order, fix.ExecType_CANCELED, fix.OrdStatus_CANCELED,
+								   cl_ord_id=cl_ord_id, orig_cl_ord_id=orig_cl_ord_id)]
+
+	def liquidity_tick(self):
+		"""
+		Give every resting order a fill_probability chance of a fill from outside liquidity
+
+		Returns a list of ExecutionEvent
+		"""
+		events = []
+		with self._lock:
+			for book in self.books.values():
+				for order in book.resting_orders():
+					if self._rng.random() < self.fill_probability:
+						events.append(self._outside_fill(book, order))
+						if order.leaves_qty <= 0:
+							book.remove(order)
+							del self.orders[order.cl_ord_id]
+		return events
@@ -0,0 +1,266 @@
+import time
+import random
+import threading
+from collections import deque
+
+import quickfix as fix
+
+from app.acceptor.matching_engine import (MatchingEngine)
+from app.client.msg_templates import (format_decimal)
+from app.utils.logger import (log)
+from app.utils.backends import (create_connector)
+
+
+class ReportDispatcher:
+	"""
+	Sends outbound acceptor messages from a background thread, after an
+	injected latency and no faster than a configured message rate. The
+	rate is capped from the time of the previous send, so messages queued
+	while idle are not sent as a burst
+
+	Attributes  
+	latency: float, default=0.0 - Seconds added before each message is sent  
+	jitter: float, default=0.0 - Up to this many extra seconds, drawn uniformly per message  
+	max_rate: float, default=0.0 - Maximum messages per second, 0 for unlimited  
+	seed: int, default=None  
+	"""
+	def __init__(self, latency=0.0, jitter=0.0, max_rate=0.0, seed=None):
+		self.latency = latency
+		self.jitter = jitter
+		self.max_rate = max_rate
+		self.sent = 0
+
+		self._rng = random.Random(seed)
+		self._queue = deque()		# (due time, message, session), due times never decrease
+		self._last_due = 0.0
+		self._lock = threading.Lock()
+		self._wakeup = threading.Event()
+		self._running = False
+		self._thread = None
+
+	def submit(self, message, session):
+		"""
+		Queue a message for sending to a session
+
+		:param message: fix.Message
+		:param session: fix.SessionID
+		"""
+		with self._lock:
+			due = time.perf_counter() + self.latency
+			if self.jitter:
+				due += self._rng.uniform(0.0, self.jitter)
+			# Keep reports in order even when the jitter of a later one is smaller
+			due = max(due, self._last_due)
+			self._last_due = due
+			self._queue.append((due, message, session))
+		self._wakeup.set()
+
+	def start(self):
+		self._running = True
+		self._thread = threading.Thread(target=self._run, name="report-dispatcher", daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		self._running = False
+		self._wakeup.set()
+		if self._thread is not None:
+			self._thread.join()
+
+	def _run(self):
+		interval = 1.0 / self.max_rate if self.max_rate else 0.0
+		next_send = 0.0
+		while self._running:
+			if not self._queue:
+				self._wakeup.wait(0.1)
+				self._wakeup.clear()
+				continue
+			due, message, session = self._queue[0]
+			remaining = max(due, next_send) - time.perf_counter()
+			if remaining > 0:
+				time.sleep(remaining)
+			self._queue.popleft()
+			next_send = time.perf_counter() + interval
+			try:
+				fix.Session.sendToTarget(message, session)
+				self.sent += 1
+			except fix.SessionNotFound:
+				log.warning("SIM: Session {} not found for report", session)
+
+
+class SimAcceptor(fix.Application):
+	"""
+	FIX 4.2 acceptor application which simulates an exchange for local
+	testing of FixClient. NewOrderSingle and OrderCancelRequest messages
+	are handled by a MatchingEngine and answered with execution reports
+	and order cancel rejects
+
+	Attributes  
+	engine: MatchingEngine  
+	dispatcher: ReportDispatcher  
+	"""
+	_cl_ord_id_field = fix.ClOrdID().getField()				# Tag 11
+	_orig_cl_ord_id_field = fix.OrigClOrdID().getField()	# Tag 41
+	_symbol_field = fix.Symbol().getField()					# Tag 55
+	_side_field = fix.Side().getField()						# Tag 54
+	_ord_type_field = fix.OrdType().getField()				# Tag 40
+	_qty_field = fix.OrderQty().getField()					# Tag 38
+	_price_field = fix.Price().getField()					# Tag 44
+	_msg_typ_field = fix.MsgType().getField()				# Tag 35
+
+	def __init__(self, engine, dispatcher):
+		super().__init__()
+		self.engine = engine
+		self.dispatcher = dispatcher
+		self.received = 0
+		self._exec_seq = 0
+		# Held from matching to queueing, so ExecIDs are unique and reports are queued in engine order
+		self._lock = threading.Lock()
+
+	def onCreate(self, sessionID):
+		return
+
+	def onLogon(self, sessionID):
+		log.info("SIM LOGON: {}", sessionID)
+		return
+
+	def onLogout(self, sessionID):
+		log.info("SIM LOGOUT: {}", sessionID)
+		return
+
+	def toAdmin(self, message, sessionID):
+		return
+
+	def fromAdmin(self, message, sessionID):
+		return
+
+	def toApp(self, message, sessionID):
+		return
+
+	def fromApp(self, message, sessionID):
+		self.received += 1
+		msg_typ = message.getHeader().getField(self._msg_typ_field)
+		if msg_typ == fix.MsgType_NewOrderSingle:
+			price = float(message.getField(self._price_field)) if message.isSetField(self._price_field) else 0.0
+			with self._lock:
+				self.dispatch(self.engine.new_order(sessionID,
+													message.getField(self._cl_ord_id_field),
+													message.getField(self._symbol_field),
+													message.getField(self._side_field),
+													message.getField(self._ord_type_field),
+													float(message.getField(self._qty_field)),
+													price))
+		elif msg_typ == fix.MsgType_OrderCancelRequest:
+			with self._lock:
+				self.dispatch(self.engine.cancel_order(sessionID,
+													   message.getField(self._cl_ord_id_field),
+													   message.getField(self._orig_cl_ord_id_field)))
+		else:
+			log.warning("SIM: Not Implemented (Msg Type) - {}", msg_typ)
+
+	def liquidity_tick(self):
+		"""
+		Fill resting orders from outside liquidity and queue their reports
+		"""
+		with self._lock:
+			self.dispatch(self.engine.liquidity_tick())
+
+	def dispatch(self, events):
+		"""
+		Encode engine events and queue them for sending, with the lock held
+
+		:param events: list[ExecutionEvent]
+		"""
+		for event in events:
+			if event.cancel_reject:
+				message = self._order_cancel_reject(event)
+			else:
+				message = self._execution_report(event)
+			self.dispatcher.submit(message, event.order.session)
+
+	def _execution_report(self, event):
+		order = event.order
+		self._exec_seq += 1
+		message = fix.Message()
+		message.getHeader().setField(fix.MsgType(fix.MsgType_ExecutionReport))
+		message.setField(fix.OrderID(order.order_id))
+		message.setField(fix.ExecID("EXEC-{}".format(self._exec_seq)))
+		message.setField(fix.ExecTransType(fix.ExecTransType_NEW))
+		message.setField(fix.ExecType(event.exec_type))
+		message.setField(fix.OrdStatus(event.ord_status))
+		message.setField(fix.ClOrdID(event.cl_ord_id or order.cl_ord_id))
+		if event.orig_cl_ord_id:
+			message.setField(fix.OrigClOrdID(event.orig_cl_ord_id))
+		message.setField(fix.Symbol(order.symbol))
+		message.setField(fix.Side(order.side))
+		message.setField(fix.OrdType(order.ord_type))
+		message.setField(self._qty_field, format_decimal(order.qty))
+		if order.ord_type == fix.OrdType_LIMIT:
+			message.setField(self._price_field, format_decimal(order.price))
+		message.setField(fix.LastShares().getField(), format_decimal(event.last_qty))
+		message.setField(fix.LastPx().getField(), format_decimal(event.last_px))
+		message.setField(fix.LeavesQty().getField(), format_decimal(event.leaves_qty))
+		message.setField(fix.CumQty().getField(), format_decimal(event.cum_qty))
+		message.setField(fix.AvgPx().getField(), format_decimal(event.avg_px))
+		if event.text:
+			message.setField(fix.Text(event.text))
+		return message
+
+	def _order_cancel_reject(self, event):
+		message = fix.Message()
+		message.getHeader().setField(fix.MsgType(fix.MsgType_OrderCancelReject))
+		message.setField(fix.OrderID(event.order.order_id))
+		message.setField(fix.ClOrdID(event.cl_ord_id))
+		message.setField(fix.OrigClOrdID(event.orig_cl_ord_id))
+		message.setField(fix.OrdStatus(event.ord_status))
+		message.setField(fix.CxlRejResponseTo(fix.CxlRejResponseTo_ORDER_CANCEL_REQUEST))
+		message.setField(fix.CxlRejReason(fix.CxlRejReason_UNKNOWN_ORDER))
+		if event.text:
+			message.setField(fix.Text(event.text))
+		return message
+
+
+class SimAcceptorSession:
+	"""
+	Runs the simulated acceptor until interrupted or the duration elapses
+
+	Attributes  
+	args: argparse.Namespace - Parsed acceptor.py arguments  
+	"""
+	def __init__(self, args):
+		self.args = args
+		self.settings = fix.SessionSettings(args.config)
+		self.engine = MatchingEngine(fill_probability=args.fill_prob,
+									 reject_probability=args.reject_prob,
+									 fill_all=args.fill_all,
+									 seed=args.seed)
+		self.dispatcher = ReportDispatcher(latency=args.latency_ms / 1e3,
+										   jitter=args.jitter_ms / 1e3,
+										   max_rate=args.max_rate,
+										   seed=args.seed)
+		self.application = SimAcceptor(self.engine, self.dispatcher)
+		self.acceptor, self.storeFactory, self.logFactory = create_connector(fix.SocketAcceptor,
+																			 self.application,
+																			 self.settings,
+																			 args.store,
+																			 args.log_backend)
+
+	def start(self):
+		"""
+		Start accepting connections
+		"""
+		self.dispatcher.start()
+		self.acceptor.start()
+		log.info("SIM: Accepting connections, fill probability {}, latency {} ms",
+				 self.args.fill_prob, self.args.latency_ms)
+		started = time.time()
+		try:
+			while not self.args.duration or time.time() - started < self.args.duration:
+				time.sleep(self.args.liquidity_interval)
+				self.application.liquidity_tick()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			self.acceptor.stop()
+			self.dispatcher.stop()
+			log.info("SIM: Received {} and sent {} application messages", self.application.received, self.dispatcher.sent)
+			log.stop()
@@ -1,18 +1,29 @@
+import time
 import quickfix as fix
 import quickfix42 as fix42
-import datetime as dt
 
-from app.utils.tools import (unicode_fix, extract_tag_value_pair_from)
+from app.utils.tools import (extract_fields_from_raw)
+from app.utils.logger import (log)
 from app.common.interface_order import (OrderUpdateEvent, Trade)
+from app.utils.timestamps import (FixTimestamp, format_fix_timestamp)
+from app.client.msg_templates import (NewOrderTemplate, CancelTemplate)
+from app.client.session_router import (SessionRouter, ROUTE_HASH)
+from app.common.risk import (PreTradeReject)
 
 class FixClient(fix.Application):
 	"""
-	FIX initiator client for connecting with the FIX server to send buy and cancel orders
+	FIX initiator client for connecting with the FIX server to send buy and cancel orders.
+	Orders are spread over every logged on session by the session router
+
+	Attributes  
+	route: str, default="hash" - Routing of new orders across sessions, "hash" (by ticker) or "round_robin"  
 	"""
 
 	orderID = 0
-	curr_sess = None
-	app_event_callbacks = {"add": None, "remove": None, "update": None}
+	app_event_callbacks = {"add": None, "remove": None, "update": None, "add_batch": None}
+	latency = None			# LatencyTracker, stamps sent orders when set
+	risk = None				# PositionEngine, checks new orders against limits before sending when set
+	metrics = None			# FixMetrics, counts messages by MsgType when set
 
 	_msg_typ_field = fix.MsgType().getField()				# Tag 35 - fromApp
 	_ord_status_field = fix.OrdStatus().getField()			# Tag 39 - fromApp
@@ -27,110 +38,135 @@ class FixClient(fix.Application):
 	_msg_field = fix.Text().getField()						# Tag 58 - _handle_reject/_handle_order_cancel_reject
 	_orig_clorid_field = fix.OrigClOrdID().getField()		# Tag 41 - _handle_order_cancel_reject
 	_transact_time_field = fix.TransactTime().getField()	# Tag 60 - sendNewOrder/cancelOrder
-	
+
+	# Only the tags read by the handlers are decoded from inbound messages
+	_msg_typ_tags = (_msg_typ_field,)
+	_exec_report_tags = (_ord_status_field, _id_field, _orig_clorid_field, _symbol_field, _side_field,
+						 _last_filled_qty_field, _last_filled_price_field, _sending_time_field)
+	_reject_tags = (_msg_field,)
+	_order_cancel_reject_tags = (_id_field, _msg_field, _orig_clorid_field)
+
+	# Outbound messages are copied from prototypes holding the static fields
+	_new_order_template = NewOrderTemplate()
+	_cancel_template = CancelTemplate()
+
+	def __init__(self, route=ROUTE_HASH):
+		super().__init__()
+		self.router = SessionRouter(route)
 
 	def onCreate(self, sessionID):
 		return
 
 	def onLogon(self, sessionID):
-		self.curr_sess = sessionID
-		print("LOGON: {}".format(sessionID))
+		self.router.add_session(sessionID)
+		log.info("LOGON: {}", sessionID)
 		return
 
 	def onLogout(self, sessionID):
-		print("LOGOUT: {}".format(sessionID))
+		self.router.remove_session(sessionID)
+		log.info("LOGOUT: {}", sessionID)
 		return
 
 	def toAdmin(self, message, sessionID):
+		if self.metrics is not None:
+			self.metrics.on_send(message.getHeader().getField(self._msg_typ_field))
 		return
 
 	def toApp(self, message, sessionID):
-		fix_str = unicode_fix(str(message))
-		print("TOAPP: {}".format(fix_str))
+		log.log_message("TOAPP", message)
+		if self.metrics is not None:
+			self.metrics.on_send(message.getHeader().getField(self._msg_typ_field))
 		return
 
 	def fromAdmin(self, message, sessionID):
-		fix_str = unicode_fix(str(message))
-		print("ADMIN: {}".format(fix_str))
+		log.log_message("ADMIN", message)
+		if self.metrics is not None:
+			self.metrics.on_receive(message.getHeader().getField(self._msg_typ_field))
 		return
 
 	def fromApp(self, message, sessionID):
 		source = "FROM APP"
-		fix_str = unicode_fix(str(message))
-		print("{}: {}".format(source, fix_str))
+		# One copy of the message out of quickfix, shared by the log record and the decoder
+		raw = message.toString()
+		log.log_message(source, message, raw=raw)
 
-		msg_typ = message.getHeader().getField(self._msg_typ_field)
+		msg_typ = extract_fields_from_raw(raw, self._msg_typ_tags).get(self._msg_typ_field)
+		if self.metrics is not None:
+			self.metrics.on_receive(msg_typ)
 
 		if msg_typ == fix.MsgType_ExecutionReport:
-			ord_status = message.getField(self._ord_status_field)
-			self._handle_exec_report(ord_status, fix_str, source)
+			tags = extract_fields_from_raw(raw, self._exec_report_tags)
+			self._handle_exec_report(tags.get(self._ord_status_field), tags, source)
 		elif msg_typ == fix.MsgType_Reject:
-			self._handle_reject(fix_str, source)
+			tags = extract_fields_from_raw(raw, self._reject_tags)
+			self._handle_reject(tags, source)
 		elif msg_typ == fix.MsgType_OrderCancelReject:
-			self._handle_order_cancel_reject(fix_str, source)
+			tags = extract_fields_from_raw(raw, self._order_cancel_reject_tags)
+			self._handle_order_cancel_reject(tags, source)
 		else:
-			print("{}: Not Implemented (Msg Type) - {}".format(source, msg_typ))
+			log.warning("{}: Not Implemented (Msg Type) - {}", source, msg_typ)
 			return NotImplemented
 		return
 
 
 	def _genOrderID(self):
 		self.orderID += 1
-		timestamp = dt.datetime.timestamp(dt.datetime.utcnow())
-		return str(self.orderID) + "-" + str(timestamp)
+		return "{}-{}".format(self.orderID, time.time_ns())
 
 
-	def _handle_exec_report(self, ord_status, msg, source):
+	def _handle_exec_report(self, ord_status, tags, source):
 		# Handle execution reports from the FIX server
-		tags = extract_tag_value_pair_from(msg)
-
+		# tags: dict{tag: value} holding only the decoded _exec_report_tags
 		_id = tags.get(self._id_field, None)
+		if self.metrics is not None:
+			self.metrics.on_exec_report(ord_status)
+		if self.latency is not None:
+			self.latency.on_exec_report(_id, ord_status, tags.get(self._orig_clorid_field))
+		if ord_status == fix.OrdStatus_CANCELED:
+			# Cancels may be acknowledged under the cancel request's ClOrdID, with the order in OrigClOrdID
+			_id = tags.get(self._orig_clorid_field, _id)
 		_timestamp = tags.get(self._sending_time_field, None)
+		if _timestamp is not None:
+			# Parsed once here, merges and comparisons downstream are integer operations
+			_timestamp = FixTimestamp.from_fix(_timestamp)
 		_ticker = tags.get(self._symbol_field, None)
 		_side = tags.get(self._side_field, None)
-		_qty = tags.get(self._last_filled_qty_field, 0)
-		_price = tags.get(self._last_filled_price_field, 0.0)
-
-		trade = Trade(_id, _timestamp, _ticker, _side, float(_qty), float(_price))
-		order_event = OrderUpdateEvent(ordId=_id, timestamp=_timestamp, qty=float(_qty), price=float(_price),
-									   status=ord_status, ticker=_ticker, side=_side)
+		_qty = float(tags.get(self._last_filled_qty_field, 0))
+		_price = float(tags.get(self._last_filled_price_field, 0.0))
 
+		# Only build the objects the order status requires, trades only exist for fills
 		if ord_status == fix.OrdStatus_NEW:
-			self.app_event_callbacks["update"](order_event)
+			self.app_event_callbacks["update"](OrderUpdateEvent(_id, _timestamp, _qty, _price, ord_status, _ticker, _side))
 		elif ord_status == fix.OrdStatus_PARTIALLY_FILLED:
-			self.app_event_callbacks["add"](trade)
-			self.app_event_callbacks["update"](order_event)
+			self.app_event_callbacks["add"](Trade(_id, _timestamp, _ticker, _side, _qty, _price))
+			self.app_event_callbacks["update"](OrderUpdateEvent(_id, _timestamp, _qty, _price, ord_status, _ticker, _side))
 		elif (ord_status == fix.OrdStatus_FILLED):
-			self.app_event_callbacks["add"](trade)
-			self.app_event_callbacks["remove"](order_event)
+			self.router.release(_id)
+			self.app_event_callbacks["add"](Trade(_id, _timestamp, _ticker, _side, _qty, _price))
+			self.app_event_callbacks["remove"](OrderUpdateEvent(_id, _timestamp, _qty, _price, ord_status, _ticker, _side))
 		elif ord_status == fix.OrdStatus_REJECTED:
-			self.app_event_callbacks["remove"](order_event)
+			self.router.release(_id)
+			self.app_event_callbacks["remove"](OrderUpdateEvent(_id, _timestamp, _qty, _price, ord_status, _ticker, _side))
 		elif ord_status == fix.OrdStatus_CANCELED:
-			self.app_event_callbacks["remove"](order_event)
+			self.router.release(_id)
+			self.app_event_callbacks["remove"](OrderUpdateEvent(_id, _timestamp, _qty, _price, ord_status, _ticker, _side))
 		else:
-			print("{}: Not Implemented (Order Status) - {}".format(source, ord_status))
+			log.warning("{}: Not Implemented (Order Status) - {}", source, ord_status)
 			return NotImplemented
 
-	def _handle_reject(self, msg, source):
+	def _handle_reject(self, tags, source):
 		# Handle rejection reports from the FIX server
-		tags = extract_tag_value_pair_from(msg)
 		reject_msg = tags.get(self._msg_field, "Nil")
-		print("{}: Reject - {}".format(source, reject_msg))
+		log.warning("{}: Reject - {}", source, reject_msg)
 
 
-	def _handle_order_cancel_reject(self, msg, source):
+	def _handle_order_cancel_reject(self, tags, source):
 		# Handle order cancel rejection reports from the FIX server
-		tags = extract_tag_value_pair_from(msg)
 		reject_msg = tags.get(self._msg_field, "Nil")
 		reject_order = tags.get(self._orig_clorid_field, None)
-		print("{}: Order ({}) Cancel Rejected - {}".format(source, reject_order, reject_msg))
-
-
-	def _newMsg(self):
-		# Initialise a new FIX message
-		order_msg = fix.Message()
-		order_msg.getHeader().setField(fix.BeginString())
-		return order_msg
+		if self.latency is not None:
+			self.latency.on_cancel_reject(tags.get(self._id_field), reject_order)
+		log.warning("{}: Order ({}) Cancel Rejected - {}", source, reject_order, reject_msg)
 
 
 	def sendNewOrder(self, order_req):
@@ -139,54 +175,128 @@ class FixClient(fix.Application):
 		
 		:param order_req: Order
 		'''
-		_ticker = order_req.ticker
-		_side = order_req.side
-		_order_type = order_req.ordtyp
-		_qty = order_req.qty
-		_security = order_req.security
-		_price = order_req.price
-
-		order_msg = self._newMsg()
-		order_msg.getHeader().setField(fix.MsgType(fix.MsgType_NewOrderSingle))
-
-		# Set content
 		new_id = self._genOrderID()
 		order_req.id = new_id
-		order_msg.setField(fix.ClOrdID(new_id))
-		order_msg.setField(fix.TimeInForce(fix.TimeInForce_GOOD_TILL_CANCEL))
-		order_msg.setField(fix.SecurityType(_security))
-		order_msg.setField(fix.Symbol(_ticker))
-		order_msg.setField(fix.Side(_side))
-		order_msg.setField(fix.OrdType(_order_type))
-		order_msg.setField(fix.Price(_price))
-		order_msg.setField(fix.OrderQty(_qty))
-		order_msg.setField(fix.HandlInst(fix.HandlInst_AUTOMATED_EXECUTION_ORDER_PRIVATE_NO_BROKER_INTERVENTION))
-		order_msg.setField(fix.StringField(self._transact_time_field,(dt.datetime.utcnow().strftime("%Y%m%d-%H:%M:%S.%f"))[:-3]))
-
+		session = self.router.route(order_req.ticker)
+		if session is None:
+			# Nothing reserved, registered or bound yet
+			log.warning("Unable to send Order {} ({}) - no session logged on", new_id, order_req.ticker)
+			return
+		if self.risk is not None:
+			reason = self.risk.check(order_req)
+			if reason is not None:
+				log.warning("Order {} ({}) rejected by pre-trade check - {}", new_id, order_req.ticker, reason)
+				return
+		order_msg = self._new_order_template.encode(order_req, new_id, format_fix_timestamp(time.time_ns()))
+
+		# Registered, stamped and bound before sending, the first report can arrive before sendToTarget returns
+		self.router.bind(new_id, session)
+		self.app_event_callbacks["add"](order_req)
+		if self.latency is not None:
+			self.latency.on_send(new_id, order_req.ticker)
 		try:
-			fix.Session.sendToTarget(order_msg, self.curr_sess)
-			self.app_event_callbacks["add"](order_req)
-		except fix.SessionNotFound as e:
+			fix.Session.sendToTarget(order_msg, session)
+		except (fix.SessionNotFound, ValueError) as e:
+			self.router.release(new_id)
+			self.app_event_callbacks["remove"](OrderUpdateEvent(new_id, ticker=order_req.ticker))
+			if self.latency is not None:
+				self.latency.discard(new_id)
 			return
 
 
+	def sendOrderBatch(self, orders):
+		'''
+		Send a batch of new orders to the FIX server, e.g. a basket or program trade.
+		Ids are assigned and the orders registered with the trading book in one
+		"add_batch" call, falling back to "add" per order if not registered, before
+		messages are encoded and sent in one loop sharing the batch's TransactTime.
+		Orders with no session logged on or refused by the pre-trade check are neither
+		registered nor sent, and orders which failed to send are removed from the book again
+
+		:param orders: list[Order]
+		Returns a list of (Order, Exception) for the orders which were refused or failed to send
+		'''
+		encode = self._new_order_template.encode
+		send = fix.Session.sendToTarget
+		router = self.router
+		transact_time = format_fix_timestamp(time.time_ns())
+
+		refused = []
+		accepted = []		# [(Order, session)]
+		for order_req in orders:
+			order_req.id = self._genOrderID()
+			session = router.route(order_req.ticker)
+			if session is None:
+				refused.append((order_req, RuntimeError("No session logged on")))
+				continue
+			if self.risk is not None:
+				reason = self.risk.check(order_req)
+				if reason is not None:
+					refused.append((order_req, PreTradeReject(reason)))
+					continue
+			accepted.append((order_req, session))
+		orders = [order_req for order_req, _ in accepted]
+		if self.app_event_callbacks["add_batch"] is not None:
+			self.app_event_callbacks["add_batch"](orders)
+		else:
+			for order_req in orders:
+				self.app_event_callbacks["add"](order_req)
+
+		failed = []
+		attempted = 0
+		latency = self.latency
+		try:
+			for order_req, session in accepted:
+				new_id = order_req.id
+				router.bind(new_id, session)
+				if latency is not None:
+					latency.on_send(new_id, order_req.ticker)
+				try:
+					send(encode(order_req, new_id, transact_time), session)
+				except (fix.SessionNotFound, ValueError, RuntimeError) as e:
+					# Carry on with the rest of the batch
+					failed.append((order_req, e))
+				attempted += 1
+		finally:
+			# An unexpected error stops the loop, the orders it did not send are rolled back as well
+			unsent = [(order_req, RuntimeError("Batch aborted")) for order_req, _ in accepted[attempted:]]
+			for order_req, e in failed + unsent:
+				router.release(order_req.id)
+				if latency is not None:
+					latency.discard(order_req.id)
+				self.app_event_callbacks["remove"](OrderUpdateEvent(order_req.id, ticker=order_req.ticker))
+				log.warning("Unable to send Order {} ({}) - {}", order_req.id, order_req.ticker, repr(e))
+		for order_req, e in refused:
+			if isinstance(e, PreTradeReject):
+				log.warning("Order {} ({}) rejected by pre-trade check - {}", order_req.id, order_req.ticker, e.reason)
+			else:
+				log.warning("Unable to send Order {} ({}) - {}", order_req.id, order_req.ticker, repr(e))
+		return refused + failed
+
+
 	def cancelOrder(self, fix_repr):
 		'''
 		Send Cancel orders to the FIX server in the form of a FIX message
 		
 		:param fix_repr: dict
 		'''
-		order_msg = self._newMsg()
-		order_msg.getHeader().setField(fix.MsgType(fix.MsgType_OrderCancelRequest))
-
-		order_msg.setField( fix.ClOrdID( self._genOrderID() ) )
-		for tag, value in fix_repr.items():
-			order_msg.setField(fix.StringField(int(tag), str(value)))
-		order_msg.setField(fix.StringField(self._transact_time_field,(dt.datetime.utcnow().strftime("%Y%m%d-%H:%M:%S.%f"))[:-3]))
-
+		cancel_id = self._genOrderID()
+		order_msg = self._cancel_template.encode(fix_repr, cancel_id, format_fix_timestamp(time.time_ns()))
+
+		# Cancels go to the session the order was sent on
+		_ticker = fix_repr.get(self._symbol_field)
+		_orig_id = fix_repr.get(self._orig_clorid_field)
+		session = self.router.session_for(_orig_id, _ticker)
+		if session is None:
+			log.warning("Unable to cancel Order {} ({}) - no session logged on", _orig_id, _ticker)
+			return
+		if self.latency is not None:
+			self.latency.on_send(cancel_id, _ticker, _orig_id)
 		try:
-			fix.Session.sendToTarget(order_msg, self.curr_sess)
+			fix.Session.sendToTarget(order_msg, session)
 		except fix.SessionNotFound as e:
+			if self.latency is not None:
+				self.latency.discard(cancel_id)
 			return
 
 
@@ -202,7 +312,7 @@ class FixClient(fix.Application):
 				for label, method in methods.items(): 
 					self.app_event_callbacks[label] = method
 			except KeyError:
-				print("Valid keys are 'add', 'remove' and 'update'")
+				log.error("Valid keys are 'add', 'remove', 'update' and 'add_batch'")
 		else:
 			raise ValueError("Callback inputs should be a dictionary")
 
@@ -0,0 +1,123 @@
+import time
+
+import quickfix as fix
+
+from app.utils.histogram import (LogHistogram)
+
+
+# Latency metrics per message type
+NEW_ACK = "new:ack"						# NewOrderSingle to first execution report
+NEW_FIRST_FILL = "new:first_fill"		# NewOrderSingle to first fill
+NEW_TERMINAL = "new:terminal"			# NewOrderSingle to FILLED / CANCELED / REJECTED
+CANCEL_ACK = "cancel:ack"				# OrderCancelRequest to CANCELED
+CANCEL_REJECT = "cancel:reject"			# OrderCancelRequest to OrderCancelReject
+
+METRICS = (NEW_ACK, NEW_FIRST_FILL, NEW_TERMINAL, CANCEL_ACK, CANCEL_REJECT)
+
+_fill_statuses = (fix.OrdStatus_PARTIALLY_FILLED, fix.OrdStatus_FILLED)
+_terminal_statuses = (fix.OrdStatus_FILLED, fix.OrdStatus_CANCELED, fix.OrdStatus_REJECTED)
+
+
+class LatencyTracker:
+	"""
+	Stamps every ClOrdID when sent and records the time to its execution
+	reports in per (metric, ticker) nanosecond histograms. Stamps are
+	dropped once the order or cancel request reaches a terminal state
+	"""
+	def __init__(self):
+		self.histograms = {}	# {(metric, ticker): LogHistogram}
+		self._pending = {}		# {cl_ord_id: [send time, ticker, is cancel, acked, filled]}
+		self._cancels = {}		# {order cl_ord_id: cancel request cl_ord_id}
+
+	def _record(self, metric, ticker, latency):
+		histogram = self.histograms.get((metric, ticker))
+		if histogram is None:
+			histogram = self.histograms[(metric, ticker)] = LogHistogram()
+		histogram.record(latency)
+
+	def on_send(self, cl_ord_id, ticker, orig_cl_ord_id=None):
+		"""
+		Stamp a NewOrderSingle, or an OrderCancelRequest if orig_cl_ord_id is
+		given, before it is sent
+
+		:param cl_ord_id: str - Tag 11 of the outbound message
+		:param ticker: str
+		:param orig_cl_ord_id: str, default=None - Tag 41 of an OrderCancelRequest
+		"""
+		self._pending[cl_ord_id] = [time.perf_counter_ns(), ticker, orig_cl_ord_id is not None, False, False]
+		if orig_cl_ord_id is not None:
+			self._cancels[orig_cl_ord_id] = cl_ord_id
+
+	def discard(self, cl_ord_id):
+		"""
+		Drop the stamp of a message which failed to send
+
+		:param cl_ord_id: str
+		"""
+		self._pending.pop(cl_ord_id, None)
+
+	def on_exec_report(self, cl_ord_id, ord_status, orig_cl_ord_id=None):
+		"""
+		Record latencies for an execution report
+
+		:param cl_ord_id: str - Tag 11
+		:param ord_status: str - Tag 39
+		:param orig_cl_ord_id: str, default=None - Tag 41
+		"""
+		now = time.perf_counter_ns()
+		if ord_status == fix.OrdStatus_CANCELED:
+			# The cancel may be acknowledged under the cancel request's id with
+			# the order in tag 41, or under the order's own id
+			order_id = orig_cl_ord_id or cl_ord_id
+			cancel_id = self._cancels.pop(order_id, cl_ord_id)
+			stamp = self._pending.get(cancel_id)
+			if stamp is not None and stamp[2]:
+				del self._pending[cancel_id]
+				self._record(CANCEL_ACK, stamp[1], now - stamp[0])
+			cl_ord_id = order_id
+
+		stamp = self._pending.get(cl_ord_id)
+		if stamp is None or stamp[2]:
+			return
+		sent, ticker = stamp[0], stamp[1]
+		if not stamp[3]:
+			stamp[3] = True
+			self._record(NEW_ACK, ticker, now - sent)
+		if not stamp[4] and ord_status in _fill_statuses:
+			stamp[4] = True
+			self._record(NEW_FIRST_FILL, ticker, now - sent)
+		if ord_status in _terminal_statuses:
+			del self._pending[cl_ord_id]
+			self._record(NEW_TERMINAL, ticker, now - sent)
+
+	def on_cancel_reject(self, cl_ord_id, orig_cl_ord_id=None):
+		"""
+		Record the latency of a rejected OrderCancelRequest
+
+		:param cl_ord_id: str - Tag 11 of the OrderCancelReject
+		:param orig_cl_ord_id: str, default=None - Tag 41 of the OrderCancelReject
+		"""
+		if self._cancels.get(orig_cl_ord_id) == cl_ord_id:
+			del self._cancels[orig_cl_ord_id]
+		stamp = self._pending.pop(cl_ord_id, None)
+		if stamp is not None:
+			self._record(CANCEL_REJECT, stamp[1], time.perf_counter_ns() - stamp[0])
+
+	def pending(self) -> int:
+		"""
+		Number of sent messages still awaiting a terminal report
+		"""
+		return len(self._pending)
+
+	def summary(self) -> dict:
+		"""
+		Histograms per metric, for all tickers and for each ticker
+
+		Returns {metric: {"all" | ticker: LogHistogram}}
+		"""
+		summary = {}
+		for (metric, ticker), histogram in sorted(self.histograms.items()):
+			by_ticker = summary.setdefault(metric, {})
+			by_ticker.setdefault("all", LogHistogram(histogram.sub_bucket_bits)).merge(histogram)
+			by_ticker[ticker] = histogram
+		return {metric: summary[metric] for metric in METRICS if metric in summary}
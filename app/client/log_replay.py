@@ -0,0 +1,144 @@
+import os
+import quickfix as fix
+
+from app.client.fix_client import (FixClient)
+from app.common.interface_order import (AssetLedger, Order, TradingBook)
+from app.utils.logger import (log)
+from app.utils.timestamps import (FixTimestamp)
+from app.utils.tools import (extract_fields_from_raw)
+
+
+# Matched on the raw bytes of each line, before anything is decoded
+_exec_report_marker = b"\x0135=8\x01"
+_new_order_marker = b"\x0135=D\x01"
+# FileLog lines are "<time logged> : <message>"
+_line_separator = " : "
+
+_ord_status_field = fix.OrdStatus().getField()
+_id_field = fix.ClOrdID().getField()
+_symbol_field = fix.Symbol().getField()
+_side_field = fix.Side().getField()
+_qty_field = fix.OrderQty().getField()
+_ord_type_field = fix.OrdType().getField()
+_security_field = fix.SecurityType().getField()
+_price_field = fix.Price().getField()
+_transact_time_field = fix.TransactTime().getField()
+
+_exec_report_tags = FixClient._exec_report_tags
+_new_order_tags = (_id_field, _symbol_field, _side_field, _qty_field, _ord_type_field,
+				   _security_field, _price_field, _transact_time_field)
+
+
+def iter_log_files(paths):
+	"""
+	quickfix FileLog message logs under the given files and directories
+
+	:param paths: list[str] - Log files, or directories searched for *.messages*.log
+	"""
+	for path in paths:
+		if os.path.isdir(path):
+			for root, _, files in os.walk(path):
+				for name in sorted(files):
+					if ".messages." in name and name.endswith(".log"):
+						yield os.path.join(root, name)
+		else:
+			yield path
+
+
+def iter_app_messages(path, buffer_size=1 << 20):
+	"""
+	Stream the execution reports and new orders of a message log. Other
+	lines are skipped by a byte search, without decoding them
+
+	:param path: str
+	:param buffer_size: int, default=1 MiB - Read buffer
+	Returns a generator of (MsgType, raw SOH delimited message)
+	"""
+	with open(path, "rb", buffering=buffer_size) as log_file:
+		for line in log_file:
+			if _exec_report_marker in line:
+				msg_typ = fix.MsgType_ExecutionReport
+			elif _new_order_marker in line:
+				msg_typ = fix.MsgType_NewOrderSingle
+			else:
+				continue
+			line = line.decode("latin-1")
+			start = line.find(_line_separator)
+			yield msg_typ, line[start + len(_line_separator):] if start >= 0 else line
+
+
+class LogReplay:
+	"""
+	Rebuild a trading book from quickfix message logs, without a FIX session.
+	Sent new orders are registered with the book, and execution reports are
+	applied by FixClient._handle_exec_report as they are for a live session
+
+	Attributes  
+	ledger_cls: type, default=AssetLedger - Ledger implementation, e.g. ColumnarAssetLedger  
+	"""
+	def __init__(self, ledger_cls=AssetLedger):
+		self.book = TradingBook("replay", [], ledger_cls)
+		self.client = FixClient()
+		self.client.register_app_event_callback({"add": self.book.log_transaction,
+												 "remove": self.book.erase_transaction,
+												 "update": self.book.update_transaction,
+												 "add_batch": self.book.log_orders})
+		self.exec_reports = 0
+		self.new_orders = 0
+
+	def _ensure_ledger(self, ticker):
+		# Ledgers are opened for every ticker found in the logs
+		if ticker and ticker not in self.book.ledgers:
+			self.book.ledgers[ticker] = self.book.ledger_cls(ticker)
+
+	def replay(self, path):
+		"""
+		Apply every execution report and new order of a message log to the book
+
+		:param path: str
+		"""
+		source = os.path.basename(path)
+		for msg_typ, msg in iter_app_messages(path):
+			if msg_typ == fix.MsgType_ExecutionReport:
+				tags = extract_fields_from_raw(msg, _exec_report_tags)
+				self._ensure_ledger(tags.get(_symbol_field))
+				self.client._handle_exec_report(tags.get(_ord_status_field), tags, source)
+				self.exec_reports += 1
+			else:
+				tags = extract_fields_from_raw(msg, _new_order_tags)
+				ticker = tags.get(_symbol_field)
+				self._ensure_ledger(ticker)
+				order = Order(ticker, tags.get(_side_field), float(tags.get(_qty_field, 0)), tags.get(_ord_type_field),
+							  tags.get(_security_field), float(tags.get(_price_field, 0.0)))
+				order.id = tags.get(_id_field)
+				transact_time = tags.get(_transact_time_field)
+				order.timestamp = FixTimestamp.from_fix(transact_time) if transact_time else None
+				self.book.log_transaction(order)
+				self.new_orders += 1
+
+	def result(self) -> dict:
+		"""
+		Returns message counts, open orders and TradingBook.ledger_totals()
+		"""
+		return {"exec_reports": self.exec_reports,
+				"new_orders": self.new_orders,
+				"open_orders": self.book.count_open_orders(),
+				"ledgers": self.book.ledger_totals()}
+
+
+def replay_file(path, ledger_cls=AssetLedger, log_level=None):
+	"""
+	Replay one message log into its own book, for running in a worker process
+
+	:param path: str
+	:param ledger_cls: type, default=AssetLedger
+	:param log_level: int, default=None - Level of the worker's log records
+	"""
+	if log_level is not None:
+		log.configure(level=log_level)
+	replay = LogReplay(ledger_cls)
+	replay.replay(path)
+	result = replay.result()
+	result["path"] = path
+	log.stop()
+	return result
@@ -0,0 +1,106 @@
+import quickfix as fix
+
+
+_cl_ord_id_field = fix.ClOrdID().getField()				# Tag 11
+_symbol_field = fix.Symbol().getField()					# Tag 55
+_side_field = fix.Side().getField()						# Tag 54
+_ord_type_field = fix.OrdType().getField()				# Tag 40
+_price_field = fix.Price().getField()					# Tag 44
+_qty_field = fix.OrderQty().getField()					# Tag 38
+_security_field = fix.SecurityType().getField()			# Tag 167
+_transact_time_field = fix.TransactTime().getField()	# Tag 60
+
+
+def format_decimal(value) -> str:
+	"""
+	Format a quantity or price as a FIX decimal string, never in exponent notation
+
+	:param value: int | float
+	"""
+	if isinstance(value, int):
+		return str(value)
+	text = repr(float(value))
+	if "e" in text or "n" in text:
+		text = "{:.15f}".format(value).rstrip("0").rstrip(".")
+	return text
+
+
+class _MessageTemplate:
+	"""
+	Prototype FIX message holding the header and the fields which are the
+	same for every message of its type. Encoding copies the prototype and
+	sets only the per-message fields, by tag number without field objects
+
+	Attributes  
+	msg_type: str - Value of tag 35  
+	constant_fields: list[fix.FieldBase], default=None - Fields set once on the prototype  
+	"""
+	def __init__(self, msg_type, constant_fields=None):
+		self._prototype = fix.Message()
+		header = self._prototype.getHeader()
+		header.setField(fix.BeginString())
+		header.setField(fix.MsgType(msg_type))
+		for field in (constant_fields or []):
+			self._prototype.setField(field)
+
+	def _new_message(self):
+		return fix.Message(self._prototype)
+
+
+class NewOrderTemplate(_MessageTemplate):
+	"""
+	NewOrderSingle (35=D) template with TimeInForce, HandlInst and SecurityType
+	set once. SecurityType is only overwritten for orders of another security type
+
+	Attributes  
+	security: str, default=fix.SecurityType_COMMON_STOCK - SecurityType of the prototype  
+	"""
+	def __init__(self, security=fix.SecurityType_COMMON_STOCK):
+		super().__init__(fix.MsgType_NewOrderSingle,
+						 [fix.TimeInForce(fix.TimeInForce_GOOD_TILL_CANCEL),
+						  fix.HandlInst(fix.HandlInst_AUTOMATED_EXECUTION_ORDER_PRIVATE_NO_BROKER_INTERVENTION),
+						  fix.SecurityType(security)])
+		self.security = security
+
+	def encode(self, order, cl_ord_id, transact_time):
+		"""
+		Build a NewOrderSingle message for an order
+
+		:param order: Order
+		:param cl_ord_id: str - Tag 11
+		:param transact_time: str - Tag 60
+		"""
+		order_msg = self._new_message()
+		order_msg.setField(_cl_ord_id_field, cl_ord_id)
+		order_msg.setField(_symbol_field, order.ticker)
+		order_msg.setField(_side_field, order.side)
+		order_msg.setField(_ord_type_field, order.ordtyp)
+		order_msg.setField(_price_field, format_decimal(order.price))
+		order_msg.setField(_qty_field, format_decimal(order.qty))
+		if order.security != self.security:
+			order_msg.setField(_security_field, order.security)
+		order_msg.setField(_transact_time_field, transact_time)
+		return order_msg
+
+
+class CancelTemplate(_MessageTemplate):
+	"""
+	OrderCancelRequest (35=F) template
+	"""
+	def __init__(self):
+		super().__init__(fix.MsgType_OrderCancelRequest)
+
+	def encode(self, fix_repr, cl_ord_id, transact_time):
+		"""
+		Build an OrderCancelRequest message from Order.to_fix_cancel()
+
+		:param fix_repr: dict{tag: value}
+		:param cl_ord_id: str - Tag 11
+		:param transact_time: str - Tag 60
+		"""
+		order_msg = self._new_message()
+		order_msg.setField(_cl_ord_id_field, cl_ord_id)
+		for tag, value in fix_repr.items():
+			order_msg.setField(tag, value if isinstance(value, str) else format_decimal(value))
+		order_msg.setField(_transact_time_field, transact_time)
+		return order_msg
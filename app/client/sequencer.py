@@ -0,0 +1,152 @@
+import time
+import threading
+from functools import partial
+from collections import deque
+
+from app.utils.logger import (log)
+from app.common.interface_order import (Order)
+
+
+def chain_handlers(*handler_maps) -> dict:
+	"""
+	Combine handler maps, calling the method of each map for a label in the
+	order given, e.g. the trading book then a position engine
+
+	:param handler_maps: dict{label: method}
+	"""
+	chained = {}
+	for handlers in handler_maps:
+		for label, method in handlers.items():
+			if method is not None:
+				chained.setdefault(label, []).append(method)
+	return {label: methods[0] if len(methods) == 1 else partial(_call_each, methods)
+			for label, methods in chained.items()}
+
+
+def _call_each(methods, event):
+	for method in methods:
+		method(event)
+
+
+class EventSequencer:
+	"""
+	Single writer for a trading book. The quickfix callbacks and the sending
+	thread queue book events without locking, and one book thread applies
+	them in the order they were queued
+
+	Attributes  
+	handlers: dict{label: method} - Trading book methods applying each event, labelled as FixClient.app_event_callbacks  
+	batch: bool, default=False - Drain every queued event per wakeup, applying runs of new orders in one "add_batch" call  
+	idle_wait: float, default=0.0002 - Seconds the book thread sleeps while the queue is empty  
+	"""
+	def __init__(self, handlers, batch=False, idle_wait=0.0002):
+		self.handlers = {label: method for label, method in handlers.items() if method is not None}
+		self.batch = batch
+		self.idle_wait = idle_wait
+
+		self.applied = 0
+		self.batches = 0
+		self.errors = 0
+		self.max_depth = 0
+		self._queue = deque()		# deque append/popleft are atomic, producers never take a lock
+		self._busy = False
+		self._thread = None
+		self._running = False
+
+	def callbacks(self) -> dict:
+		"""
+		Callbacks for FixClient.register_app_event_callback, which queue
+		events for the book thread instead of applying them
+		"""
+		return {label: partial(self.push, label) for label in self.handlers}
+
+	def push(self, label, event):
+		"""
+		Queue an event, safe to call from any thread
+
+		:param label: str - "add", "remove", "update" or "add_batch"
+		:param event: Order | OrderUpdateEvent | Trade | list[Order]
+		"""
+		self._queue.append((label, event))
+
+	def start(self):
+		"""
+		Start the book thread
+		"""
+		if self._running:
+			return
+		self._running = True
+		self._thread = threading.Thread(target=self._run, name="book-sequencer", daemon=True)
+		self._thread.start()
+
+	def stop(self):
+		"""
+		Stop the book thread after applying every queued event
+		"""
+		if not self._running:
+			return
+		self._running = False
+		self._thread.join()
+		self._thread = None
+
+	def queue_depth(self) -> int:
+		return len(self._queue)
+
+	def is_idle(self) -> bool:
+		"""
+		True when every queued event has been applied
+		"""
+		# The busy flag is raised before popping, so an empty queue with the flag down has nothing in flight
+		return not self._queue and not self._busy
+
+	def report(self) -> dict:
+		"""
+		Returns events applied, wakeups, handler errors and the current and maximum queue depth
+		"""
+		return {"applied": self.applied,
+				"batches": self.batches,
+				"errors": self.errors,
+				"queue_depth": len(self._queue),
+				"max_queue_depth": self.max_depth}
+
+	def _run(self):
+		queue = self._queue
+		while self._running or queue:
+			if not queue:
+				time.sleep(self.idle_wait)
+				continue
+			self._busy = True
+			depth = len(queue)
+			if depth > self.max_depth:
+				self.max_depth = depth
+			if self.batch:
+				self._apply_batch([queue.popleft() for _ in range(depth)])
+			else:
+				self._apply(*queue.popleft())
+				self.applied += 1
+			self.batches += 1
+			self._busy = False
+
+	def _apply(self, label, event):
+		try:
+			self.handlers[label](event)
+		except Exception as e:
+			# Keep the book thread alive, the event is lost
+			self.errors += 1
+			log.warning("Unable to apply {} event - {}", label, repr(e))
+
+	def _apply_batch(self, events):
+		# Orders sent back to back are registered together, other events keep their place
+		add_batch = "add_batch" in self.handlers
+		orders = []
+		for label, event in events:
+			if add_batch and label == "add" and isinstance(event, Order):
+				orders.append(event)
+				continue
+			if orders:
+				self._apply("add_batch", orders)
+				orders = []
+			self._apply(label, event)
+		if orders:
+			self._apply("add_batch", orders)
+		self.applied += len(events)
@@ -0,0 +1,109 @@
+import zlib
+
+
+ROUTE_HASH = "hash"
+ROUTE_ROUND_ROBIN = "round_robin"
+ROUTES = (ROUTE_HASH, ROUTE_ROUND_ROBIN)
+
+
+def shard_of(ticker, shard_count) -> int:
+	"""
+	Stable shard index of a ticker, the same in every process
+
+	:param ticker: str
+	:param shard_count: int
+	"""
+	return zlib.crc32(ticker.encode()) % shard_count
+
+
+class SessionRouter:
+	"""
+	Routes orders across the FIX sessions which are logged on. New orders
+	are routed by ticker hash, so a ticker always uses the same session,
+	or round-robin. Every sent order is bound to its session until it
+	reaches a terminal state, so cancels follow their order
+
+	Attributes  
+	mode: str, default="hash" - "hash" or "round_robin"  
+	"""
+	def __init__(self, mode=ROUTE_HASH):
+		if mode not in ROUTES:
+			raise ValueError("Invalid routing mode - {}".format(mode))
+		self.mode = mode
+		# Replaced rather than mutated on logon/logout, senders read it without locking
+		self._sessions = ()
+		self._by_ticker = {}	# {ticker: session} for hash routing
+		self._bindings = {}		# {cl_ord_id: session}
+		self._next = 0
+
+	@property
+	def sessions(self):
+		return self._sessions
+
+	def add_session(self, session):
+		"""
+		Make a logged on session available for routing
+
+		:param session: fix.SessionID
+		"""
+		if session not in self._sessions:
+			self._sessions = tuple(sorted(self._sessions + (session,), key=str))
+			self._by_ticker = {}
+
+	def remove_session(self, session):
+		"""
+		Stop routing to a logged out session
+
+		:param session: fix.SessionID
+		"""
+		if session in self._sessions:
+			self._sessions = tuple(s for s in self._sessions if s != session)
+			self._by_ticker = {}
+
+	def route(self, ticker):
+		"""
+		Session for a new order, None if no session is logged on
+
+		:param ticker: str
+		"""
+		sessions = self._sessions
+		if not sessions:
+			return None
+		if len(sessions) == 1:
+			return sessions[0]
+		if self.mode == ROUTE_HASH:
+			session = self._by_ticker.get(ticker)
+			if session is None:
+				session = self._by_ticker[ticker] = sessions[shard_of(ticker, len(sessions))]
+			return session
+		self._next = (self._next + 1) % len(sessions)
+		return sessions[self._next]
+
+	def bind(self, cl_ord_id, session):
+		"""
+		Record the session an order was sent on
+
+		:param cl_ord_id: str
+		:param session: fix.SessionID
+		"""
+		self._bindings[cl_ord_id] = session
+
+	def release(self, cl_ord_id):
+		"""
+		Forget the session of an order which reached a terminal state
+
+		:param cl_ord_id: str
+		"""
+		self._bindings.pop(cl_ord_id, None)
+
+	def session_for(self, cl_ord_id, ticker):
+		"""
+		Session an order was sent on, for cancels. Falls back to routing the ticker
+
+		:param cl_ord_id: str
+		:param ticker: str
+		"""
+		session = self._bindings.get(cl_ord_id)
+		if session is None:
+			session = self.route(ticker)
+		return session
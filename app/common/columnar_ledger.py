@@ -0,0 +1,262 @@
+import quickfix as fix
+
+try:
+	import numpy as np
+except ImportError:		# numpy is only needed for the columnar backend
+	np = None
+
+from app.common.interface_order import (AssetLedger, FifoLots, Trade)
+from app.utils.logger import (log)
+from app.utils.timestamps import (FixTimestamp, to_epoch_ns)
+
+
+# Trade sides are stored as their FIX integer codes
+_side_codes = {fix.Side_BUY: int(fix.Side_BUY),
+			   fix.Side_SELL: int(fix.Side_SELL),
+			   fix.Side_SELL_SHORT: int(fix.Side_SELL_SHORT)}
+_side_values = {code: side for side, code in _side_codes.items()}
+
+
+class ColumnarAssetLedger(AssetLedger):
+	"""
+	Asset ledger which holds confirmed trades in growable NumPy columns
+	instead of a dict of Trade objects. Pending orders are held as in AssetLedger
+
+	Attributes  
+	name: str - Asset to which the ledger applies  
+	capacity: int, default=1024 - Initial number of trade rows allocated  
+	"""
+	def __init__(self, name, capacity=1024):
+		if np is None:
+			raise ImportError("numpy is required for ColumnarAssetLedger")
+		self.name = name
+		self.orders = {}
+
+		self._size = 0
+		self._index = {}		# {trade id: row}
+		self._ids = []			# [trade id] by row
+		self._price = np.empty(capacity, dtype=np.float64)		# Tag 31
+		self._qty = np.empty(capacity, dtype=np.float64)		# Tag 32
+		self._side = np.empty(capacity, dtype=np.int8)			# Tag 54
+		self._timestamp = np.empty(capacity, dtype=np.int64)	# Tag 52
+
+		# Sign applied to notional per side code for cash flow
+		self._side_sign = np.zeros(max(_side_values) + 1, dtype=np.float64)
+		self._side_sign[_side_codes[fix.Side_BUY]] = -1.0
+		self._side_sign[_side_codes[fix.Side_SELL]] = 1.0
+		self._side_sign[_side_codes[fix.Side_SELL_SHORT]] = 1.0
+
+		# Position matched into FIFO lots as fills arrive, and every fill in arrival order
+		# to match them again when a trade is removed
+		self._lots = FifoLots()
+		self._fill_count = 0
+		self._fill_ids = []		# [trade id] by fill
+		self._fill_price = np.empty(capacity, dtype=np.float64)
+		self._fill_qty = np.empty(capacity, dtype=np.float64)
+		self._fill_side = np.empty(capacity, dtype=np.int8)
+		self._fill_timestamp = np.empty(capacity, dtype=np.int64)
+
+	def _grow(self, columns=("_price", "_qty", "_side", "_timestamp"), size=None):
+		# Double the capacity of a set of columns, the trade columns by default
+		capacity = max(2 * len(getattr(self, columns[0])), 1)
+		size = self._size if size is None else size
+		for column in columns:
+			old = getattr(self, column)
+			new = np.empty(capacity, dtype=old.dtype)
+			new[:size] = old[:size]
+			setattr(self, column, new)
+
+	@property
+	def trades(self):
+		"""
+		All trades materialised as {id: Trade}, for compatibility with AssetLedger
+		"""
+		return {trade_id: self._row_to_trade(row) for row, trade_id in enumerate(self._ids)}
+
+	def _row_to_trade(self, row):
+		return Trade(self._ids[row], FixTimestamp(self._timestamp[row]), self.name,
+					 _side_values[int(self._side[row])], float(self._qty[row]), float(self._price[row]))
+
+	def add_trade(self, new_trade):
+		"""
+		Add new trades
+
+		:param new_trade: Trade  
+		"""
+		try:
+			side_code = _side_codes[new_trade.side]
+		except KeyError:
+			raise ValueError("Unknown trading side")
+		timestamp = to_epoch_ns(new_trade.timestamp)
+
+		row = self._index.get(new_trade.id)
+		if row is not None:
+			# Merge partial fills into a single row at the average price
+			if (self._side[row] != side_code) or (self.name != new_trade.ticker):
+				log.warning("Trade with same ID but different side and/or ticker. To check. {} {} {}",
+							new_trade.id, _side_values[int(self._side[row])], new_trade.side)
+				return
+			_qty = self._qty[row]
+			_new_qty = _qty + new_trade.qty
+			self._price[row] = (_qty*self._price[row] + new_trade.qty*new_trade.price)/_new_qty
+			self._qty[row] = _new_qty
+			self._timestamp[row] = max(self._timestamp[row], timestamp)
+		else:
+			if self._size == len(self._price):
+				self._grow()
+			row = self._size
+			self._price[row] = new_trade.price
+			self._qty[row] = new_trade.qty
+			self._side[row] = side_code
+			self._timestamp[row] = timestamp
+			self._index[new_trade.id] = row
+			self._ids.append(new_trade.id)
+			self._size += 1
+
+		fill = self._fill_count
+		if fill == len(self._fill_price):
+			self._grow(("_fill_price", "_fill_qty", "_fill_side", "_fill_timestamp"), fill)
+		self._fill_price[fill] = new_trade.price
+		self._fill_qty[fill] = new_trade.qty
+		self._fill_side[fill] = side_code
+		self._fill_timestamp[fill] = timestamp
+		self._fill_ids.append(new_trade.id)
+		self._fill_count += 1
+		self._lots.fill(new_trade.side, new_trade.qty, new_trade.price)
+
+	def remove_trade(self, trade):
+		"""
+		Remove existing trades
+
+		:param trade: Trade  
+		"""
+		try:
+			row = self._index.pop(trade.id)
+		except KeyError:
+			log.warning("No such trade exists for removal")
+			return
+		# Swap the last row into the freed slot to keep the columns dense
+		last = self._size - 1
+		last_id = self._ids.pop()
+		if row != last:
+			for column in (self._price, self._qty, self._side, self._timestamp):
+				column[row] = column[last]
+			self._ids[row] = last_id
+			self._index[last_id] = row
+		self._size = last
+
+		# Drop the trade's fills, then match the remaining fills again in the order they arrived
+		n = self._fill_count
+		keep = np.fromiter((fill_id != trade.id for fill_id in self._fill_ids), dtype=bool, count=n)
+		for column in (self._fill_price, self._fill_qty, self._fill_side, self._fill_timestamp):
+			kept = column[:n][keep]
+			column[:len(kept)] = kept
+		self._fill_ids = [fill_id for fill_id in self._fill_ids if fill_id != trade.id]
+		self._fill_count = len(self._fill_ids)
+		self._lots.rebuild(self._iter_fill_rows())
+
+	def _iter_fill_rows(self):
+		# (side, qty, price) of every fill in arrival order
+		n = self._fill_count
+		for code, qty, price in zip(self._fill_side[:n].tolist(), self._fill_qty[:n].tolist(), self._fill_price[:n].tolist()):
+			yield _side_values[code], qty, price
+
+	def clear_trades(self):
+		"""
+		Clear all trades in the ledger 
+		"""
+		self._size = 0
+		self._index.clear()
+		self._ids.clear()
+		self._lots.clear()
+		self._fill_count = 0
+		self._fill_ids.clear()
+
+	def get_trade(self, trade_id=None):
+		"""
+		Retrieve respective trade based on the id. Retrieve all trades if trade_id is None  
+
+		:param trade_id: str
+		"""
+		if not trade_id:
+			return self.trades
+		else:
+			return self._row_to_trade(self._index[trade_id])
+
+	def get_fills(self) -> list:
+		"""
+		Individual fills of the trades in the ledger, in the order they arrived.
+		Adding them to an empty ledger rebuilds the same trades and lots
+		"""
+		n = self._fill_count
+		return [Trade(fill_id, FixTimestamp(timestamp), self.name, _side_values[code], qty, price)
+				for fill_id, timestamp, code, qty, price in zip(self._fill_ids, self._fill_timestamp[:n].tolist(),
+																 self._fill_side[:n].tolist(), self._fill_qty[:n].tolist(),
+																 self._fill_price[:n].tolist())]
+
+	def calc_asset_trading_volume(self, full_scan=False) -> float:
+		"""
+		Calculate total trading volume for the ledger in dollar amount
+
+		:param full_scan: bool - Accepted for compatibility, columns are always reduced in full
+		"""
+		n = self._size
+		return float(np.dot(self._price[:n], self._qty[:n]))
+
+	def calc_trading_pnl(self, full_scan=False) -> float:
+		"""
+		Calculate net cash flow of all trades for the ledger in dollar amount,
+		sells less buys. Inventory is not valued, see calc_realized_pnl
+
+		:param full_scan: bool - Accepted for compatibility, columns are always reduced in full
+		"""
+		n = self._size
+		notional = self._price[:n] * self._qty[:n]
+		return float(np.dot(notional, self._side_sign[self._side[:n]]))
+
+	def calc_traded_quantity(self, full_scan=False) -> float:
+		"""
+		Calculate total traded quantity for the ledger
+
+		:param full_scan: bool - Accepted for compatibility, columns are always reduced in full
+		"""
+		return float(self._qty[:self._size].sum())
+
+	def calc_vwap(self, full_scan=False) -> float:
+		"""
+		Calculate VWAP for the ledger in dollar amount
+
+		:param full_scan: bool - Accepted for compatibility, columns are always reduced in full
+		"""
+		n = self._size
+		total_quantity = self._qty[:n].sum()
+		if total_quantity == 0:
+			# Return 0 in event no trade registered for an asset
+			return 0
+		return float(np.dot(self._price[:n], self._qty[:n]) / total_quantity)
+
+	def calc_side_breakdown(self) -> dict:
+		"""
+		Calculate trade count, quantity, dollar volume and VWAP per trade side
+		"""
+		n = self._size
+		sides = self._side[:n]
+		qty = self._qty[:n]
+		minlength = len(self._side_sign)
+		counts = np.bincount(sides, minlength=minlength)
+		quantities = np.bincount(sides, weights=qty, minlength=minlength)
+		notionals = np.bincount(sides, weights=self._price[:n] * qty, minlength=minlength)
+
+		breakdown = {}
+		for code in np.flatnonzero(counts):
+			_qty = float(quantities[code])
+			_notional = float(notionals[code])
+			breakdown[_side_values[int(code)]] = {"count": int(counts[code]), "qty": _qty, "volume": _notional,
+												  "vwap": _notional / _qty if _qty else 0}
+		return breakdown
+
+	def __str__(self):
+		return f"Ledger: {self.name}, Orders: {len(self.orders)}, Trades: {self._size}"
+
+	def __contains__(self, item):
+		return (item.id in self.orders) or (item.id in self._index)
@@ -1,5 +1,8 @@
+import random
+from collections import deque
 import quickfix as fix
-import datetime as dt
+
+from app.utils.logger import (log)
 
 class OrderUpdateEvent:
 	"""
@@ -7,13 +10,15 @@ class OrderUpdateEvent:
 
 	Attributes  
 	ordId: str, default=None - Order ID for which the update applies to  
-	timestamp: str, default=None - Timestamp of the order event  
+	timestamp: FixTimestamp, default=None - Timestamp of the order event  
 	qty: float: default=None - Last filled quantity  
 	price: float, default=None - Last filled price  
 	status: str, default=None - Latest order status  
 	ticker: str, default=None - Asset for which the update applies to  
 	side: str, default=None - Trade side of the order  
 	"""
+	__slots__ = ("id", "timestamp", "qty", "price", "status", "ticker", "side")
+
 	def __init__(self, ordId=None, timestamp=None, qty=None,
 				 price=None, status=None, ticker=None, side=None,):
 		self.id = ordId
@@ -38,6 +43,16 @@ class Order:
 	security: str - Classification of the asset for ordering  
 	price: float, default=0.0 - Limit price for asset ordering  
 	"""
+	__slots__ = ("ticker", "side", "qty", "ordtyp", "security", "price",
+				 "id", "timestamp", "ord_status")
+
+	# Tags of to_fix_cancel, resolved once
+	_symbol_field = fix.Symbol().getField()
+	_side_field = fix.Side().getField()
+	_qty_field = fix.OrderQty().getField()
+	_security_field = fix.SecurityType().getField()
+	_id_field = fix.OrigClOrdID().getField()
+
 	def __init__(self, ticker, side, qty, 
 				 ordtyp, security,  price=0.0):
 		self.ticker = ticker			# Tag 55
@@ -55,18 +70,12 @@ class Order:
 		"""
 		Returns a dictionary containing the required tags to send a FIX cancel order message
 		"""
-		_symbol_field = fix.Symbol().getField()
-		_side_field = fix.Side().getField()
-		_qty_field = fix.OrderQty().getField()
-		_security_field = fix.SecurityType().getField()
-		_id_field = fix.OrigClOrdID().getField()
-
 		fix_repr = {
-			_symbol_field: self.ticker,
-			_side_field: self.side,
-			_qty_field: self.qty,
-			_security_field: self.security,
-			_id_field: self.id
+			self._symbol_field: self.ticker,
+			self._side_field: self.side,
+			self._qty_field: self.qty,
+			self._security_field: self.security,
+			self._id_field: self.id
 		}
 
 		return fix_repr
@@ -86,13 +95,15 @@ class Trade:
 
 	Attributes  
 	ordID: str - Order ID for which the trade is related to  
-	timestamp: str - Timestamp of the trade  
+	timestamp: FixTimestamp - Timestamp of the trade  
 	ticker: str - Traded asset  
 	side: str - Trade side  
 	qty: float - Quantity of the asset for the particular trade id  
 	price: float, default=0.0 - Price of the trades for the particular trade id. 
 		Average price is calculated for partial order fills at different prices  
 	"""
+	__slots__ = ("id", "timestamp", "ticker", "side", "qty", "price")
+
 	def __init__(self, ordID, timestamp, ticker, 
 				 side, qty, price):
 		self.id = ordID					# Tag 11
@@ -107,14 +118,11 @@ class Trade:
 			if (self.side == other.side) and (self.ticker == other.ticker):
 				_new_qty = self.qty + other.qty
 				_new_price = (self.qty*self.price + other.qty*other.price)/_new_qty
-				_new_timestamp = max(int(dt.datetime.strptime(self.timestamp, '%Y%m%d-%H:%M:%S.%f').timestamp()),
-									 int(dt.datetime.strptime(other.timestamp, '%Y%m%d-%H:%M:%S.%f').timestamp())
-									)
-				_new_timestamp = (dt.datetime.fromtimestamp(_new_timestamp).strftime("%Y%m%d-%H:%M:%S.%f"))[:-3]
+				_new_timestamp = max(self.timestamp, other.timestamp)
 				return Trade(other.id, _new_timestamp, other.ticker, other.side, _new_qty, _new_price)
 			else:
-				print(self.id, self.side, other.id, other.side)
-				print("Trade with same ID but different side and/or ticker. To check.")
+				log.warning("Trade with same ID but different side and/or ticker. To check. {} {} {} {}",
+							self.id, self.side, other.id, other.side)
 		else:
 			return NotImplemented
 
@@ -126,6 +134,85 @@ class Trade:
 		
 
 
+class FifoLots:
+	"""
+	Open lots of a ledger's net position, closed first in first out by fills
+	on the other side. Every lot is appended and popped once, so a fill is
+	O(1) amortized
+	"""
+	__slots__ = ("_lots", "position", "cost", "realized", "last_price")
+
+	def __init__(self):
+		self._lots = deque()	# [qty left, price], all on the side of the position
+		self.position = 0.0		# Net quantity, negative when short
+		self.cost = 0.0			# Quantity times price of the open lots
+		self.realized = 0.0		# PnL of the closed quantity
+		self.last_price = 0.0	# Price of the latest fill
+
+	def fill(self, side, qty, price):
+		"""
+		Close open lots on the other side, oldest first, and open a lot with the rest
+
+		:param side: str - fix.Side_BUY, fix.Side_SELL or fix.Side_SELL_SHORT
+		:param qty: float
+		:param price: float
+		"""
+		sign = 1.0 if side == fix.Side_BUY else -1.0
+		self.last_price = price
+		lots = self._lots
+		while qty > 0 and lots and self.position * sign < 0:
+			lot = lots[0]
+			closed = min(lot[0], qty)
+			# Long lots gain when sold above cost, short lots when bought below
+			self.realized += closed * (lot[1] - price) * sign
+			self.cost -= closed * lot[1]
+			self.position += closed * sign
+			lot[0] -= closed
+			qty -= closed
+			if lot[0] <= 0:
+				lots.popleft()
+		if not lots:
+			# Drop rounding left over from closed lots
+			self.cost = 0.0
+		if qty > 0:
+			lots.append([qty, price])
+			self.cost += qty * price
+			self.position += qty * sign
+
+	def clear(self):
+		self._lots.clear()
+		self.position = 0.0
+		self.cost = 0.0
+		self.realized = 0.0
+		self.last_price = 0.0
+
+	def rebuild(self, fills):
+		"""
+		Match again from scratch, after a trade is removed
+
+		:param fills: iterable[(side, qty, price)] - Individual fills in the order they arrived
+		"""
+		self.clear()
+		for side, qty, price in fills:
+			self.fill(side, qty, price)
+
+	def average_cost(self) -> float:
+		"""
+		Average price of the open lots, 0 when flat
+		"""
+		return self.cost / abs(self.position) if self.position else 0.0
+
+	def unrealized(self, mark_price) -> float:
+		"""
+		PnL of the open lots if closed at the mark price
+
+		:param mark_price: float
+		"""
+		if self.position >= 0:
+			return self.position * mark_price - self.cost
+		return self.position * mark_price + self.cost
+
+
 class AssetLedger:
 	"""
 	Ledger to hold all pending orders and confirmed trades for 
@@ -139,6 +226,15 @@ class AssetLedger:
 		self.orders = {}
 		self.trades = {}
 
+		# Running sums over self.trades, kept up to date on every trade mutation
+		self._notional = 0.0
+		self._cash_flow = 0.0
+		self._quantity = 0.0
+		# Position matched into FIFO lots as fills arrive, and every fill in arrival order
+		# to match them again when a trade is removed
+		self._lots = FifoLots()
+		self._fills = []
+
 	def add_order(self, new_order):
 		"""
 		Add new orders
@@ -156,7 +252,7 @@ class AssetLedger:
 		try:
 			del self.orders[order.id]
 		except KeyError:
-			print("Unable to remove Order {}".format(order.id))
+			log.warning("Unable to remove Order {}", order.id)
 
 	def update_order(self, order_event):
 		"""
@@ -172,7 +268,7 @@ class AssetLedger:
 				if order_event.status == fix.OrdStatus_PARTIALLY_FILLED:
 					curr_order.qty -= order_event.qty
 		except KeyError:
-			print("Unable to update Order {}".format(order_event.id))
+			log.warning("Unable to update Order {}", order_event.id)
 
 	def clear_orders(self):
 		"""
@@ -199,9 +295,18 @@ class AssetLedger:
 		"""
 		if new_trade.id in self.trades:
 			curr_trade = self.trades[new_trade.id]
-			self.trades[new_trade.id] = curr_trade + new_trade
+			merged_trade = curr_trade + new_trade
+			if merged_trade is None:
+				# Mismatched side/ticker, keep the existing trade untouched
+				return
+			self._apply_trade(merged_trade)
+			self._apply_trade(curr_trade, -1)
+			self.trades[new_trade.id] = merged_trade
 		else:
+			self._apply_trade(new_trade)
 			self.trades[new_trade.id] = new_trade
+		self._fills.append(new_trade)
+		self._lots.fill(new_trade.side, new_trade.qty, new_trade.price)
 
 	def remove_trade(self, trade):
 		"""
@@ -210,15 +315,24 @@ class AssetLedger:
 		:param trade: Trade  
 		"""
 		try:
-			del self.trades[trade.id]
+			curr_trade = self.trades.pop(trade.id)
 		except KeyError:
-			print("No such trade exists for removal")
+			log.warning("No such trade exists for removal")
+		else:
+			if self.trades:
+				self._apply_trade(curr_trade, -1)
+				# Lots cannot be unwound, match the remaining fills again in the order they arrived
+				self._fills = [fill for fill in self._fills if fill.id != trade.id]
+				self._lots.rebuild((fill.side, fill.qty, fill.price) for fill in self._fills)
+			else:
+				self._reset_aggregates()
 
 	def clear_trades(self):
 		"""
 		Clear all trades in the ledger 
 		"""
 		self.trades.clear()
+		self._reset_aggregates()
 
 	def get_trade(self, trade_id=None):
 		"""
@@ -231,19 +345,59 @@ class AssetLedger:
 		else:
 			return self.trades[trade_id]
 
-	def calc_asset_trading_volume(self) -> float:
+	def get_fills(self) -> list:
+		"""
+		Individual fills of the trades in the ledger, in the order they arrived.
+		Adding them to an empty ledger rebuilds the same trades and lots
+		"""
+		return list(self._fills)
+
+	@staticmethod
+	def _signed_cash_flow(side, notional) -> float:
+		# Selling brings cash in, buying pays cash out
+		if side == fix.Side_SELL or side == fix.Side_SELL_SHORT:
+			return notional
+		elif side == fix.Side_BUY:
+			return -notional
+		else:
+			raise ValueError("Unknown trading side")
+
+	def _apply_trade(self, trade, sign=1):
+		# Add (sign=1) or retract (sign=-1) a trade from the running sums
+		notional = trade.price * trade.qty
+		self._cash_flow += sign * self._signed_cash_flow(trade.side, notional)
+		self._notional += sign * notional
+		self._quantity += sign * trade.qty
+
+	def _reset_aggregates(self):
+		self._notional = 0.0
+		self._cash_flow = 0.0
+		self._quantity = 0.0
+		self._lots.clear()
+		self._fills.clear()
+
+	def calc_asset_trading_volume(self, full_scan=False) -> float:
 		"""
 		Calculate total trading volume for the ledger in dollar amount
+
+		:param full_scan: bool - Recompute from every trade instead of the running sums, for verification
 		"""
+		if not full_scan:
+			return self._notional
 		trading_volume = 0
 		for trade in self.trades.values():
 			trading_volume += (trade.price * trade.qty)
 		return trading_volume
 
-	def calc_trading_pnl(self) -> float:
+	def calc_trading_pnl(self, full_scan=False) -> float:
 		"""
-		Calculate total trading PnL for the ledger in dollar amount
+		Calculate net cash flow of all trades for the ledger in dollar amount,
+		sells less buys. Inventory is not valued, see calc_realized_pnl
+
+		:param full_scan: bool - Recompute from every trade instead of the running sums, for verification
 		"""
+		if not full_scan:
+			return self._cash_flow
 		pnL = 0
 		for trade in self.trades.values():
 			if trade.side == fix.Side_SELL or trade.side == fix.Side_SELL_SHORT:
@@ -255,10 +409,27 @@ class AssetLedger:
 		return pnL
 
 
-	def calc_vwap(self) -> float:
+	def calc_traded_quantity(self, full_scan=False) -> float:
+		"""
+		Calculate total traded quantity for the ledger
+
+		:param full_scan: bool - Recompute from every trade instead of the running sums, for verification
+		"""
+		if not full_scan:
+			return self._quantity
+		return sum(trade.qty for trade in self.trades.values())
+
+	def calc_vwap(self, full_scan=False) -> float:
 		"""
 		Calculate VWAP for the ledger in dollar amount
+
+		:param full_scan: bool - Recompute from every trade instead of the running sums, for verification
 		"""
+		if not full_scan:
+			if self._quantity == 0:
+				# Return 0 in event no trade registered for an asset
+				return 0
+			return self._notional / self._quantity
 		trading_volume = 0
 		total_quantity = 0
 		for trade in self.trades.values():
@@ -270,6 +441,46 @@ class AssetLedger:
 		else:
 			return trading_volume / total_quantity
 
+	def calc_position(self) -> float:
+		"""
+		Calculate net traded quantity, negative when short
+		"""
+		return self._lots.position
+
+	def calc_average_cost(self) -> float:
+		"""
+		Calculate average price of the open FIFO lots, 0 when flat
+		"""
+		return self._lots.average_cost()
+
+	def calc_realized_pnl(self) -> float:
+		"""
+		Calculate PnL of the quantity closed by FIFO lot matching in dollar amount
+		"""
+		return self._lots.realized
+
+	def calc_unrealized_pnl(self, mark_price=None) -> float:
+		"""
+		Calculate PnL of the open FIFO lots against a mark price in dollar amount
+
+		:param mark_price: float, default=None - Price of the latest fill if None
+		"""
+		return self._lots.unrealized(self._lots.last_price if mark_price is None else mark_price)
+
+	def calc_side_breakdown(self) -> dict:
+		"""
+		Calculate trade count, quantity, dollar volume and VWAP per trade side
+		"""
+		breakdown = {}
+		for trade in self.trades.values():
+			side_stats = breakdown.setdefault(trade.side, {"count": 0, "qty": 0, "volume": 0})
+			side_stats["count"] += 1
+			side_stats["qty"] += trade.qty
+			side_stats["volume"] += (trade.price * trade.qty)
+		for side_stats in breakdown.values():
+			side_stats["vwap"] = side_stats["volume"] / side_stats["qty"] if side_stats["qty"] else 0
+		return breakdown
+
 	def __str__(self):
 		return f"Ledger: {self.name}, Orders: {len(self.orders)}, Trades: {len(self.trades)}"
 
@@ -277,25 +488,120 @@ class AssetLedger:
 		return (item.id in self.orders) or (item.id in self.trades)
 
 
+class OpenOrderSet:
+	"""
+	Open orders kept in a list with a position map. Removal swaps the last
+	order into the freed slot, so adding, removing and sampling are O(1)
+	"""
+	__slots__ = ("_orders", "_positions")
+
+	def __init__(self):
+		self._orders = []		# list[Order]
+		self._positions = {}	# {order id: position in _orders}
+
+	def add(self, order):
+		"""
+		Add an open order, replacing an order with the same id
+
+		:param order: Order | OrderUpdateEvent
+		"""
+		position = self._positions.get(order.id)
+		if position is None:
+			self._positions[order.id] = len(self._orders)
+			self._orders.append(order)
+		else:
+			self._orders[position] = order
+
+	def discard(self, order_id):
+		"""
+		Remove an order if present
+
+		:param order_id: str
+		"""
+		position = self._positions.pop(order_id, None)
+		if position is None:
+			return
+		orders = self._orders
+		last = orders.pop()
+		if position < len(orders):
+			orders[position] = last
+			self._positions[last.id] = position
+
+	def clear(self):
+		self._orders.clear()
+		self._positions.clear()
+
+	def sample(self, rng=random):
+		"""
+		Uniformly random open order, or None if there are none
+
+		:param rng: random.Random, default=random
+		"""
+		orders = self._orders
+		while orders:
+			try:
+				return orders[rng.randrange(len(orders))]
+			except (IndexError, ValueError):
+				# Removed from another thread between reading the length and the order
+				continue
+		return None
+
+	def sample_weighted(self, weight, max_weight, rng=random, max_tries=64):
+		"""
+		Random open order drawn in proportion to weight(order), by rejection
+		sampling against max_weight. Expected tries are max_weight over the mean
+		weight, after max_tries a uniform sample is returned
+
+		:param weight: callable - Weight of an order, between 0 and max_weight
+		:param max_weight: float
+		:param rng: random.Random, default=random
+		:param max_tries: int, default=64
+		"""
+		for _ in range(max_tries):
+			order = self.sample(rng)
+			if order is None or rng.random() * max_weight < weight(order):
+				return order
+		return self.sample(rng)
+
+	def __len__(self):
+		return len(self._orders)
+
+	def __contains__(self, order_id):
+		return order_id in self._positions
+
+
 class TradingBook:
 	"""
 	Trading Book to aggregate all trading asset ledgers
 
 	Attributes  
 	name: str - Name of the trading book  
+	assets: list[str] | str - Assets to initialise ledgers for  
+	ledger_cls: type, default=AssetLedger - Ledger implementation, e.g. ColumnarAssetLedger  
+	journal: BookJournal, default=None - Journal to rebuild the book from and record its mutations in  
 	"""
-	def __init__(self, name, assets):
+	def __init__(self, name, assets, ledger_cls=AssetLedger, journal=None):
 		self.name = name
 		self.ledgers = {}	# {ticker: AssetLedger}
+		self.ledger_cls = ledger_cls
+		self._order_index = {}	# {order id: AssetLedger} for orders still open
+		self._open_orders = OpenOrderSet()
+		self.journal = None
 
 		self._initialize_ledgers(assets)
+		if journal is not None:
+			journal.recover(self)
+			# A replayed clear or reset can remove ledgers of these assets
+			self._initialize_ledgers(assets)
 
 	def _initialize_ledgers(self, assets):
 		if isinstance(assets, list):
 			for asset in assets:
-				self.ledgers[asset] = AssetLedger(asset)
+				if asset not in self.ledgers:
+					self.ledgers[asset] = self.ledger_cls(asset)
 		elif isinstance(assets, str):
-			self.ledgers[assets] = AssetLedger(assets)
+			if assets not in self.ledgers:
+				self.ledgers[assets] = self.ledger_cls(assets)
 		else:
 			raise ValueError("Invalid asset for initializing trading book - {}".format(assets))
 
@@ -305,12 +611,48 @@ class TradingBook:
 
 		:param transaction: Order | OrderUpdateEvent | Trade
 		"""
+		journal = self.journal
 		if isinstance(transaction, Order) or isinstance(transaction, OrderUpdateEvent):
-			self.ledgers[transaction.ticker].add_order(transaction)
+			ledger = self.ledgers[transaction.ticker]
+			# Packed first, so a transaction the journal refuses leaves the book untouched
+			record = journal.pack_order(transaction) if journal is not None else None
+			ledger.add_order(transaction)
+			self._order_index[transaction.id] = ledger
+			self._open_orders.add(transaction)
 		elif isinstance(transaction, Trade):
-			self.ledgers[transaction.ticker].add_trade(transaction)
+			ledger = self.ledgers[transaction.ticker]
+			record = journal.pack_trade(transaction) if journal is not None else None
+			ledger.add_trade(transaction)
 		else:
 			raise ValueError("Invalid transaction")
+		if record is not None:
+			journal.append(record)
+
+	def log_orders(self, orders):
+		"""
+		Add a batch of new orders to their respective ledgers in one call. The
+		whole batch is packed for the journal first, so an order it refuses
+		leaves the book untouched
+
+		:param orders: list[Order]
+		"""
+		ledgers = self.ledgers
+		order_index = self._order_index
+		add_open = self._open_orders.add
+		journal = self.journal
+		accepted = []
+		for order in orders:
+			try:
+				accepted.append((order, ledgers[order.ticker]))
+			except KeyError:
+				log.warning("No such ledger in trading book for Order {} - {}", order.id, order.ticker)
+		records = [journal.pack_order(order) for order, _ in accepted] if journal is not None else ()
+		for order, ledger in accepted:
+			ledger.add_order(order)
+			order_index[order.id] = ledger
+			add_open(order)
+		for record in records:
+			journal.append(record)
 
 	def erase_transaction(self, transaction):
 		"""
@@ -318,19 +660,27 @@ class TradingBook:
 
 		:param transaction: OrderUpdateEvent | Trade
 		"""
+		journal = self.journal
 		if isinstance(transaction, OrderUpdateEvent):
-			if transaction.ticker:
-				self.ledgers[transaction.ticker].remove_order(transaction)
-			else:
-				# Account for situation where order is rejected due unlucky
-				# Only id is sent, no symbol tag
-				for asset, ledger in self.ledgers.items():
-					if transaction in ledger:
-						self.ledgers[asset].remove_order(transaction)
+			# Terminal orders are evicted from the index. The id also resolves
+			# orders rejected without a symbol tag
+			ledger = self._order_index.get(transaction.id)
+			if ledger is None:
+				# Never added or already removed, e.g. refused by the journal
+				log.warning("Unable to remove Order {}", transaction.id)
+				return
+			record = journal.pack_order_removal(transaction) if journal is not None else None
+			del self._order_index[transaction.id]
+			self._open_orders.discard(transaction.id)
+			ledger.remove_order(transaction)
 		elif isinstance(transaction, Trade):
-			self.ledgers[transaction.ticker].remove_trade(transaction)
+			ledger = self.ledgers[transaction.ticker]
+			record = journal.pack_trade_removal(transaction) if journal is not None else None
+			ledger.remove_trade(transaction)
 		else:
 			raise ValueError("Invalid transaction")
+		if record is not None:
+			journal.append(record)
 
 	def update_transaction(self, transaction):
 		"""
@@ -339,10 +689,47 @@ class TradingBook:
 		:param transaction: OrderUpdateEvent
 		"""
 		if isinstance(transaction, OrderUpdateEvent):
-			self.ledgers[transaction.ticker].update_order(transaction)
+			ledger = self._order_index.get(transaction.id)
+			if ledger is None:
+				log.warning("Unable to update Order {}", transaction.id)
+				return
+			journal = self.journal
+			record = journal.pack_order_update(transaction) if journal is not None else None
+			ledger.update_order(transaction)
+			if record is not None:
+				journal.append(record)
 		else:
 			raise ValueError("Invalid transaction")
 
+	def count_open_orders(self) -> int:
+		"""
+		Number of orders across all ledgers which have not reached a terminal state
+		"""
+		return sum(len(ledger.orders) for ledger in self.ledgers.values())
+
+	def sample_open_order(self, weight=None, max_weight=None, rng=random):
+		"""
+		Random open order across all ledgers in O(1), or None if no order is open.
+		Uniform unless weight is given
+
+		:param weight: callable, default=None - Weight of an order, e.g. lambda order: order.qty
+		:param max_weight: float, default=None - Upper bound of weight, required with weight
+		:param rng: random.Random, default=random
+		"""
+		if weight is None:
+			return self._open_orders.sample(rng)
+		if max_weight is None:
+			raise ValueError("max_weight is required for weighted sampling")
+		return self._open_orders.sample_weighted(weight, max_weight, rng)
+
+	def locate_order(self, order_id):
+		"""
+		Get the ledger holding an open order, or None if the order is not open
+
+		:param order_id: str
+		"""
+		return self._order_index.get(order_id)
+
 	def get_ledger(self, ticker=None):
 		"""
 		Get the ledger for a particular asset
@@ -355,7 +742,7 @@ class TradingBook:
 			try:
 				return self.ledgers[ticker]
 			except KeyError:
-				print("No such ledger in trading book to retrieve - {}".format(ticker))
+				log.warning("No such ledger in trading book to retrieve - {}", ticker)
 
 	def clear_ledger(self, ticker):
 		"""
@@ -363,69 +750,169 @@ class TradingBook:
 
 		:param ticker: str
 		"""
-		try:
-			del self.ledgers[ticker]
-		except KeyError:
-			print("No such ledger in trading book to remove - {}".format(ticker))
+		if ticker not in self.ledgers:
+			log.warning("No such ledger in trading book to remove - {}", ticker)
+			return
+		journal = self.journal
+		record = journal.pack_ledger_clear(ticker) if journal is not None else None
+		ledger = self.ledgers.pop(ticker)
+		for order_id in ledger.orders:
+			self._order_index.pop(order_id, None)
+			self._open_orders.discard(order_id)
+		if record is not None:
+			journal.append(record)
 
 	def reset_ledgers(self):
 		"""
 		Remove all ledgers
 		"""
+		journal = self.journal
+		record = journal.pack_ledgers_reset() if journal is not None else None
 		self.ledgers.clear()
+		self._order_index.clear()
+		self._open_orders.clear()
+		if record is not None:
+			journal.append(record)
+
+	def ledger_totals(self) -> dict:
+		"""
+		Trading volume, net cash, traded quantity, realized PnL and unrealized
+		PnL at the latest fill per ledger, which can be summed across books and
+		turned into VWAP
 
-	def get_book_trading_volume(self, ticker=None):
+		Returns {ticker: (volume, cash, quantity, realized, unrealized)}
+		"""
+		return {ticker: (ledger.calc_asset_trading_volume(), ledger.calc_trading_pnl(), ledger.calc_traded_quantity(),
+						 ledger.calc_realized_pnl(), ledger.calc_unrealized_pnl())
+				for ticker, ledger in self.ledgers.items()}
+
+	def get_book_trading_volume(self, ticker=None, full_scan=False):
 		"""
 		Get total trading volume for the trading book in dollar amount
 
 		:param ticker: str
+		:param full_scan: bool - Recompute from every trade, for verification
 		"""
 		trade_vol = 0
 		try:
 			if ticker is None:
 				for ledger in self.ledgers.values():
-					trade_vol += ledger.calc_asset_trading_volume()
+					trade_vol += ledger.calc_asset_trading_volume(full_scan)
 			else:
-				trade_vol += (self.get_ledger(ticker).calc_asset_trading_volume())
+				trade_vol += (self.ledgers[ticker].calc_asset_trading_volume(full_scan))
 		except KeyError:
-			print("No ledger for ticker {} to calculate trade volume".format(ticker))
+			log.warning("No ledger for ticker {} to calculate trade volume", ticker)
 		else:
 			return round(trade_vol, 2)
 				
-	def get_book_pnl(self, ticker=None):
+	def get_book_pnl(self, ticker=None, full_scan=False):
 		"""
-		Get total trading PnL for the trading book in dollar amount
+		Get net cash flow of all trades for the trading book in dollar amount
 
 		:param ticker: str
+		:param full_scan: bool - Recompute from every trade, for verification
 		"""
 		pnL = 0
 		try:
 			if ticker is None:
 				for ledger in self.ledgers.values():
-					pnL += ledger.calc_trading_pnl()
+					pnL += ledger.calc_trading_pnl(full_scan)
 			else:
-				pnL += (self.get_ledger(ticker).calc_trading_pnl())
+				pnL += (self.ledgers[ticker].calc_trading_pnl(full_scan))
 		except KeyError:
-			print("No ledger for ticker {} to calculate PnL".format(ticker))
+			log.warning("No ledger for ticker {} to calculate PnL", ticker)
 		else:
 			return round(pnL, 2)
 
-	def get_ledger_vwap(self, ticker=None):
+	def get_book_realized_pnl(self, ticker=None):
+		"""
+		Get PnL of the quantity closed by FIFO lot matching for the trading book in dollar amount
+
+		:param ticker: str
+		"""
+		pnL = 0
+		try:
+			if ticker is None:
+				for ledger in self.ledgers.values():
+					pnL += ledger.calc_realized_pnl()
+			else:
+				pnL += self.ledgers[ticker].calc_realized_pnl()
+		except KeyError:
+			log.warning("No ledger for ticker {} to calculate realized PnL", ticker)
+		else:
+			return round(pnL, 2)
+
+	def get_book_unrealized_pnl(self, marks=None, ticker=None):
+		"""
+		Get PnL of the open FIFO lots against mark prices for the trading book in dollar amount
+
+		:param marks: dict{ticker: price}, default=None - Mark prices, the price of the latest fill for tickers without one
+		:param ticker: str
+		"""
+		marks = marks or {}
+		pnL = 0
+		try:
+			if ticker is None:
+				for asset, ledger in self.ledgers.items():
+					pnL += ledger.calc_unrealized_pnl(marks.get(asset))
+			else:
+				pnL += self.ledgers[ticker].calc_unrealized_pnl(marks.get(ticker))
+		except KeyError:
+			log.warning("No ledger for ticker {} to calculate unrealized PnL", ticker)
+		else:
+			return round(pnL, 2)
+
+	def get_ledger_positions(self, ticker=None):
+		"""
+		Get net quantity and average cost of the open FIFO lots for each ledger in the trading book
+
+		:param ticker: str
+		Returns {ticker: (net quantity, average cost)}
+		"""
+		positions = {}
+		try:
+			if ticker is None:
+				for asset, ledger in self.ledgers.items():
+					positions[asset] = (ledger.calc_position(), round(ledger.calc_average_cost(), 2))
+			else:
+				ledger = self.ledgers[ticker]
+				positions[ticker] = (ledger.calc_position(), round(ledger.calc_average_cost(), 2))
+		except KeyError:
+			log.warning("No ledger for ticker {} to calculate positions", ticker)
+		else:
+			return positions
+
+	def get_ledger_vwap(self, ticker=None, full_scan=False):
 		"""
 		Get VWAP for each ledger in the trading book in dollar amount
 
 		:param ticker: str
+		:param full_scan: bool - Recompute from every trade, for verification
 		"""
 		ledger_vwap = {}
 		try:
 			if ticker is None:
 				for asset, ledger in self.ledgers.items():
-					ledger_vwap[asset] = round(ledger.calc_vwap(), 2)
+					ledger_vwap[asset] = round(ledger.calc_vwap(full_scan), 2)
 			else:
-				ledger_vwap[asset] = round(ledger.calc_vwap(), 2)
+				ledger_vwap[ticker] = round(self.ledgers[ticker].calc_vwap(full_scan), 2)
 		except KeyError:
-			print("No ledger for ticker {} to calculate VWAP".format(ticker))
+			log.warning("No ledger for ticker {} to calculate VWAP", ticker)
 		else:
 			return ledger_vwap
 
 
+def merge_ledger_totals(book_totals) -> dict:
+	"""
+	Sum TradingBook.ledger_totals() of several books per ticker
+
+	:param book_totals: iterable[dict{ticker: (volume, cash, quantity, realized, unrealized)}]
+	Returns {ticker: [volume, cash, quantity, realized, unrealized]}
+	"""
+	totals = {}
+	for ledger_totals in book_totals:
+		for ticker, values in ledger_totals.items():
+			total = totals.setdefault(ticker, [0.0, 0.0, 0.0, 0.0, 0.0])
+			for i, value in enumerate(values):
+				total[i] += value
+	return totals
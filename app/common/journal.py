@@ -0,0 +1,321 @@
+import os
+import mmap
+import struct
+import threading
+from collections import deque
+
+import quickfix as fix
+
+from app.utils.logger import (log)
+from app.utils.timestamps import (FixTimestamp, to_epoch_ns)
+from app.common.interface_order import (Order, Trade, OrderUpdateEvent)
+
+
+# Record kinds
+SNAPSHOT = 0		# Snapshot header, seq is the last journal record the snapshot includes
+ADD_ORDER = 1
+UPDATE_ORDER = 2
+REMOVE_ORDER = 3
+ADD_TRADE = 4
+REMOVE_TRADE = 5
+CLEAR_LEDGER = 6	# Ticker only
+RESET_LEDGERS = 7	# No fields
+
+# Widths of the text fields, longer values are refused rather than truncated
+TICKER_BYTES = 16
+ID_BYTES = 40
+
+# kind, side, order type, order status, ticker, id, security, qty, price, timestamp (epoch ns, 0 if unset), seq
+_record = struct.Struct("<Bccc{}s{}s4sddqQ".format(TICKER_BYTES, ID_BYTES))
+RECORD_SIZE = _record.size
+# seq is the last field, stamped when a packed record is appended
+_seq_field = struct.Struct("<Q")
+_SEQ_OFFSET = RECORD_SIZE - _seq_field.size
+
+
+class _Snapshot:
+	# Snapshot file contents queued between the records, written by the group commit thread
+	__slots__ = ("data",)
+
+	def __init__(self, data):
+		self.data = data
+
+
+def _char(value) -> bytes:
+	return value.encode() if value else b"\0"
+
+
+def _field(value, width, name) -> bytes:
+	encoded = value.encode() if value else b""
+	if len(encoded) > width:
+		raise ValueError("Journal {} longer than {} bytes - {}".format(name, width, value))
+	return encoded
+
+
+def _text(value) -> str:
+	return value.rstrip(b"\0").decode()
+
+
+class BookJournal:
+	"""
+	Append-only journal of trading book mutations in fixed size binary records.
+	Records are packed by the book's writer before it mutates the book, queued
+	without locking once the mutation is applied, then written and fsynced in
+	groups by a background thread. Every snapshot_interval records the writer
+	packs the open orders and fills into a snapshot, which the background thread
+	writes before truncating the journal. Replay on startup reads the snapshot,
+	which grows with the book's fills, and at most one interval of records.
+	Orders left open by the previous run are unknown to a counterparty which
+	resets on logon, so they are closed as stale once the book is rebuilt
+
+	Attributes  
+	path: str - Journal file, the snapshot is kept next to it in path + ".snap"  
+	sync_interval: float, default=0.05 - Seconds between group commits  
+	snapshot_interval: int, default=100000 - Records between snapshots, 0 to disable  
+	"""
+	def __init__(self, path, sync_interval=0.05, snapshot_interval=100000):
+		self.path = path
+		self.snapshot_path = path + ".snap"
+		self.sync_interval = sync_interval
+		self.snapshot_interval = snapshot_interval
+
+		self.book = None
+		self.synced = 0
+		self._seq = 0
+		self._since_snapshot = 0
+		self._pending = deque()		# Packed records and snapshots, deque append/popleft are atomic
+		self._file = None
+		self._lock = threading.Lock()	# Held by group commits, never by append()
+		self._wakeup = threading.Event()
+		self._syncer = None
+		self._running = False
+
+	def recover(self, book):
+		"""
+		Rebuild the book from the snapshot and journal, then journal its mutations
+
+		:param book: TradingBook
+		Returns the number of records replayed
+		"""
+		book.journal = None
+		base_seq, snapshot_records = self._replay(self.snapshot_path, book)
+		last_seq, journal_records = self._replay(self.path, book, base_seq)
+		self._seq = max(base_seq, last_seq)
+		log.info("Journal {} recovered {} snapshot and {} journal records", self.path, snapshot_records, journal_records)
+
+		dirname = os.path.dirname(self.path)
+		if dirname:
+			os.makedirs(dirname, exist_ok=True)
+		self._file = open(self.path, "ab")
+		size = self._file.tell()
+		if size % RECORD_SIZE:
+			# Drop a record torn by a crash, appended records must stay aligned
+			self._file.truncate(size - size % RECORD_SIZE)
+		self.book = book
+		book.journal = self
+		self._running = True
+		self._syncer = threading.Thread(target=self._sync_forever, name="journal-sync", daemon=True)
+		self._syncer.start()
+		stale = self._close_open_orders(book)
+		if stale:
+			log.warning("Journal {} closed {} orders left open by the previous run", self.path, stale)
+		if journal_records or stale:
+			# Start from a compact journal rather than replaying it again next time
+			self.snapshot()
+		return snapshot_records + journal_records
+
+	def close(self):
+		"""
+		Write and fsync all queued records, and stop the group commit thread
+		"""
+		if not self._running:
+			return
+		self._running = False
+		self._wakeup.set()
+		self._syncer.join()
+		self._syncer = None
+		self._file.close()
+		self._file = None
+		self.book.journal = None
+
+	def pack(self, kind, transaction) -> bytes:
+		"""
+		Pack a record of a book mutation, called by the book's writer before it
+		mutates the book, so a value too long for the record is refused with the
+		book untouched. Nothing is queued until the record is appended
+
+		:param kind: int - ADD_ORDER, UPDATE_ORDER, REMOVE_ORDER, ADD_TRADE, REMOVE_TRADE, CLEAR_LEDGER or RESET_LEDGERS
+		:param transaction: Order | OrderUpdateEvent | Trade | str - The ticker for CLEAR_LEDGER, None for RESET_LEDGERS
+		Raises ValueError if the ticker or id is longer than its field
+		"""
+		return self._pack(kind, transaction, 0)
+
+	def append(self, record):
+		"""
+		Queue a packed record once the book has applied its mutation
+
+		:param record: bytes - Returned by pack
+		"""
+		self._seq += 1
+		self._pending.append(record[:_SEQ_OFFSET] + _seq_field.pack(self._seq))
+		if self.snapshot_interval:
+			self._since_snapshot += 1
+			if self._since_snapshot >= self.snapshot_interval:
+				self.snapshot()
+
+	def pack_order(self, order) -> bytes:
+		return self.pack(ADD_ORDER, order)
+
+	def pack_order_update(self, order_event) -> bytes:
+		return self.pack(UPDATE_ORDER, order_event)
+
+	def pack_order_removal(self, order_event) -> bytes:
+		return self.pack(REMOVE_ORDER, order_event)
+
+	def pack_trade(self, trade) -> bytes:
+		return self.pack(ADD_TRADE, trade)
+
+	def pack_trade_removal(self, trade) -> bytes:
+		return self.pack(REMOVE_TRADE, trade)
+
+	def pack_ledger_clear(self, ticker) -> bytes:
+		return self.pack(CLEAR_LEDGER, ticker)
+
+	def pack_ledgers_reset(self) -> bytes:
+		return self.pack(RESET_LEDGERS, None)
+
+	def snapshot(self):
+		"""
+		Queue the book's open orders and fills as a snapshot. Called on the book's
+		writer, so the book matches the last record. The group commit thread
+		writes and fsyncs the snapshot, then truncates the journal
+		"""
+		book = self.book
+		records = [_record.pack(SNAPSHOT, b"\0", b"\0", b"\0", b"", b"", b"", 0.0, 0.0, 0, self._seq)]
+		for ledger in book.ledgers.values():
+			records.extend(self._pack(ADD_ORDER, order, 0) for order in ledger.orders.values())
+			# Fills one by one in arrival order, so replay merges trades and matches lots as they were
+			records.extend(self._pack(ADD_TRADE, fill, 0) for fill in ledger.get_fills())
+		self._pending.append(_Snapshot(b"".join(records)))
+		self._since_snapshot = 0
+
+	def _sync_forever(self):
+		while self._running:
+			self._wakeup.wait(self.sync_interval)
+			self._sync()
+		self._sync()
+
+	def _sync(self):
+		with self._lock:
+			pending = self._pending
+			if not pending:
+				return
+			records = [pending.popleft() for _ in range(len(pending))]
+			# Records queued before the latest snapshot are part of it
+			for index in range(len(records) - 1, -1, -1):
+				if isinstance(records[index], _Snapshot):
+					self._write_snapshot(records[index].data)
+					records = records[index + 1:]
+					break
+			if records:
+				self._file.write(b"".join(records))
+			self._file.flush()
+			os.fsync(self._file.fileno())
+			self.synced += len(records)
+
+	def _write_snapshot(self, data):
+		temp_path = self.snapshot_path + ".tmp"
+		with open(temp_path, "wb") as snapshot_file:
+			snapshot_file.write(data)
+			snapshot_file.flush()
+			os.fsync(snapshot_file.fileno())
+		os.replace(temp_path, self.snapshot_path)
+		# Records up to the snapshot's seq are skipped on replay, should truncating not complete
+		self._file.truncate(0)
+
+	@staticmethod
+	def _close_open_orders(book) -> int:
+		# Journaled as removals, so the next recovery does not find them open
+		stale = [OrderUpdateEvent(order.id, status=fix.OrdStatus_CANCELED, ticker=ticker, side=order.side)
+				 for ticker, ledger in book.ledgers.items() for order in ledger.orders.values()]
+		for order_event in stale:
+			book.erase_transaction(order_event)
+		return len(stale)
+
+	@staticmethod
+	def _pack(kind, transaction, seq) -> bytes:
+		if kind == CLEAR_LEDGER or kind == RESET_LEDGERS:
+			return _record.pack(kind, b"\0", b"\0", b"\0", _field(transaction, TICKER_BYTES, "ticker"), b"", b"",
+								0.0, 0.0, 0, seq)
+		ticker = _field(transaction.ticker, TICKER_BYTES, "ticker")
+		_id = _field(transaction.id, ID_BYTES, "id")
+		if kind == ADD_ORDER and isinstance(transaction, Order):
+			return _record.pack(kind, _char(transaction.side), _char(transaction.ordtyp), _char(transaction.ord_status),
+								ticker, _id, _char(transaction.security),
+								transaction.qty, transaction.price, to_epoch_ns(transaction.timestamp), seq)
+		if kind == ADD_TRADE or kind == REMOVE_TRADE:
+			return _record.pack(kind, _char(transaction.side), b"\0", b"\0",
+								ticker, _id, b"",
+								transaction.qty, transaction.price, to_epoch_ns(transaction.timestamp), seq)
+		return _record.pack(kind, _char(transaction.side), b"\0", _char(transaction.status),
+							ticker, _id, b"",
+							transaction.qty or 0.0, transaction.price or 0.0, to_epoch_ns(transaction.timestamp), seq)
+
+	@staticmethod
+	def _replay(path, book, after_seq=0):
+		"""
+		Apply the records of a journal or snapshot file to the book. A torn
+		record at the end of the file is ignored
+
+		Returns (last seq, records applied)
+		"""
+		try:
+			size = os.path.getsize(path)
+		except OSError:
+			return 0, 0
+		size -= size % RECORD_SIZE
+		if not size:
+			return 0, 0
+
+		last_seq = 0
+		applied = 0
+		unpack_from = _record.unpack_from
+		with open(path, "rb") as journal_file, \
+			 mmap.mmap(journal_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			for offset in range(0, size, RECORD_SIZE):
+				kind, side, ordtyp, status, ticker, _id, security, qty, price, timestamp, seq = unpack_from(data, offset)
+				if kind == SNAPSHOT:
+					last_seq = seq
+					continue
+				if seq and seq <= after_seq:
+					continue
+				last_seq = max(last_seq, seq)
+				ticker = _text(ticker)
+				side = _text(side) or None
+				timestamp = FixTimestamp(timestamp) if timestamp else None
+				if ticker and ticker not in book.ledgers:
+					book.ledgers[ticker] = book.ledger_cls(ticker)
+
+				if kind == ADD_ORDER:
+					order = Order(ticker, side, qty, _text(ordtyp), _text(security), price)
+					order.id = _text(_id)
+					order.timestamp = timestamp
+					order.ord_status = _text(status) or None
+					book.log_transaction(order)
+				elif kind == UPDATE_ORDER:
+					book.update_transaction(OrderUpdateEvent(_text(_id), timestamp, qty, price, _text(status) or None, ticker or None, side))
+				elif kind == REMOVE_ORDER:
+					book.erase_transaction(OrderUpdateEvent(_text(_id), timestamp, qty, price, _text(status) or None, ticker or None, side))
+				elif kind == ADD_TRADE:
+					book.log_transaction(Trade(_text(_id), timestamp, ticker, side, qty, price))
+				elif kind == REMOVE_TRADE:
+					book.erase_transaction(Trade(_text(_id), timestamp, ticker, side, qty, price))
+				elif kind == CLEAR_LEDGER:
+					book.clear_ledger(ticker)
+				elif kind == RESET_LEDGERS:
+					book.reset_ledgers()
+				else:
+					log.warning("Unknown journal record kind {} in {}", kind, path)
+					continue
+				applied += 1
+		return last_seq, applied
@@ -0,0 +1,265 @@
+import time
+import quickfix as fix
+
+from app.common.interface_order import (Order, Trade)
+from app.utils.histogram import (LogHistogram)
+
+
+# Limits a rejected order would break
+REJECT_ORDER_QTY = "order_qty"
+REJECT_ORDER_NOTIONAL = "order_notional"
+REJECT_POSITION = "position"
+REJECT_GROSS_NOTIONAL = "gross_notional"
+REJECT_NO_PRICE = "no_price"			# Market order with notional limits before the ticker has a fill
+
+
+class PreTradeReject(Exception):
+	"""
+	An order refused by the pre-trade check, reported by FixClient.sendOrderBatch
+	"""
+	def __init__(self, reason):
+		super().__init__("Pre-trade limit - {}".format(reason))
+		self.reason = reason
+
+
+class RiskLimits:
+	"""
+	Pre-trade limits of a ticker
+
+	Attributes  
+	max_order_qty: float, default=None - Largest quantity of a single order  
+	max_order_notional: float, default=None - Largest notional of a single order  
+	max_position: float, default=None - Largest net long or short quantity, counting open orders as filled  
+	max_gross_notional: float, default=None - Largest notional traded plus open  
+	"""
+	__slots__ = ("max_order_qty", "max_order_notional", "max_position", "max_gross_notional")
+
+	def __init__(self, max_order_qty=None, max_order_notional=None, max_position=None, max_gross_notional=None):
+		self.max_order_qty = max_order_qty
+		self.max_order_notional = max_order_notional
+		self.max_position = max_position
+		self.max_gross_notional = max_gross_notional
+
+
+class Position:
+	"""
+	Net position and exposure of a ticker. Exposure reserved by the pre-trade
+	check (sent_) is only written by the sending thread, and exposure released
+	by fills and terminal orders (done_) only by the book's writer, so the
+	open exposure is read without locking
+
+	Attributes  
+	ticker: str  
+	"""
+	__slots__ = ("ticker", "net_qty", "gross_notional", "last_price",
+				 "sent_buy_qty", "sent_sell_qty", "sent_notional",
+				 "done_buy_qty", "done_sell_qty", "done_notional")
+
+	def __init__(self, ticker):
+		self.ticker = ticker
+		self.net_qty = 0.0			# Bought less sold
+		self.gross_notional = 0.0	# Notional traded on either side
+		self.last_price = 0.0		# Values market orders, 0 until the first fill
+		self.sent_buy_qty = 0.0
+		self.sent_sell_qty = 0.0
+		self.sent_notional = 0.0
+		self.done_buy_qty = 0.0
+		self.done_sell_qty = 0.0
+		self.done_notional = 0.0
+
+	@property
+	def open_buy_qty(self) -> float:
+		return self.sent_buy_qty - self.done_buy_qty
+
+	@property
+	def open_sell_qty(self) -> float:
+		return self.sent_sell_qty - self.done_sell_qty
+
+	@property
+	def open_notional(self) -> float:
+		return self.sent_notional - self.done_notional
+
+
+class PositionEngine:
+	"""
+	Tracks net quantity, open order exposure and gross notional per ticker
+	from the trading book callbacks, and checks new orders against limits
+	before they are sent. Every check is constant time and its cost is
+	recorded in check_latency
+
+	Attributes  
+	limits: RiskLimits, default=None - Limits of every ticker, no limits if None  
+	ticker_limits: dict{ticker: RiskLimits}, default=None - Limits replacing the default for some tickers  
+	"""
+	def __init__(self, limits=None, ticker_limits=None):
+		self.limits = limits if limits is not None else RiskLimits()
+		self.ticker_limits = ticker_limits or {}
+		self.positions = {}					# {ticker: Position}
+		self.rejected = {}					# {reason: count}
+		self.check_latency = LogHistogram()	# Nanoseconds per check
+		self._reserved = {}		# {order id: [Position, is buy, qty, notional per unit]} from the check, taken over by the book's writer
+		self._orders = {}		# {order id: [Position, is buy, open qty, notional per unit]}, book's writer only
+
+	def _position(self, ticker) -> Position:
+		position = self.positions.get(ticker)
+		if position is None:
+			position = self.positions.setdefault(ticker, Position(ticker))
+		return position
+
+	def load_book(self, book):
+		"""
+		Start from the net quantity and gross notional of the trades already in
+		a book, e.g. one recovered from its journal. Orders left open in the book
+		were not checked and are not counted as exposure
+
+		:param book: TradingBook
+		"""
+		for ticker, ledger in book.ledgers.items():
+			position = self._position(ticker)
+			for side, side_stats in ledger.calc_side_breakdown().items():
+				position.net_qty += side_stats["qty"] if side == fix.Side_BUY else -side_stats["qty"]
+				position.gross_notional += side_stats["volume"]
+				position.last_price = side_stats["vwap"] or position.last_price
+
+	def callbacks(self) -> dict:
+		"""
+		Handlers for the trading book events, labelled as FixClient.app_event_callbacks
+		"""
+		return {"add": self.on_add, "remove": self.on_remove, "add_batch": self.on_add_batch}
+
+	def check(self, order):
+		"""
+		Pre-trade check of an order with its id assigned, on the sending thread.
+		An accepted order counts as open exposure straight away
+
+		:param order: Order
+		Returns None if accepted, else the limit the order would break
+		"""
+		start = time.perf_counter_ns()
+		reason = self._check(order)
+		self.check_latency.record(time.perf_counter_ns() - start)
+		if reason is not None:
+			self.rejected[reason] = self.rejected.get(reason, 0) + 1
+		return reason
+
+	def _check(self, order):
+		position = self._position(order.ticker)
+		limits = self.ticker_limits.get(order.ticker, self.limits)
+		qty = order.qty
+		price = order.price or position.last_price
+		notional = qty * price
+		buy = order.side == fix.Side_BUY
+
+		if not price and (limits.max_order_notional is not None or limits.max_gross_notional is not None):
+			# A market order cannot be valued before the ticker has traded
+			return REJECT_NO_PRICE
+		if limits.max_order_qty is not None and qty > limits.max_order_qty:
+			return REJECT_ORDER_QTY
+		if limits.max_order_notional is not None and notional > limits.max_order_notional:
+			return REJECT_ORDER_NOTIONAL
+		if limits.max_position is not None:
+			# Worst case, every open order on the same side fills
+			if buy:
+				worst = position.net_qty + position.sent_buy_qty - position.done_buy_qty + qty
+			else:
+				worst = position.sent_sell_qty - position.done_sell_qty + qty - position.net_qty
+			if worst > limits.max_position:
+				return REJECT_POSITION
+		if limits.max_gross_notional is not None and \
+				position.gross_notional + position.sent_notional - position.done_notional + notional > limits.max_gross_notional:
+			return REJECT_GROSS_NOTIONAL
+
+		if buy:
+			position.sent_buy_qty += qty
+		else:
+			position.sent_sell_qty += qty
+		position.sent_notional += notional
+		self._reserved[order.id] = [position, buy, qty, price]
+		return None
+
+	def on_add(self, transaction):
+		"""
+		:param transaction: Order | OrderUpdateEvent | Trade
+		"""
+		if isinstance(transaction, Trade):
+			self._on_fill(transaction)
+		elif isinstance(transaction, Order):
+			self._on_order(transaction)
+
+	def on_add_batch(self, orders):
+		"""
+		:param orders: list[Order]
+		"""
+		for order in orders:
+			self._on_order(order)
+
+	def on_remove(self, order_event):
+		"""
+		Release the exposure left on an order which is FILLED, CANCELED or REJECTED
+
+		:param order_event: OrderUpdateEvent
+		"""
+		entry = self._orders.pop(order_event.id, None)
+		if entry is None:
+			# Removed before the book saw the order, e.g. it failed to send
+			entry = self._reserved.pop(order_event.id, None)
+			if entry is None:
+				return
+		self._release(entry, entry[2])
+
+	def _on_order(self, order):
+		# Orders sent without a check are not counted as exposure
+		entry = self._reserved.pop(order.id, None)
+		if entry is not None:
+			self._orders[order.id] = entry
+
+	def _on_fill(self, trade):
+		position = self._position(trade.ticker)
+		if trade.side == fix.Side_BUY:
+			position.net_qty += trade.qty
+		else:
+			position.net_qty -= trade.qty
+		position.gross_notional += trade.qty * trade.price
+		position.last_price = trade.price
+
+		entry = self._orders.get(trade.id)
+		if entry is not None:
+			filled = min(trade.qty, entry[2])
+			entry[2] -= filled
+			self._release(entry, filled)
+
+	@staticmethod
+	def _release(entry, qty):
+		position, buy, _, unit_notional = entry
+		if buy:
+			position.done_buy_qty += qty
+		else:
+			position.done_sell_qty += qty
+		position.done_notional += qty * unit_notional
+
+	def summary(self) -> dict:
+		"""
+		Returns {"positions": {ticker: (net qty, open buy qty, open sell qty, gross notional)},
+		"rejected": {reason: count}, "check_latency": LogHistogram}
+		"""
+		return {"positions": {ticker: (position.net_qty, position.open_buy_qty, position.open_sell_qty, position.gross_notional)
+							  for ticker, position in self.positions.items()},
+				"rejected": dict(self.rejected),
+				"check_latency": self.check_latency}
+
+
+def merge_risk_summaries(summaries) -> dict:
+	"""
+	Sum PositionEngine.summary() of several engines
+
+	:param summaries: iterable[dict]
+	"""
+	merged = {"positions": {}, "rejected": {}, "check_latency": LogHistogram()}
+	for summary in summaries:
+		for ticker, values in summary["positions"].items():
+			totals = merged["positions"].get(ticker, (0.0, 0.0, 0.0, 0.0))
+			merged["positions"][ticker] = tuple(total + value for total, value in zip(totals, values))
+		for reason, count in summary["rejected"].items():
+			merged["rejected"][reason] = merged["rejected"].get(reason, 0) + count
+		merged["check_latency"].merge(summary["check_latency"])
+	return merged
@@ -0,0 +1,177 @@
+import time
+
+from app.common.interface_order import (Trade)
+
+
+# Default windows, label and span in seconds
+DEFAULT_WINDOWS = (("1s", 1), ("1m", 60), ("5m", 300))
+
+
+class RollingWindow:
+	"""
+	Fill count, quantity and notional over a sliding time window, held in a
+	fixed ring of time buckets. A bucket is reset when its slot is reused
+	by a later bucket, so nothing is expired eagerly and memory does not
+	grow with the length of the session
+
+	Attributes  
+	span_ns: int - Window length in nanoseconds  
+	buckets: int, default=60 - Number of buckets, the window edge moves one bucket at a time  
+	"""
+	__slots__ = ("span_ns", "buckets", "width_ns", "_epoch", "_count", "_qty", "_notional")
+
+	def __init__(self, span_ns, buckets=60):
+		if span_ns <= 0 or buckets <= 0:
+			raise ValueError("Invalid rolling window - {} ns in {} buckets".format(span_ns, buckets))
+		self.span_ns = span_ns
+		self.buckets = buckets
+		self.width_ns = -(-span_ns // buckets)
+		self._epoch = [-1] * buckets		# Bucket number held by each slot
+		self._count = [0] * buckets
+		self._qty = [0.0] * buckets
+		self._notional = [0.0] * buckets
+
+	def add(self, timestamp, qty, price):
+		"""
+		:param timestamp: int - Epoch nanoseconds of the fill
+		:param qty: float
+		:param price: float
+		"""
+		epoch = timestamp // self.width_ns
+		slot = epoch % self.buckets
+		held = self._epoch[slot]
+		if held != epoch:
+			if held > epoch:
+				# Older than the window already
+				return
+			self._epoch[slot] = epoch
+			self._count[slot] = 0
+			self._qty[slot] = 0.0
+			self._notional[slot] = 0.0
+		self._count[slot] += 1
+		self._qty[slot] += qty
+		self._notional[slot] += qty * price
+
+	def totals(self, now=None) -> tuple:
+		"""
+		Sum the buckets inside the window ending at now, O(buckets)
+
+		:param now: int, default=None - Epoch nanoseconds, the current time if None
+		Returns (fill count, quantity, notional)
+		"""
+		current = (time.time_ns() if now is None else now) // self.width_ns
+		oldest = current - self.buckets
+		count, qty, notional = 0, 0.0, 0.0
+		for slot, epoch in enumerate(self._epoch):
+			if oldest < epoch <= current:
+				count += self._count[slot]
+				qty += self._qty[slot]
+				notional += self._notional[slot]
+		return count, qty, notional
+
+
+class RollingStats:
+	"""
+	Rolling volume, VWAP and fill counts per ticker, fed every fill by the
+	trading book's "add" events. Fills are bucketed by the local time they
+	are applied, the clock the windows are read against, so the counterparty's
+	SendingTime and any clock skew to it do not move fills between windows.
+	Queries may run on any thread while the book thread adds fills, a
+	bucket being reset at that moment is read as empty or as before
+
+	Attributes  
+	windows: tuple[(label, seconds)], default=DEFAULT_WINDOWS - Windows kept per ticker  
+	buckets: int, default=60 - Buckets per window  
+	"""
+	def __init__(self, windows=DEFAULT_WINDOWS, buckets=60):
+		self.windows = tuple(windows)
+		self.buckets = buckets
+		self.tickers = {}		# {ticker: {label: RollingWindow}}
+
+	def _ticker_windows(self, ticker) -> dict:
+		windows = self.tickers.get(ticker)
+		if windows is None:
+			windows = self.tickers[ticker] = {label: RollingWindow(int(seconds * 1e9), self.buckets)
+											  for label, seconds in self.windows}
+		return windows
+
+	def callbacks(self) -> dict:
+		"""
+		Handlers for the trading book events, labelled as FixClient.app_event_callbacks
+		"""
+		return {"add": self.on_add}
+
+	def on_add(self, transaction):
+		"""
+		:param transaction: Order | OrderUpdateEvent | Trade
+		"""
+		if isinstance(transaction, Trade):
+			self.add_fill(transaction)
+
+	def add_fill(self, trade, timestamp=None):
+		"""
+		:param trade: Trade - A single fill
+		:param timestamp: int, default=None - Epoch nanoseconds to bucket the fill at, the current time if None
+		"""
+		if timestamp is None:
+			timestamp = time.time_ns()
+		for window in self._ticker_windows(trade.ticker).values():
+			window.add(timestamp, trade.qty, trade.price)
+
+	def totals(self, ticker, window, now=None) -> tuple:
+		"""
+		:param ticker: str
+		:param window: str - Label of the window, e.g. "1m"
+		:param now: int, default=None - Epoch nanoseconds, the current time if None
+		Returns (fill count, quantity, notional), zeros for a ticker without fills
+		"""
+		windows = self.tickers.get(ticker)
+		if windows is None:
+			return 0, 0.0, 0.0
+		return windows[window].totals(now)
+
+	def volume(self, ticker, window, now=None) -> float:
+		"""
+		Trading volume over the window in dollar amount
+		"""
+		return self.totals(ticker, window, now)[2]
+
+	def vwap(self, ticker, window, now=None) -> float:
+		"""
+		VWAP over the window, 0 without fills
+		"""
+		_, qty, notional = self.totals(ticker, window, now)
+		return notional / qty if qty else 0.0
+
+	def fills(self, ticker, window, now=None) -> int:
+		"""
+		Number of fills over the window
+		"""
+		return self.totals(ticker, window, now)[0]
+
+	def snapshot(self, now=None) -> dict:
+		"""
+		Every window of every ticker at one point in time
+
+		:param now: int, default=None - Epoch nanoseconds, the current time if None
+		Returns {ticker: {label: (fill count, quantity, notional)}}
+		"""
+		now = time.time_ns() if now is None else now
+		return {ticker: {label: window.totals(now) for label, window in windows.items()}
+				for ticker, windows in list(self.tickers.items())}
+
+
+def merge_rolling_snapshots(snapshots) -> dict:
+	"""
+	Sum RollingStats.snapshot() of several books per ticker and window
+
+	:param snapshots: iterable[dict]
+	"""
+	merged = {}
+	for snapshot in snapshots:
+		for ticker, windows in snapshot.items():
+			merged_windows = merged.setdefault(ticker, {})
+			for label, (count, qty, notional) in windows.items():
+				total = merged_windows.get(label, (0, 0.0, 0.0))
+				merged_windows[label] = (total[0] + count, total[1] + qty, total[2] + notional)
+	return merged
@@ -2,21 +2,82 @@ from abc import ABC, abstractmethod
 import quickfix as fix
 
 from app.client.fix_client import (FixClient)
+from app.utils.logger import (log, LEVELS)
+from app.utils.backends import (resolve_backends, create_connector, LOG_NULL)
 
 
 class _BaseSession(ABC):
-	def __init__(self, args):
+	def __init__(self, args, settings=None):
 		self.args = args
+		log.configure(level=LEVELS[args.log_level],
+					  sample_rate=args.log_sample,
+					  compact=args.log_compact)
 		self.config_file = args.config
-		self.settings = fix.SessionSettings(self.config_file)
-		self.application = FixClient()
-		self.storeFactory = fix.FileStoreFactory(self.settings)
-		self.logFactory = fix.FileLogFactory(self.settings)
-		self.initiator = fix.SocketInitiator(self.application,
-											 self.storeFactory,
-											 self.settings,
-											 self.logFactory)
+		# Every [SESSION] in the settings is started, orders are routed across them
+		self.settings = settings if settings is not None else fix.SessionSettings(self.config_file)
+		self.application = FixClient(args.route)
+		# Store and log backends from the command line, else the configuration
+		self.store_backend, self.log_backend = resolve_backends(self.settings, args.store, args.log_backend)
+		log.configure(messages=self.log_backend != LOG_NULL)
+		self.initiator, self.storeFactory, self.logFactory = create_connector(fix.SocketInitiator,
+																			  self.application,
+																			  self.settings,
+																			  self.store_backend,
+																			  self.log_backend)
 
 	@abstractmethod
 	def start(self):
-		pass
\ No newline at end of file
+		pass
+
+
+def session_ids(config_file):
+	"""
+	Sessions defined in a configuration file, in a stable order. Read from
+	its [SESSION] blocks, as SessionSettings.getSessions() is not iterable
+	in the Python bindings
+
+	:param config_file: str
+	"""
+	defaults = {}
+	sessions = []
+	section = None
+	with open(config_file) as f:
+		for line in f:
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+			if line.startswith("["):
+				section = line.strip("[]").strip().upper()
+				if section == "SESSION":
+					sessions.append({})
+				continue
+			key, sep, value = line.partition("=")
+			if not sep:
+				continue
+			if section == "DEFAULT":
+				defaults[key.strip()] = value.strip()
+			elif section == "SESSION":
+				sessions[-1][key.strip()] = value.strip()
+
+	ids = []
+	for session in sessions:
+		fields = dict(defaults, **session)
+		try:
+			ids.append(fix.SessionID(fields["BeginString"], fields["SenderCompID"], fields["TargetCompID"],
+									 fields.get("SessionQualifier", "")))
+		except KeyError as e:
+			raise ValueError("Session in {} is missing {}".format(config_file, e))
+	return sorted(ids, key=str)
+
+
+def single_session_settings(settings, session_id):
+	"""
+	Copy of the settings holding the defaults and one session only
+
+	:param settings: fix.SessionSettings
+	:param session_id: fix.SessionID
+	"""
+	shard_settings = fix.SessionSettings()
+	shard_settings.set(settings.get())
+	shard_settings.set(session_id, settings.get(session_id))
+	return shard_settings
@@ -1,9 +1,87 @@
 import time
-import random
+import cProfile
+import argparse
+from functools import partial
+import multiprocessing
+import quickfix as fix
 
-from ._base_user_session import (_BaseSession)
-from app.utils.tools import (gen_synthetic_orders)
-from app.common.interface_order import (TradingBook)
+from ._base_user_session import (_BaseSession, session_ids, single_session_settings)
+from app.client.session_router import (ROUTE_HASH, shard_of)
+from app.utils.tools import (gen_synthetic_order_stream)
+from app.common.interface_order import (AssetLedger, TradingBook, merge_ledger_totals)
+from app.common.columnar_ledger import (ColumnarAssetLedger)
+from app.common.journal import (BookJournal)
+from app.client.sequencer import (EventSequencer, chain_handlers)
+from app.common.risk import (PositionEngine, RiskLimits, merge_risk_summaries)
+from app.common.rolling_window import (RollingStats, merge_rolling_snapshots)
+from app.client.latency import (LatencyTracker)
+from app.utils.logger import (log)
+from app.utils.metrics import (FixMetrics, MetricsServer, book_metrics, sequencer_metrics, risk_metrics,
+							   rolling_metrics, logger_metrics)
+from app.utils.profiler import (StageProfiler, merge_stage_reports)
+from app.utils.rate_control import (DeadlineScheduler, OrderMix, parse_burst_profile)
+
+
+def print_latency_table(latency):
+	"""
+	Print p50/p99/p99.9/max latency per metric, for all tickers and per ticker
+
+	:param latency: LatencyTracker
+	"""
+	print("-"*70)
+	print(f"{'Latency (ms)':<26}{'count':>8}{'p50':>9}{'p99':>9}{'p99.9':>9}{'max':>9}")
+	for metric, by_ticker in latency.summary().items():
+		for ticker, histogram in by_ticker.items():
+			label = metric if ticker == "all" else f"  {ticker}"
+			print(f"{label:<26}{histogram.count:>8}"
+				  f"{histogram.percentile(50)/1e6:>9.3f}{histogram.percentile(99)/1e6:>9.3f}"
+				  f"{histogram.percentile(99.9)/1e6:>9.3f}{histogram.max/1e6:>9.3f}")
+
+
+def print_risk_table(risk):
+	"""
+	Print net position, open exposure and gross notional per ticker, with
+	pre-trade rejections and the cost of the check
+
+	:param risk: dict - PositionEngine.summary()
+	"""
+	print("-"*70)
+	print(f"{'Ticker':<10}{'Net Qty':>12}{'Open Buy':>12}{'Open Sell':>12}{'Gross (USD)':>20}")
+	for ticker, (net_qty, open_buy, open_sell, gross) in sorted(risk["positions"].items()):
+		print(f"{ticker:<10}{net_qty:>12.0f}{open_buy:>12.0f}{open_sell:>12.0f}{gross:>20.2f}")
+	check = risk["check_latency"]
+	rejected = ", ".join(f"{reason} {count}" for reason, count in sorted(risk["rejected"].items())) or "none"
+	print(f"Risk Check:\t{check.count} checks, {check.percentile(50)/1e3:.2f} us p50, "
+		  f"{check.percentile(99)/1e3:.2f} us p99, {check.max/1e3:.2f} us max")
+	print(f"Rejected:\t{rejected}")
+
+
+def print_rolling_table(snapshot):
+	"""
+	Print rolling trade volume, VWAP and fill count per ticker and window
+
+	:param snapshot: dict - RollingStats.snapshot()
+	"""
+	print("-"*70)
+	print(f"{'Rolling':<16}{'fills':>10}{'Trade Vol (USD)':>22}{'VWAP':>12}")
+	for ticker, windows in sorted(snapshot.items()):
+		for label, (count, qty, notional) in windows.items():
+			print(f"{ticker + ' ' + label:<16}{count:>10}{notional:>22.2f}{notional / qty if qty else 0:>12.2f}")
+
+
+def print_profile_table(report):
+	"""
+	Print calls, total, mean and maximum time per profiled stage, slowest total first
+
+	:param report: dict - StageProfiler.report()
+	"""
+	print("Stage Profile")
+	print("="*70)
+	print(f"{'Stage':<34}{'calls':>9}{'total ms':>10}{'mean us':>9}{'max us':>8}")
+	for stage, (count, total, longest) in sorted(report.items(), key=lambda item: item[1][1], reverse=True):
+		print(f"{stage:<34}{count:>9}{total/1e6:>10.1f}{total/count/1e3:>9.2f}{longest/1e3:>8.0f}")
+	print("="*70)
+	print("\n")
 
 
 class DemoTradingBook(TradingBook):
@@ -11,37 +89,46 @@ class DemoTradingBook(TradingBook):
 	Trading book for purpose of demonstration
 	Includes some qol methods which a typical trading book may not require/differ
 	"""
-	def __init__(self, name, assets):
-		super().__init__(name, assets)
+	def __init__(self, name, assets, ledger_cls=AssetLedger, journal=None):
+		super().__init__(name, assets, ledger_cls, journal)
 
 	def get_random_order(self):
 		"""
 		Get random available orders for sending cancellation orders to
-		the server for the purpose of this demonstration
-		"""
-		_sym = random.choice( list( self.ledgers.keys() ) )
-		_ledger = self.get_ledger(_sym)
-		_orders = _ledger.get_order()
-		if _orders:	
-			order_id = random.choice( list( _orders.keys() ) )
-			return _ledger.get_order(order_id)
-		else:
-			return None
+		the server for the purpose of this demonstration, None if no order is open
+		"""
+		return self.sample_open_order()
 
-	def display_stats(self):
+	def display_stats(self, latency=None, risk=None, rolling=None):
 		"""
-		Display trade volume, PnL and VWAP stats for
-		all assets within the trading book
+		Display trade volume, net cash, FIFO PnL and VWAP stats for
+		all assets within the trading book, and order latency
+		percentiles if a latency tracker is given. Open lots are
+		marked at the price of the latest fill
+
+		:param latency: LatencyTracker
+		:param risk: dict - PositionEngine.summary()
+		:param rolling: dict - RollingStats.snapshot()
 		"""
 		trade_vol = self.get_book_trading_volume()
-		pnL = self.get_book_pnl()
+		cash = self.get_book_pnl()
+		realized = self.get_book_realized_pnl()
+		unrealized = self.get_book_unrealized_pnl()
 		vwap = self.get_ledger_vwap()
 		print("\n")
 		print("Trading Session Stats")
 		print("="*70)
 		print(f"Trade Vol:\t{trade_vol} USD")
-		print(f"PnL:\t\t{pnL} USD")
+		print(f"Net Cash:\t{cash} USD")
+		print(f"Realized PnL:\t{realized} USD")
+		print(f"Unrealized PnL:\t{unrealized} USD")
 		print(f"VWAP:\t\t{vwap}")
+		if latency is not None:
+			print_latency_table(latency)
+		if risk is not None:
+			print_risk_table(risk)
+		if rolling is not None:
+			print_rolling_table(rolling)
 		print("="*70)
 		print("\n")
 
@@ -49,38 +136,124 @@ class DemoTradingBook(TradingBook):
 class DemoSession(_BaseSession):
 	"""
 	Demo session for sending buy and cancel orders to FIX server
+
+	Attributes  
+	args: argparse.Namespace - Parsed main.py arguments  
+	settings: fix.SessionSettings, default=None - Settings to use instead of args.config, e.g. for one shard  
+	tickers: list[str], default=None - Tickers to trade, MSFT, AAPL and BAC if None  
+	orders: int, default=None - Number of new orders to send, args.order if None  
+	rate: float, default=None - Target messages per second, args.rate if None  
 	"""
-	def __init__(self, args):
-		super().__init__(args)
-		self.tickers = ["MSFT", "AAPL", "BAC"]
+	default_tickers = ["MSFT", "AAPL", "BAC"]
+
+	def __init__(self, args, settings=None, tickers=None, orders=None, rate=None):
+		super().__init__(args, settings)
+		self.tickers = list(tickers) if tickers is not None else list(self.default_tickers)
+		self.orders = orders if orders is not None else args.order
+		self.rate = rate if rate is not None else args.rate
+		self.rolling = None		# RollingStats of the last run
+		self.profiler = None	# StageProfiler of the last run, with args.profile
 
 	def start(self):
 		"""
-		Start the demo session
+		Start the demo session, with one process per FIX session if args.shard_procs is set
 		"""
-		demo_account = DemoTradingBook("fix-demo", self.tickers)
+		if self.args.shard_procs:
+			self.start_sharded()
+			return
+		result = self.run()
+		if result is not None:
+			demo_account, load_stats = result
+			# Display calculated stats after end of trading session
+			demo_account.display_stats(self.application.latency, self.application.risk.summary(), self.rolling.snapshot())
+			self.display_load_stats(load_stats)
+			if self.profiler is not None:
+				print_profile_table(self.profiler.report())
+
+	def run(self):
+		"""
+		Run the trading session on every session in the settings
+
+		Returns (DemoTradingBook, load stats dict), or None if the session failed
+		"""
+		ledger_cls = ColumnarAssetLedger if self.args.columnar else AssetLedger
+		# A journalled book is rebuilt from the previous run before trading
+		journal = BookJournal(self.args.journal) if self.args.journal else None
+		demo_account = DemoTradingBook("fix-demo", self.tickers, ledger_cls, journal)
 		callback_methods = {"add": demo_account.log_transaction,
 							"remove": demo_account.erase_transaction,
-							"update": demo_account.update_transaction}
-		self.application.register_app_event_callback(callback_methods)
+							"update": demo_account.update_transaction,
+							"add_batch": demo_account.log_orders}
+		# Positions follow the book events, and every new order is checked against the limits before sending
+		positions = PositionEngine(RiskLimits(self.args.max_order_qty, self.args.max_order_notional,
+											  self.args.max_position, self.args.max_gross_notional))
+		positions.load_book(demo_account)
+		self.application.risk = positions
+		# Rolling 1s/1m/5m volume, VWAP and fill counts per ticker
+		self.rolling = RollingStats()
+		handler_maps = [callback_methods, positions.callbacks(), self.rolling.callbacks()]
+		self.profiler = None
+		if self.args.profile:
+			# Only wrapped with --profile, the callbacks and send path are untouched otherwise
+			self.profiler = StageProfiler()
+			handler_maps = [self.profiler.wrap_handlers(handlers, prefix)
+							for handlers, prefix in zip(handler_maps, ("book", "risk", "rolling"))]
+			self.profiler.instrument(self.application, ("fromApp", "_handle_exec_report", "sendNewOrder", "sendOrderBatch", "cancelOrder"))
+			self.profiler.instrument(positions, ("check",), "risk")
+			self.profiler.instrument(fix.Session, ("sendToTarget",))
+		# Book events are applied by a single book thread, in the order they arrive
+		sequencer = EventSequencer(chain_handlers(*handler_maps), batch=self.args.batch_drain)
+		self.application.register_app_event_callback(sequencer.callbacks())
+		self.application.latency = LatencyTracker()
+		metrics_server = None
+		if self.args.metrics_port is not None:
+			# Gauges are read from the book and its consumers only when scraped
+			self.application.metrics = FixMetrics()
+			metrics_server = MetricsServer([self.application.metrics.collect,
+											partial(book_metrics, demo_account),
+											partial(sequencer_metrics, sequencer),
+											partial(risk_metrics, positions),
+											partial(rolling_metrics, self.rolling),
+											logger_metrics],
+										   self.args.metrics_port)
+		profile = parse_burst_profile(self.args.burst) if self.args.burst else None
+		scheduler = DeadlineScheduler(self.rate, profile)
+		order_mix = OrderMix(self.args.threshold)
+		# Drawn in vectorized batches ahead of the send loop, reproducible with --seed
+		order_stream = gen_synthetic_order_stream(self.tickers, count=self.orders, seed=self.args.seed)
+		# Captures the thread running the session, the stage timers cover the quickfix and book threads
+		capture = cProfile.Profile() if self.args.profile_out else None
 		try:
+			if capture is not None:
+				capture.enable()
+			sequencer.start()
+			if metrics_server is not None:
+				metrics_server.start()
 			self.initiator.start()
 			time.sleep(1)
 			count = 0
-			while (count < self.args.order):
-				choice = random.random()
-				if choice <= self.args.threshold:
-					order = gen_synthetic_orders(self.tickers)
+			cancels = 0
+			scheduler.start()
+			while (count < self.orders):
+				scheduler.wait()
+				select_order = None
+				if not order_mix.next_is_new():
+					# Cancel orders randomly, or keep the slot with a new order if none are open
+					select_order = demo_account.get_random_order()
+				if select_order is not None:
+					self.application.cancelOrder(select_order.to_fix_cancel())
+					cancels += 1
+				else:
+					order = next(order_stream)
 					self.application.sendNewOrder(order)
 					count += 1
-				else:
-					# Cancel orders randomly
-					select_order = demo_account.get_random_order()
-					if select_order is not None:
-						self.application.cancelOrder(select_order.to_fix_cancel())
-				time.sleep(0.1)
-			# Buffer to allow all server updates to be captured before calculating trading stats
-			time.sleep(15)
+			load_stats = scheduler.report()
+			load_stats["new_orders"] = count
+			load_stats["cancels"] = cancels
+			# Wait for outstanding orders to reach a terminal state before calculating trading stats
+			drain_start = time.perf_counter()
+			load_stats["open_orders"] = self.await_quiescence(demo_account, self.args.drain_timeout, sequencer)
+			load_stats["drain_time"] = time.perf_counter() - drain_start
 
 			## DEBUG
 			# for ticker in self.tickers:
@@ -88,8 +261,189 @@ class DemoSession(_BaseSession):
 			# 	print(demo_account.get_ledger(ticker).get_trade())
 
 			self.initiator.stop()
-			# Display calculated stats after end of trading session
-			demo_account.display_stats()
+			# Apply the remaining book events before calculating trading stats
+			sequencer.stop()
+			if metrics_server is not None:
+				metrics_server.stop()
+			if journal is not None:
+				journal.close()
+			if capture is not None:
+				capture.disable()
+				capture.dump_stats(self.args.profile_out)
+				log.info("Profile written to {}", self.args.profile_out)
+			if self.profiler is not None:
+				self.profiler.restore()
+			load_stats.update(sequencer.report())
+			load_stats["open_orders"] = demo_account.count_open_orders()
+			# Flush pending log records so the stats report is printed last
+			log.stop()
+			return demo_account, load_stats
 		except Exception as e:
-			print(e)
+			sequencer.stop()
+			if metrics_server is not None:
+				metrics_server.stop()
+			if journal is not None:
+				journal.close()
+			if capture is not None:
+				capture.disable()
+			if self.profiler is not None:
+				self.profiler.restore()
+			log.error("{}", e)
+
+	def plan_shards(self):
+		"""
+		Split the sessions, tickers, orders and rate into one shard per FIX session.
+		Tickers are assigned by hash, or dealt out in turn for round-robin routing
+
+		Returns list[(session index, tickers, orders, rate)] for shards with tickers
+		"""
+		shard_count = len(session_ids(self.config_file))
+		if self.args.route == ROUTE_HASH:
+			shard_tickers = [[t for t in self.tickers if shard_of(t, shard_count) == i] for i in range(shard_count)]
+		else:
+			shard_tickers = [sorted(self.tickers)[i::shard_count] for i in range(shard_count)]
+
+		shards = []
+		assigned = 0
+		active = [(i, tickers) for i, tickers in enumerate(shard_tickers) if tickers]
+		for n, (index, tickers) in enumerate(active):
+			if n == len(active) - 1:
+				orders = self.orders - assigned
+			else:
+				orders = round(self.orders * len(tickers) / len(self.tickers))
+			assigned += orders
+			shards.append((index, tickers, orders, self.rate * orders / self.orders if self.orders else self.rate))
+		return shards
+
+	def start_sharded(self):
+		"""
+		Run each FIX session of the settings in its own process with its own
+		trading book, then merge the per-ticker results into one report
+		"""
+		shards = self.plan_shards()
+		log.info("Starting {} shard processes", len(shards))
+		context = multiprocessing.get_context("spawn")
+		with context.Pool(len(shards)) as pool:
+			results = pool.starmap(_run_shard, [(self.args,) + shard for shard in shards])
+		results = [result for result in results if result is not None]
+		if not results:
+			log.error("No shard completed its session")
+			return
+		log.stop()
+		self.display_merged_stats(results)
+
+	def display_merged_stats(self, results):
+		"""
+		Display stats merged across shard processes
+
+		:param results: list[dict] - Returned by each shard process
+		"""
+		totals = merge_ledger_totals(result["ledgers"] for result in results)
+		latency = LatencyTracker()
+		for result in results:
+			for key, histogram in result["latency"].items():
+				if key in latency.histograms:
+					latency.histograms[key].merge(histogram)
+				else:
+					latency.histograms[key] = histogram
+
+		trade_vol = round(sum(total[0] for total in totals.values()), 2)
+		cash = round(sum(total[1] for total in totals.values()), 2)
+		realized = round(sum(total[3] for total in totals.values()), 2)
+		unrealized = round(sum(total[4] for total in totals.values()), 2)
+		vwap = {ticker: round(total[0] / total[2], 2) if total[2] else 0 for ticker, total in totals.items()}
+		print("\n")
+		print("Trading Session Stats ({} shards)".format(len(results)))
+		print("="*70)
+		print(f"Trade Vol:\t{trade_vol} USD")
+		print(f"Net Cash:\t{cash} USD")
+		print(f"Realized PnL:\t{realized} USD")
+		print(f"Unrealized PnL:\t{unrealized} USD")
+		print(f"VWAP:\t\t{vwap}")
+		print_latency_table(latency)
+		print_risk_table(merge_risk_summaries(result["risk"] for result in results))
+		print_rolling_table(merge_rolling_snapshots(result["rolling"] for result in results))
+		print("="*70)
+		print("\n")
+
+		loads = [result["load"] for result in results]
+		released = sum(load["released"] for load in loads)
+		self.display_load_stats({"released": released,
+								 "new_orders": sum(load["new_orders"] for load in loads),
+								 "cancels": sum(load["cancels"] for load in loads),
+								 "requested_rate": sum(load["requested_rate"] for load in loads),
+								 "achieved_rate": sum(load["achieved_rate"] for load in loads),
+								 "mean_lag": sum(load["mean_lag"] * load["released"] for load in loads) / released if released else 0.0,
+								 "max_lag": max(load["max_lag"] for load in loads),
+								 "open_orders": sum(load["open_orders"] for load in loads),
+								 "applied": sum(load["applied"] for load in loads),
+								 "max_queue_depth": max(load["max_queue_depth"] for load in loads),
+								 "drain_time": max(load["drain_time"] for load in loads)})
+		if self.args.profile:
+			print_profile_table(merge_stage_reports(result["profile"] for result in results))
+
+	def await_quiescence(self, book, timeout, sequencer=None, poll_interval=0.05):
+		"""
+		Block until every order in the book is FILLED, CANCELED or REJECTED,
+		and every queued book event is applied, or until the timeout elapses
+
+		:param book: TradingBook
+		:param timeout: float - Seconds
+		:param sequencer: EventSequencer, default=None - Sequencer applying the book events
+		:param poll_interval: float - Seconds between checks
+		Returns the number of orders still open
+		"""
+		deadline = time.perf_counter() + timeout
+		while True:
+			open_orders = book.count_open_orders()
+			if not open_orders and (sequencer is None or sequencer.is_idle()):
+				break
+			if time.perf_counter() >= deadline:
+				break
+			time.sleep(poll_interval)
+		return open_orders
+
+	def display_load_stats(self, load_stats):
+		"""
+		Display requested against achieved message rate of the order generator
+
+		:param load_stats: dict - DeadlineScheduler.report() and EventSequencer.report() with new_orders, cancels, open_orders and drain_time
+		"""
+		print("Load Generation Stats")
+		print("="*70)
+		print(f"Messages:\t{load_stats['released']} ({load_stats['new_orders']} new, {load_stats['cancels']} cancel)")
+		print(f"Requested:\t{load_stats['requested_rate']:.1f} msg/s")
+		print(f"Achieved:\t{load_stats['achieved_rate']:.1f} msg/s")
+		print(f"Send Lag:\t{load_stats['mean_lag']*1e3:.3f} ms mean, {load_stats['max_lag']*1e3:.3f} ms max")
+		print(f"Book Queue:\t{load_stats['applied']} events applied, {load_stats['max_queue_depth']} max depth")
+		print(f"Shutdown:\t{load_stats['open_orders']} orders still open after {load_stats['drain_time']:.2f} s")
+		print("="*70)
+		print("\n")
+
 
+def _run_shard(args, session_index, tickers, orders, rate):
+	# Entry point of a shard process, runs one FIX session with its own trading book
+	args = argparse.Namespace(**vars(args))
+	args.shard_procs = False
+	if args.journal:
+		args.journal = "{}.{}".format(args.journal, session_index)
+	if args.seed is not None:
+		args.seed += session_index
+	if args.metrics_port:
+		args.metrics_port += session_index
+	if args.profile_out:
+		args.profile_out = "{}.{}".format(args.profile_out, session_index)
+	settings = fix.SessionSettings(args.config)
+	session_id = session_ids(args.config)[session_index]
+	shard = DemoSession(args, single_session_settings(settings, session_id), tickers, orders, rate)
+	result = shard.run()
+	if result is None:
+		return None
+	demo_account, load_stats = result
+	return {"session": str(session_id),
+			"ledgers": demo_account.ledger_totals(),
+			"latency": shard.application.latency.histograms,
+			"risk": shard.application.risk.summary(),
+			"rolling": shard.rolling.snapshot(),
+			"profile": shard.profiler.report() if shard.profiler is not None else None,
+			"load": load_stats}
@@ -0,0 +1,85 @@
+import quickfix as fix
+
+
+# Message store backends
+STORE_FILE = "file"			# FileStore under FileStorePath, survives restarts
+STORE_MEMORY = "memory"		# Kept in memory, lost on restart
+STORE_BACKENDS = (STORE_FILE, STORE_MEMORY)
+
+# Message log backends
+LOG_FILE = "file"			# FileLog under FileLogPath, written on the send and receive path
+LOG_SCREEN = "screen"		# ScreenLog to stdout
+LOG_NULL = "null"			# No quickfix log
+LOG_ASYNC = "async"			# No quickfix log, FIX messages are left to the application's AsyncLogger
+LOG_BACKENDS = (LOG_FILE, LOG_SCREEN, LOG_NULL, LOG_ASYNC)
+
+# Keys in the [DEFAULT] section of the configuration
+STORE_BACKEND_KEY = "StoreBackend"
+LOG_BACKEND_KEY = "LogBackend"
+
+
+def resolve_backends(settings, store=None, log_backend=None) -> tuple:
+	"""
+	Store and log backends to use, from the arguments if given, else the
+	StoreBackend and LogBackend configuration keys, else file
+
+	:param settings: fix.SessionSettings
+	:param store: str, default=None
+	:param log_backend: str, default=None
+	Returns (store backend, log backend)
+	"""
+	defaults = settings.get()
+	if store is None:
+		store = defaults.getString(STORE_BACKEND_KEY) if defaults.has(STORE_BACKEND_KEY) else STORE_FILE
+	if log_backend is None:
+		log_backend = defaults.getString(LOG_BACKEND_KEY) if defaults.has(LOG_BACKEND_KEY) else LOG_FILE
+	store, log_backend = store.lower(), log_backend.lower()
+	if store not in STORE_BACKENDS:
+		raise ValueError("Invalid store backend - {}".format(store))
+	if log_backend not in LOG_BACKENDS:
+		raise ValueError("Invalid log backend - {}".format(log_backend))
+	return store, log_backend
+
+
+def create_store_factory(store, settings):
+	"""
+	:param store: str - One of STORE_BACKENDS
+	:param settings: fix.SessionSettings
+	"""
+	if store == STORE_FILE:
+		return fix.FileStoreFactory(settings)
+	return fix.MemoryStoreFactory()
+
+
+def create_log_factory(log_backend, settings):
+	"""
+	:param log_backend: str - One of LOG_BACKENDS
+	:param settings: fix.SessionSettings
+	Returns a fix.LogFactory, or None if quickfix should not log
+	"""
+	if log_backend == LOG_FILE:
+		return fix.FileLogFactory(settings)
+	if log_backend == LOG_SCREEN:
+		return fix.ScreenLogFactory(settings)
+	return None
+
+
+def create_connector(connector_cls, application, settings, store=None, log_backend=None):
+	"""
+	Build a SocketInitiator or SocketAcceptor with the chosen backends
+
+	:param connector_cls: type - fix.SocketInitiator | fix.SocketAcceptor
+	:param application: fix.Application
+	:param settings: fix.SessionSettings
+	:param store: str, default=None - Store backend, see resolve_backends
+	:param log_backend: str, default=None - Log backend, see resolve_backends
+	Returns (connector, store factory, log factory), the factories must outlive the connector
+	"""
+	store, log_backend = resolve_backends(settings, store, log_backend)
+	store_factory = create_store_factory(store, settings)
+	log_factory = create_log_factory(log_backend, settings)
+	if log_factory is None:
+		connector = connector_cls(application, store_factory, settings)
+	else:
+		connector = connector_cls(application, store_factory, settings, log_factory)
+	return connector, store_factory, log_factory
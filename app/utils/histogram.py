@@ -0,0 +1,97 @@
+class LogHistogram:
+	"""
+	HDR-style histogram of non-negative integer values, e.g. latencies in
+	nanoseconds. Values below 2**sub_bucket_bits are counted exactly. Above
+	that each power of two is split into 2**(sub_bucket_bits-1) linear
+	sub-buckets, so the relative error is at most 2**-(sub_bucket_bits-1)
+	whatever the magnitude. Recording is a few integer operations and a
+	list increment
+
+	Attributes  
+	sub_bucket_bits: int, default=8 - Precision of the buckets, 8 bits is under 1% error  
+	"""
+	__slots__ = ("sub_bucket_bits", "_half", "counts", "count", "total", "min", "max")
+
+	def __init__(self, sub_bucket_bits=8):
+		self.sub_bucket_bits = sub_bucket_bits
+		self._half = 1 << (sub_bucket_bits - 1)
+		self.counts = [0] * (2 * self._half)
+		self.count = 0
+		self.total = 0
+		self.min = None
+		self.max = 0
+
+	def _index(self, value):
+		shift = value.bit_length() - self.sub_bucket_bits
+		if shift <= 0:
+			return value
+		return shift * self._half + (value >> shift)
+
+	def _value_at(self, index):
+		# Midpoint of the values counted in a bucket
+		if index < 2 * self._half:
+			return index
+		shift = index // self._half - 1
+		mantissa = index - shift * self._half
+		return (mantissa << shift) + ((1 << shift) >> 1)
+
+	def record(self, value):
+		"""
+		Record one value
+
+		:param value: int
+		"""
+		if value < 0:
+			value = 0
+		index = self._index(value)
+		counts = self.counts
+		if index >= len(counts):
+			counts.extend([0] * (index + 1 - len(counts)))
+		counts[index] += 1
+		self.count += 1
+		self.total += value
+		if value > self.max:
+			self.max = value
+		if self.min is None or value < self.min:
+			self.min = value
+
+	def merge(self, other):
+		"""
+		Add the counts of another histogram with the same precision
+
+		:param other: LogHistogram
+		"""
+		if other.sub_bucket_bits != self.sub_bucket_bits:
+			raise ValueError("Cannot merge histograms of different precision")
+		if len(other.counts) > len(self.counts):
+			self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+		for index, count in enumerate(other.counts):
+			if count:
+				self.counts[index] += count
+		self.count += other.count
+		self.total += other.total
+		self.max = max(self.max, other.max)
+		if other.min is not None and (self.min is None or other.min < self.min):
+			self.min = other.min
+		return self
+
+	def percentile(self, percent) -> int:
+		"""
+		Value at or below which the given percentage of values fall
+
+		:param percent: float - Between 0 and 100
+		"""
+		if not self.count:
+			return 0
+		rank = max(1, -(-self.count * percent // 100))
+		if rank >= self.count:
+			return self.max
+		seen = 0
+		for index, count in enumerate(self.counts):
+			seen += count
+			if seen >= rank:
+				return min(self._value_at(index), self.max)
+		return self.max
+
+	def mean(self) -> float:
+		return self.total / self.count if self.count else 0.0
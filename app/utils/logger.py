@@ -0,0 +1,186 @@
+import sys
+import atexit
+import threading
+from collections import deque
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+_level_names = {value: name for name, value in LEVELS.items()}
+
+# Tags kept for compact message records
+_compact_header_tags = (35, 34, 52)		# MsgType, MsgSeqNum, SendingTime
+_compact_body_tags = (11, 41, 39, 55, 54, 38, 44, 32, 31, 58)
+
+
+class _FieldRecord(tuple):
+	# (tag, value) pairs of a compact message record, rendered by the writer
+	__slots__ = ()
+
+	def __str__(self):
+		return "|".join("{}={}".format(tag, value) for tag, value in self)
+
+
+class AsyncLogger:
+	"""
+	Logger which keeps the caller's path down to an enqueue. Records are
+	formatted and written in batches by a background writer thread
+
+	Attributes  
+	level: int, default=INFO - Minimum level of records to keep  
+	sample_rate: int, default=1 - Keep one in every sample_rate FIX message records  
+	compact: bool, default=False - Log selected tags of FIX messages instead of the full message  
+	messages: bool, default=True - Log FIX messages, False keeps only the other records  
+	max_queue: int, default=100000 - Records arriving while the queue is full are dropped and counted  
+	batch_size: int, default=1000 - Maximum records written per batch  
+	flush_interval: float, default=0.05 - Seconds between writer wakeups  
+	stream: default=sys.stdout - Destination of the log records  
+	"""
+	def __init__(self, level=INFO, sample_rate=1, compact=False, messages=True, max_queue=100000,
+				 batch_size=1000, flush_interval=0.05, stream=None):
+		self.level = level
+		self.sample_rate = sample_rate
+		self.compact = compact
+		self.messages = messages
+		self.max_queue = max_queue
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.stream = stream
+
+		self.dropped = 0
+		self._sampled = 0
+		self._queue = deque()		# deque append/popleft are atomic, no lock on the hot path
+		self._wakeup = threading.Event()
+		self._writer = None
+		self._running = False
+		self._start_lock = threading.Lock()
+
+	def configure(self, **settings):
+		"""
+		Update logger attributes, e.g. configure(level=WARNING, compact=True)
+
+		:param settings: dict{attribute: value}
+		"""
+		for name, value in settings.items():
+			if not hasattr(self, name) or name.startswith("_"):
+				raise ValueError("Invalid logger setting - {}".format(name))
+			setattr(self, name, value)
+
+	def start(self):
+		"""
+		Start the background writer thread
+		"""
+		with self._start_lock:
+			if self._running:
+				return
+			self._running = True
+			self._writer = threading.Thread(target=self._drain_forever, name="log-writer", daemon=True)
+			self._writer.start()
+
+	def stop(self):
+		"""
+		Stop the background writer after writing all queued records
+		"""
+		if not self._running:
+			self._drain()
+			return
+		self._running = False
+		self._wakeup.set()
+		self._writer.join()
+		self._writer = None
+		self._drain()
+
+	def queue_depth(self) -> int:
+		return len(self._queue)
+
+	def log(self, level, fmt, *args):
+		"""
+		Queue a record. Formatting with fmt.format(*args) is deferred to the writer
+
+		:param level: int
+		:param fmt: str
+		"""
+		if level < self.level:
+			return
+		if len(self._queue) >= self.max_queue:
+			self.dropped += 1
+			return
+		self._queue.append((level, fmt, args))
+		if not self._running:
+			self.start()
+
+	def debug(self, fmt, *args):
+		self.log(DEBUG, fmt, *args)
+
+	def info(self, fmt, *args):
+		self.log(INFO, fmt, *args)
+
+	def warning(self, fmt, *args):
+		self.log(WARNING, fmt, *args)
+
+	def error(self, fmt, *args):
+		self.log(ERROR, fmt, *args)
+
+	def log_message(self, source, message, level=INFO, raw=None):
+		"""
+		Queue a FIX message record, subject to sampling. The full message is
+		copied out as a string unless the caller already holds it, the compact
+		record reads only selected tags
+
+		:param source: str
+		:param message: fix.Message
+		:param level: int
+		:param raw: str, default=None - message.toString() if the caller already made it
+		"""
+		if level < self.level or not self.messages:
+			return
+		if self.sample_rate > 1:
+			self._sampled += 1
+			if self._sampled % self.sample_rate:
+				return
+		if self.compact:
+			record = []
+			header = message.getHeader()
+			for tag in _compact_header_tags:
+				if header.isSetField(tag):
+					record.append((tag, header.getField(tag)))
+			for tag in _compact_body_tags:
+				if message.isSetField(tag):
+					record.append((tag, message.getField(tag)))
+			record = _FieldRecord(record)
+		else:
+			record = raw if raw is not None else message.toString()
+		self.log(level, "{}: {}", source, record)
+
+	@staticmethod
+	def _format(level, fmt, args):
+		line = fmt.format(*args) if args else fmt
+		if level >= WARNING:
+			line = "{}: {}".format(_level_names[level], line)
+		return line.replace("\x01", "|") + "\n"
+
+	def _drain(self):
+		# Write queued records in batches of at most batch_size
+		stream = self.stream or sys.stdout
+		queue = self._queue
+		while queue:
+			lines = []
+			for _ in range(min(self.batch_size, len(queue))):
+				lines.append(self._format(*queue.popleft()))
+			stream.write("".join(lines))
+			stream.flush()
+
+	def _drain_forever(self):
+		while self._running:
+			self._wakeup.wait(self.flush_interval)
+			self._wakeup.clear()
+			self._drain()
+
+
+# Shared logger used across the client, trading book and sessions
+log = AsyncLogger()
+atexit.register(log.stop)
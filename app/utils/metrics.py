@@ -0,0 +1,241 @@
+import threading
+import quickfix as fix
+from http.server import (BaseHTTPRequestHandler, HTTPServer)
+
+from app.utils.logger import (log)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_PATH = "/metrics"
+
+COUNTER = "counter"
+GAUGE = "gauge"
+
+_msg_type_names = {fix.MsgType_Heartbeat: "Heartbeat",
+				   fix.MsgType_TestRequest: "TestRequest",
+				   fix.MsgType_ResendRequest: "ResendRequest",
+				   fix.MsgType_Reject: "Reject",
+				   fix.MsgType_SequenceReset: "SequenceReset",
+				   fix.MsgType_Logout: "Logout",
+				   fix.MsgType_Logon: "Logon",
+				   fix.MsgType_ExecutionReport: "ExecutionReport",
+				   fix.MsgType_OrderCancelReject: "OrderCancelReject",
+				   fix.MsgType_NewOrderSingle: "NewOrderSingle",
+				   fix.MsgType_OrderCancelRequest: "OrderCancelRequest"}
+
+_ord_status_names = {fix.OrdStatus_NEW: "new",
+					 fix.OrdStatus_PARTIALLY_FILLED: "partially_filled",
+					 fix.OrdStatus_FILLED: "filled",
+					 fix.OrdStatus_CANCELED: "canceled",
+					 fix.OrdStatus_REJECTED: "rejected"}
+
+
+class FixMetrics:
+	"""
+	Message counters updated from the FixClient callbacks. Each update is
+	one dict increment, everything else is derived when scraped. Messages
+	of one type are counted on one thread, except resends, so increments
+	are not locked
+	"""
+	def __init__(self):
+		self.sent = {}				# {MsgType: count}
+		self.received = {}			# {MsgType: count}
+		self.exec_reports = {}		# {OrdStatus: count}
+
+	def on_send(self, msg_type):
+		self.sent[msg_type] = self.sent.get(msg_type, 0) + 1
+
+	def on_receive(self, msg_type):
+		self.received[msg_type] = self.received.get(msg_type, 0) + 1
+
+	def on_exec_report(self, ord_status):
+		self.exec_reports[ord_status] = self.exec_reports.get(ord_status, 0) + 1
+
+	def collect(self):
+		"""
+		Returns a generator of metric families (name, type, help, [(labels, value)])
+		"""
+		sent, received, exec_reports = dict(self.sent), dict(self.received), dict(self.exec_reports)
+		yield ("fixclient_messages_sent_total", COUNTER, "FIX messages sent by MsgType",
+			   [(_msg_type_labels(msg_type), count) for msg_type, count in sorted(sent.items())])
+		yield ("fixclient_messages_received_total", COUNTER, "FIX messages received by MsgType",
+			   [(_msg_type_labels(msg_type), count) for msg_type, count in sorted(received.items())])
+		yield ("fixclient_exec_reports_total", COUNTER, "Execution reports received by OrdStatus",
+			   [({"ord_status": _ord_status_names.get(status, status)}, count) for status, count in sorted(exec_reports.items())])
+		yield ("fixclient_fills_total", COUNTER, "Partial and full fills received",
+			   [({}, exec_reports.get(fix.OrdStatus_PARTIALLY_FILLED, 0) + exec_reports.get(fix.OrdStatus_FILLED, 0))])
+		yield ("fixclient_order_rejects_total", COUNTER, "Orders rejected by the counterparty",
+			   [({}, exec_reports.get(fix.OrdStatus_REJECTED, 0))])
+		yield ("fixclient_session_rejects_total", COUNTER, "Session level Reject messages received",
+			   [({}, received.get(fix.MsgType_Reject, 0))])
+		yield ("fixclient_cancel_rejects_total", COUNTER, "Order Cancel Reject messages received",
+			   [({}, received.get(fix.MsgType_OrderCancelReject, 0))])
+
+
+def _msg_type_labels(msg_type) -> dict:
+	return {"msg_type": msg_type, "name": _msg_type_names.get(msg_type, "")}
+
+
+def book_metrics(book):
+	"""
+	Open orders, trade volume, net cash, realized PnL, net position and VWAP per ledger
+
+	:param book: TradingBook
+	"""
+	ledgers = list(book.ledgers.items())
+	yield ("fixclient_open_orders", GAUGE, "Orders open in the trading book",
+		   [({"ticker": ticker}, len(ledger.orders)) for ticker, ledger in ledgers])
+	yield ("fixclient_trade_volume_usd", GAUGE, "Trading volume of the session",
+		   [({"ticker": ticker}, ledger.calc_asset_trading_volume()) for ticker, ledger in ledgers])
+	yield ("fixclient_net_cash_usd", GAUGE, "Cash flow of all trades, sells less buys",
+		   [({"ticker": ticker}, ledger.calc_trading_pnl()) for ticker, ledger in ledgers])
+	yield ("fixclient_realized_pnl_usd", GAUGE, "PnL of the quantity closed by FIFO lot matching",
+		   [({"ticker": ticker}, ledger.calc_realized_pnl()) for ticker, ledger in ledgers])
+	yield ("fixclient_position", GAUGE, "Net traded quantity, negative when short",
+		   [({"ticker": ticker}, ledger.calc_position()) for ticker, ledger in ledgers])
+	yield ("fixclient_vwap", GAUGE, "VWAP of the session",
+		   [({"ticker": ticker}, ledger.calc_vwap()) for ticker, ledger in ledgers])
+
+
+def sequencer_metrics(sequencer):
+	"""
+	Queue depth, events applied and handler errors of the book thread
+
+	:param sequencer: EventSequencer
+	"""
+	yield ("fixclient_book_queue_depth", GAUGE, "Book events waiting for the book thread", [({}, sequencer.queue_depth())])
+	yield ("fixclient_book_queue_max_depth", GAUGE, "Largest number of book events waiting", [({}, sequencer.max_depth)])
+	yield ("fixclient_book_events_applied_total", COUNTER, "Book events applied", [({}, sequencer.applied)])
+	yield ("fixclient_book_handler_errors_total", COUNTER, "Book events whose handler raised", [({}, sequencer.errors)])
+
+
+def risk_metrics(engine):
+	"""
+	Pre-trade checks and rejections, and open exposure per ticker
+
+	:param engine: PositionEngine
+	"""
+	positions = list(engine.positions.items())
+	yield ("fixclient_pretrade_checks_total", COUNTER, "New orders checked against the pre-trade limits",
+		   [({}, engine.check_latency.count)])
+	yield ("fixclient_pretrade_rejects_total", COUNTER, "New orders refused by the pre-trade check by limit",
+		   [({"reason": reason}, count) for reason, count in sorted(engine.rejected.items())])
+	yield ("fixclient_open_buy_qty", GAUGE, "Quantity of open buy orders",
+		   [({"ticker": ticker}, position.open_buy_qty) for ticker, position in positions])
+	yield ("fixclient_open_sell_qty", GAUGE, "Quantity of open sell orders",
+		   [({"ticker": ticker}, position.open_sell_qty) for ticker, position in positions])
+	yield ("fixclient_open_notional_usd", GAUGE, "Notional of open orders",
+		   [({"ticker": ticker}, position.open_notional) for ticker, position in positions])
+
+
+def rolling_metrics(rolling):
+	"""
+	Rolling volume, VWAP and fill counts per ticker and window
+
+	:param rolling: RollingStats
+	"""
+	snapshot = sorted(rolling.snapshot().items())
+	samples = [({"ticker": ticker, "window": label}, totals) for ticker, windows in snapshot for label, totals in windows.items()]
+	yield ("fixclient_rolling_fills", GAUGE, "Fills over the window", [(labels, count) for labels, (count, _, _) in samples])
+	yield ("fixclient_rolling_volume_usd", GAUGE, "Trading volume over the window",
+		   [(labels, notional) for labels, (_, _, notional) in samples])
+	yield ("fixclient_rolling_vwap", GAUGE, "VWAP over the window",
+		   [(labels, notional / qty if qty else 0.0) for labels, (_, qty, notional) in samples])
+
+
+def logger_metrics(logger=log):
+	"""
+	Queue depth and dropped records of the application log
+
+	:param logger: AsyncLogger, default=log
+	"""
+	yield ("fixclient_log_queue_depth", GAUGE, "Log records waiting for the writer thread", [({}, logger.queue_depth())])
+	yield ("fixclient_log_dropped_total", COUNTER, "Log records dropped while the queue was full", [({}, logger.dropped)])
+
+
+def _escape(value) -> str:
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(collectors) -> str:
+	"""
+	Render every metric family in the Prometheus text format
+
+	:param collectors: list[callable] - Each returns an iterable of (name, type, help, [(labels, value)])
+	"""
+	lines = []
+	for collect in collectors:
+		try:
+			families = list(collect())
+		except Exception as e:
+			# One failing source does not fail the scrape
+			log.warning("Unable to collect metrics - {}", repr(e))
+			continue
+		for name, kind, help_text, samples in families:
+			lines.append("# HELP {} {}".format(name, help_text))
+			lines.append("# TYPE {} {}".format(name, kind))
+			for labels, value in samples:
+				label_text = ",".join('{}="{}"'.format(key, _escape(label)) for key, label in labels.items())
+				lines.append("{}{} {}".format(name, "{" + label_text + "}" if label_text else "",
+											  value if isinstance(value, int) else float(value)))
+	return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+	"""
+	Local HTTP endpoint serving the collectors at /metrics from a daemon
+	thread. Metrics are only gathered when scraped
+
+	Attributes  
+	collectors: list[callable] - See render  
+	port: int - Port to listen on, 0 for any free port  
+	host: str, default="127.0.0.1" - Address to listen on  
+	"""
+	def __init__(self, collectors, port, host="127.0.0.1"):
+		self.collectors = list(collectors)
+		self.port = port
+		self.host = host
+		self._server = None
+		self._thread = None
+
+	def start(self):
+		"""
+		Bind and serve in the background
+		"""
+		if self._server is not None:
+			return
+		collectors = self.collectors
+
+		class _Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path.split("?", 1)[0] != METRICS_PATH:
+					self.send_error(404)
+					return
+				body = render(collectors).encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", CONTENT_TYPE)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, fmt, *args):
+				# Keep scrapes out of the console
+				return
+
+		self._server = HTTPServer((self.host, self.port), _Handler)
+		self.port = self._server.server_address[1]
+		self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+		self._thread.start()
+		log.info("Serving metrics on http://{}:{}{}", self.host, self.port, METRICS_PATH)
+
+	def stop(self):
+		"""
+		Stop serving and close the socket
+		"""
+		if self._server is None:
+			return
+		self._server.shutdown()
+		self._server.server_close()
+		self._thread.join()
+		self._server = None
+		self._thread = None
@@ -0,0 +1,98 @@
+import time
+from functools import wraps
+
+
+_missing = object()
+
+
+class StageProfiler:
+	"""
+	Call count, total and maximum time per stage of the methods it wraps.
+	Methods are only wrapped when a profiler is installed, so without one
+	nothing is timed and the callers run their own code unchanged. Stages
+	nest, e.g. fromApp includes _handle_exec_report
+	"""
+	def __init__(self):
+		self.stages = {}		# {stage: [count, total ns, max ns]}
+		self._patched = []		# [(owner, name, previous value in owner.__dict__)]
+
+	def wrap(self, stage, method):
+		"""
+		Time every call of a method under a stage
+
+		:param stage: str
+		:param method: callable
+		"""
+		stats = self.stages.setdefault(stage, [0, 0, 0])
+		clock = time.perf_counter_ns
+
+		@wraps(method)
+		def timed(*args, **kwargs):
+			start = clock()
+			try:
+				return method(*args, **kwargs)
+			finally:
+				elapsed = clock() - start
+				stats[0] += 1
+				stats[1] += elapsed
+				if elapsed > stats[2]:
+					stats[2] = elapsed
+		return timed
+
+	def instrument(self, owner, names, prefix=None):
+		"""
+		Replace methods of an object or class with timed wrappers, undone by restore
+
+		:param owner: object | type
+		:param names: iterable[str] - Method names
+		:param prefix: str, default=None - Stage prefix, the class name if None
+		"""
+		if prefix is None:
+			prefix = owner.__name__ if isinstance(owner, type) else type(owner).__name__
+		for name in names:
+			previous = vars(owner).get(name, _missing)
+			timed = self.wrap("{}.{}".format(prefix, name), getattr(owner, name))
+			# Static methods of a class, e.g. fix.Session.sendToTarget, stay static
+			setattr(owner, name, staticmethod(timed) if isinstance(previous, staticmethod) else timed)
+			self._patched.append((owner, name, previous))
+
+	def wrap_handlers(self, handlers, prefix):
+		"""
+		Timed copy of a handler map, e.g. the trading book callbacks
+
+		:param handlers: dict{label: method}
+		:param prefix: str
+		"""
+		return {label: self.wrap("{}.{}".format(prefix, label), method) if method is not None else None
+				for label, method in handlers.items()}
+
+	def restore(self):
+		"""
+		Put back every method replaced by instrument
+		"""
+		while self._patched:
+			owner, name, previous = self._patched.pop()
+			if previous is _missing:
+				delattr(owner, name)
+			else:
+				setattr(owner, name, previous)
+
+	def report(self) -> dict:
+		"""
+		Returns {stage: (count, total ns, max ns)} for stages called at least once
+		"""
+		return {stage: tuple(stats) for stage, stats in self.stages.items() if stats[0]}
+
+
+def merge_stage_reports(reports) -> dict:
+	"""
+	Sum StageProfiler.report() of several processes per stage
+
+	:param reports: iterable[dict]
+	"""
+	merged = {}
+	for report in reports:
+		for stage, (count, total, longest) in report.items():
+			merged_count, merged_total, merged_longest = merged.get(stage, (0, 0, 0))
+			merged[stage] = (merged_count + count, merged_total + total, max(merged_longest, longest))
+	return merged
@@ -0,0 +1,128 @@
+import time
+
+
+def parse_burst_profile(spec: str) -> list:
+	"""
+	Parse a burst profile of comma separated RATE:SECONDS phases,
+	e.g. "100:5,1000:1" for 5 seconds at 100 msg/s then 1 second at 1000 msg/s.
+	The phases repeat for the length of the run
+
+	:param spec: str
+	"""
+	profile = []
+	for phase in spec.split(","):
+		try:
+			rate, duration = phase.split(":")
+			rate, duration = float(rate), float(duration)
+		except ValueError:
+			raise ValueError("Invalid burst phase, expected RATE:SECONDS - {}".format(phase))
+		if rate <= 0 or duration <= 0:
+			raise ValueError("Burst phase rate and duration should be positive - {}".format(phase))
+		profile.append((rate, duration))
+	return profile
+
+
+class DeadlineScheduler:
+	"""
+	Open-loop pacer which releases messages at absolute deadlines derived
+	from the target rate. Deadlines do not depend on when the previous
+	message was actually sent, so sleep overshoot and send time do not
+	accumulate as drift. A sender that falls behind is released
+	immediately until it catches up, and the lag is recorded
+
+	Attributes  
+	rate: float - Target messages per second, used when no profile is given  
+	profile: list[tuple[float, float]], default=None - Repeating (rate, seconds) burst phases  
+	spin: float, default=0.0 - Seconds before each deadline to busy wait instead of sleeping  
+	"""
+	def __init__(self, rate, profile=None, spin=0.0):
+		if not profile and (rate is None or rate <= 0):
+			raise ValueError("Target rate should be positive - {}".format(rate))
+		self.rate = rate
+		self.profile = profile or [(rate, float("inf"))]
+		self.spin = spin
+
+		self._cycle = sum(duration for _, duration in self.profile)
+		self._start = None
+		self._deadline = None
+		self.released = 0
+		self.max_lag = 0.0
+		self.total_lag = 0.0
+
+	def _rate_at(self, elapsed):
+		# Target rate of the burst phase active at elapsed seconds into the run
+		if len(self.profile) == 1:
+			return self.profile[0][0]
+		offset = elapsed % self._cycle
+		for rate, duration in self.profile:
+			if offset < duration:
+				return rate
+			offset -= duration
+		return self.profile[-1][0]
+
+	def start(self):
+		"""
+		Start the schedule, the first message is released immediately
+		"""
+		self._start = self._deadline = time.perf_counter()
+		self.released = 0
+		self.max_lag = 0.0
+		self.total_lag = 0.0
+
+	def wait(self):
+		"""
+		Block until the next message is due
+		"""
+		if self._start is None:
+			self.start()
+		deadline = self._deadline
+		remaining = deadline - time.perf_counter()
+		if remaining > self.spin:
+			time.sleep(remaining - self.spin)
+		while time.perf_counter() < deadline:
+			pass
+		lag = time.perf_counter() - deadline
+		self.total_lag += lag
+		if lag > self.max_lag:
+			self.max_lag = lag
+		self.released += 1
+		self._deadline = deadline + 1.0 / self._rate_at(deadline - self._start)
+
+	def report(self) -> dict:
+		"""
+		Requested against achieved message rate since start
+		"""
+		elapsed = time.perf_counter() - self._start if self._start is not None else 0.0
+		scheduled = self._deadline - self._start if self._start is not None else 0.0
+		return {"released": self.released,
+				"elapsed": elapsed,
+				"requested_rate": self.released / scheduled if scheduled > 0 else 0.0,
+				"achieved_rate": self.released / elapsed if elapsed > 0 else 0.0,
+				"max_lag": self.max_lag,
+				"mean_lag": self.total_lag / self.released if self.released else 0.0}
+
+
+class OrderMix:
+	"""
+	Deterministic interleaving of new and cancel orders. An error
+	accumulator spreads cancels evenly across the stream at the
+	configured share, instead of drawing a coin flip per message
+
+	Attributes  
+	new_share: float - Fraction of messages which are new orders, above 0.0 and up to 1.0  
+	"""
+	def __init__(self, new_share):
+		if not 0.0 < new_share <= 1.0:
+			raise ValueError("New order share should be above 0.0 and up to 1.0 - {}".format(new_share))
+		self.new_share = new_share
+		self._cancel_credit = 0.0
+
+	def next_is_new(self) -> bool:
+		"""
+		Whether the next message should be a new order rather than a cancel
+		"""
+		self._cancel_credit += 1.0 - self.new_share
+		if self._cancel_credit >= 1.0:
+			self._cancel_credit -= 1.0
+			return False
+		return True
@@ -0,0 +1,118 @@
+import time
+
+
+_NS_PER_SEC = 1_000_000_000
+_NS_PER_DAY = 86400 * _NS_PER_SEC
+
+# Scale applied to the fractional seconds digits, indexed by number of digits
+_frac_scale = tuple(10 ** (9 - digits) for digits in range(10))
+
+# Epoch nanoseconds at midnight, keyed by YYYYMMDD. Sessions span few dates
+_day_cache = {}
+
+# (epoch second, "YYYYMMDD-HH:MM:SS") of the last formatted timestamp
+_last_second = (None, None)
+
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+	# Days since 1970-01-01 for a proleptic Gregorian date
+	year -= month <= 2
+	era = year // 400
+	yoe = year - era * 400
+	doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+	doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+	return era * 146097 + doe - 719468
+
+
+def parse_fix_timestamp(value: str) -> int:
+	"""
+	Parse a FIX UTCTimestamp (YYYYMMDD-HH:MM:SS[.sss...]) into integer
+	epoch nanoseconds by fixed field positions
+
+	:param value: str
+	"""
+	day_ns = _day_cache.get(value[:8])
+	if day_ns is None:
+		day_ns = _day_cache[value[:8]] = _days_from_civil(int(value[0:4]), int(value[4:6]), int(value[6:8])) * _NS_PER_DAY
+	ns = day_ns + (int(value[9:11]) * 3600 + int(value[12:14]) * 60 + int(value[15:17])) * _NS_PER_SEC
+	frac = value[18:]
+	if frac:
+		ns += int(frac) * _frac_scale[len(frac)]
+	return ns
+
+
+def to_epoch_ns(timestamp) -> int:
+	"""
+	Integer epoch nanoseconds of a timestamp held either way, 0 if unset
+
+	:param timestamp: FixTimestamp | int | str | None - A FIX UTCTimestamp string is parsed
+	"""
+	if not timestamp:
+		return 0
+	if isinstance(timestamp, int):
+		return int(timestamp)
+	return parse_fix_timestamp(timestamp)
+
+
+def format_fix_timestamp(ns: int, precision: int = 3) -> str:
+	"""
+	Format integer epoch nanoseconds as a FIX UTCTimestamp
+
+	:param ns: int
+	:param precision: int, default=3 - Number of fractional second digits (0, 3, 6 or 9)
+	"""
+	global _last_second
+	second, sub_ns = divmod(ns, _NS_PER_SEC)
+	cached_second, prefix = _last_second
+	if cached_second != second:
+		prefix = time.strftime("%Y%m%d-%H:%M:%S", time.gmtime(second))
+		_last_second = (second, prefix)
+	if precision == 3:
+		return "{}.{:03d}".format(prefix, sub_ns // 1_000_000)
+	elif precision == 0:
+		return prefix
+	elif precision == 6:
+		return "{}.{:06d}".format(prefix, sub_ns // 1000)
+	elif precision == 9:
+		return "{}.{:09d}".format(prefix, sub_ns)
+	else:
+		raise ValueError("Unsupported timestamp precision - {}".format(precision))
+
+
+class FixTimestamp(int):
+	"""
+	UTC timestamp held as integer epoch nanoseconds. Comparison and
+	arithmetic are plain integer operations, the FIX UTCTimestamp string
+	is only produced when the timestamp is printed or encoded
+	"""
+	__slots__ = ()
+
+	@classmethod
+	def from_fix(cls, value):
+		"""
+		Parse a FIX UTCTimestamp field value
+
+		:param value: str
+		"""
+		return cls(parse_fix_timestamp(value))
+
+	@classmethod
+	def now(cls):
+		"""
+		Current UTC time
+		"""
+		return cls(time.time_ns())
+
+	def to_fix(self, precision=3) -> str:
+		"""
+		Format as a FIX UTCTimestamp
+
+		:param precision: int, default=3 - Number of fractional second digits (0, 3, 6 or 9)
+		"""
+		return format_fix_timestamp(self, precision)
+
+	def __str__(self):
+		return self.to_fix()
+
+	def __repr__(self):
+		return f"FixTimestamp({self.to_fix()})"
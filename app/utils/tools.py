@@ -1,9 +1,23 @@
 import random
 import quickfix as fix
 
+try:
+   import numpy as np
+except ImportError:      # numpy is only needed for gen_synthetic_order_stream
+   np = None
+
 from app.common.interface_order import (Order)
 
 
+_sides = (fix.Side_BUY, fix.Side_SELL, fix.Side_SELL_SHORT)
+_order_types = (fix.OrdType_LIMIT, fix.OrdType_MARKET)
+
+# Limit price distributions of gen_synthetic_order_stream
+PRICE_UNIFORM = "uniform"     # (PRICE_UNIFORM, low, high)
+PRICE_NORMAL = "normal"       # (PRICE_NORMAL, mean, standard deviation), at least 0.01
+_default_price = (PRICE_UNIFORM, 0.0, 100.0)
+
+
 def unicode_fix(string: str) -> str: 
    """
    Replace FIX unicode characters with '|'
@@ -21,12 +35,9 @@ def gen_synthetic_orders(tickers: list[str]) -> dict:
 
    :param tickers: list[str]
    """
-   sides = [fix.Side_BUY, fix.Side_SELL, fix.Side_SELL_SHORT]
-   order_types = [fix.OrdType_LIMIT, fix.OrdType_MARKET]
-
    ticker = random.choice(tickers)
-   side = random.choice(sides)
-   order_type = random.choice(order_types)
+   side = random.choice(_sides)
+   order_type = random.choice(_order_types)
    qty = random.randrange(1,11)
    security_type = fix.SecurityType_COMMON_STOCK
 
@@ -42,6 +53,65 @@ def gen_synthetic_orders(tickers: list[str]) -> dict:
    return syn_order
 
 
+def gen_synthetic_order_stream(tickers: list[str], count=None, seed=None, weights=None,
+                               prices=None, batch_size=4096):
+   """
+   Lazily generate random orders for sending to server. Tickers, sides,
+   order types, quantities and limit prices are drawn for batch_size orders
+   at a time in one vectorized pass, and the same seed gives the same stream
+
+   :param tickers: list[str]
+   :param count: int, default=None - Number of orders, unlimited if None
+   :param seed: int, default=None - Seed of the NumPy generator
+   :param weights: dict{ticker: float}, default=None - Relative frequency of each ticker, uniform if None
+   :param prices: dict{ticker: tuple}, default=None - Limit price distribution per ticker,
+      (PRICE_UNIFORM, low, high) or (PRICE_NORMAL, mean, stdev), uniform from 0 to 100 if not given
+   :param batch_size: int, default=4096 - Orders drawn per vectorized pass
+   """
+   if np is None:
+      raise ImportError("numpy is required for gen_synthetic_order_stream")
+   rng = np.random.default_rng(seed)
+   weights = weights or {}
+   prices = prices or {}
+
+   ticker_weights = np.array([weights.get(ticker, 1.0) for ticker in tickers], dtype=np.float64)
+   ticker_weights /= ticker_weights.sum()
+   distributions = [prices.get(ticker, _default_price) for ticker in tickers]
+   for kind, _, _ in distributions:
+      if kind not in (PRICE_UNIFORM, PRICE_NORMAL):
+         raise ValueError("Invalid price distribution - {}".format(kind))
+   is_normal = np.array([kind == PRICE_NORMAL for kind, _, _ in distributions])
+   # (low, high) for uniform and (mean, stdev) for normal tickers
+   first = np.array([a for _, a, _ in distributions], dtype=np.float64)
+   second = np.array([b for _, _, b in distributions], dtype=np.float64)
+   security_type = fix.SecurityType_COMMON_STOCK
+
+   remaining = count
+   while remaining is None or remaining > 0:
+      size = batch_size if remaining is None else min(batch_size, remaining)
+      ticker_ix = rng.choice(len(tickers), size=size, p=ticker_weights)
+      side_ix = rng.integers(0, len(_sides), size=size)
+      type_ix = rng.integers(0, len(_order_types), size=size)
+      qty = rng.integers(1, 11, size=size)
+      uniform = first[ticker_ix] + (second[ticker_ix] - first[ticker_ix]) * rng.random(size)
+      normal = np.maximum(first[ticker_ix] + second[ticker_ix] * rng.standard_normal(size), 0.01)
+      price = np.round(np.where(is_normal[ticker_ix], normal, uniform), 2)
+
+      for t, s, o, q, p in zip(ticker_ix.tolist(), side_ix.tolist(), type_ix.tolist(), qty.tolist(), price.tolist()):
+         order_type = _order_types[o]
+         syn_order = Order(ticker=tickers[t],
+                           side=_sides[s],
+                           qty=q,
+                           security=security_type,
+                           ordtyp=order_type
+                          )
+         if order_type == fix.OrdType_LIMIT:
+            syn_order.price = p
+         yield syn_order
+      if remaining is not None:
+         remaining -= size
+
+
 def extract_tag_value_pair_from(msg: str) -> dict:
    """
    Extract tag-value pairs from string representation 
@@ -57,6 +127,53 @@ def extract_tag_value_pair_from(msg: str) -> dict:
    return tag_dict
 
 
+def extract_fields_from(message, tags, header_tags=()) -> dict:
+   """
+   Extract only the requested tag-value pairs directly from a quickfix
+   message, without converting the whole message into a string
+
+   :param message: fix.Message
+   :param tags: tuple[int] - Body tags to read
+   :param header_tags: tuple[int] - Header tags to read
+   """
+   tag_dict = {}
+   for tag in tags:
+      if message.isSetField(tag):
+         tag_dict[tag] = message.getField(tag)
+   if header_tags:
+      header = message.getHeader()
+      for tag in header_tags:
+         if header.isSetField(tag):
+            tag_dict[tag] = header.getField(tag)
+   return tag_dict
+
+
+_raw_tag_keys = {}
+
+
+def extract_fields_from_raw(msg: str, tags) -> dict:
+   """
+   Extract only the requested tag-value pairs from a raw SOH delimited 
+   fix message, scanning for each tag in place instead of splitting 
+   the whole message
+
+   :param msg: str
+   :param tags: tuple[int]
+   """
+   tag_dict = {}
+   for tag in tags:
+      key = _raw_tag_keys.get(tag)
+      if key is None:
+         key = _raw_tag_keys[tag] = "\x01{}=".format(tag)
+      start = msg.find(key)
+      if start < 0:
+         continue
+      start += len(key)
+      end = msg.find("\x01", start)
+      tag_dict[tag] = msg[start:] if end < 0 else msg[start:end]
+   return tag_dict
+
+
 # For testing purposes
 if __name__ == "__main__":
    for i in range(10):
@@ -0,0 +1,149 @@
+"""
+Benchmark message store and log backends against the local simulated acceptor
+
+Sends the same seeded flow of new orders with each combination of store
+and log backend, and reports the send rate, the rate orders were completed
+at and the NewOrderSingle to first execution report latency. The acceptor
+fills every order in full on arrival, and is started on the local configuration
+unless --external-acceptor is given.
+
+Usage: python -m benchmarks.bench_backends [-n NUMBER] [-r RATE] [--stores file,memory] [--logs file,async,null]
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+import quickfix as fix
+
+from app.client.fix_client import (FixClient)
+from app.client.latency import (LatencyTracker, NEW_ACK)
+from app.client.sequencer import (EventSequencer)
+from app.common.interface_order import (TradingBook)
+from app.utils.backends import (create_connector, STORE_BACKENDS, LOG_BACKENDS, LOG_NULL)
+from app.utils.logger import (log)
+from app.utils.rate_control import (DeadlineScheduler)
+from app.utils.tools import (gen_synthetic_order_stream)
+
+
+_tickers = ["MSFT", "AAPL", "BAC"]
+
+
+def wait_for(condition, timeout, poll_interval=0.01) -> bool:
+	deadline = time.perf_counter() + timeout
+	while not condition():
+		if time.perf_counter() >= deadline:
+			return False
+		time.sleep(poll_interval)
+	return True
+
+
+def run(args, store, log_backend):
+	"""
+	Log on with the given backends, send args.number new orders and wait for them to fill
+
+	:param args: argparse.Namespace
+	:param store: str
+	:param log_backend: str
+	Returns a dict of results, or None if the session did not log on
+	"""
+	settings = fix.SessionSettings(args.config)
+	client = FixClient()
+	book = TradingBook("bench", _tickers)
+	sequencer = EventSequencer({"add": book.log_transaction,
+								"remove": book.erase_transaction,
+								"update": book.update_transaction,
+								"add_batch": book.log_orders})
+	client.register_app_event_callback(sequencer.callbacks())
+	client.latency = LatencyTracker()
+	log.configure(messages=log_backend != LOG_NULL)
+	initiator, store_factory, log_factory = create_connector(fix.SocketInitiator, client, settings, store, log_backend)
+
+	sequencer.start()
+	initiator.start()
+	try:
+		if not wait_for(lambda: client.router.sessions, args.logon_timeout):
+			return None
+		orders = list(gen_synthetic_order_stream(_tickers, count=args.number, seed=args.seed))
+		scheduler = DeadlineScheduler(args.rate) if args.rate else None
+		start = time.perf_counter()
+		if scheduler is not None:
+			scheduler.start()
+		for order in orders:
+			if scheduler is not None:
+				scheduler.wait()
+			client.sendNewOrder(order)
+		sent = time.perf_counter()
+		completed = wait_for(lambda: not client.latency.pending(), args.drain_timeout, 0.001)
+		done = time.perf_counter()
+	finally:
+		initiator.stop()
+		sequencer.stop()
+
+	ack = client.latency.summary().get(NEW_ACK, {}).get("all")
+	return {"send_rate": args.number / (sent - start),
+			"complete_rate": args.number / (done - start) if completed else 0.0,
+			"completed": completed,
+			"p50": ack.percentile(50) / 1e3 if ack else 0.0,
+			"p99": ack.percentile(99) / 1e3 if ack else 0.0,
+			"max": ack.max / 1e3 if ack else 0.0}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Store and log backend benchmark')
+	parser.add_argument('-cfg', '--config', type=str, default='config/fixapp_local.cfg', help='Client configuration filename')
+	parser.add_argument('--acceptor-config', type=str, default='config/acceptor_local.cfg', help='Acceptor configuration filename')
+	parser.add_argument('-n', '--number', type=int, default=5000, help='Number of new orders per backend combination')
+	parser.add_argument('-r', '--rate', type=float, default=0.0, help='Target orders per second, 0 to send as fast as possible')
+	parser.add_argument('--seed', type=int, default=1, help='Seed of the order flow, the same for every combination')
+	parser.add_argument('--stores', type=str, default=",".join(STORE_BACKENDS), help='Comma separated store backends')
+	parser.add_argument('--logs', type=str, default="file,async,null", help='Comma separated log backends')
+	parser.add_argument('--logon-timeout', type=float, default=10.0, help='Seconds to wait for each logon')
+	parser.add_argument('--drain-timeout', type=float, default=30.0, help='Seconds to wait for every order to fill')
+	parser.add_argument('--external-acceptor', action='store_true', help='Use an acceptor which is already running')
+	args = parser.parse_args()
+
+	stores = args.stores.split(",")
+	log_backends = args.logs.split(",")
+	for backend in stores:
+		if backend not in STORE_BACKENDS:
+			parser.error("Invalid store backend - {}".format(backend))
+	for backend in log_backends:
+		if backend not in LOG_BACKENDS:
+			parser.error("Invalid log backend - {}".format(backend))
+
+	acceptor = None
+	if not args.external_acceptor:
+		acceptor = subprocess.Popen([sys.executable, "acceptor.py", "-cfg", args.acceptor_config,
+									 "--fill-prob", "1", "--fill-all", "--store", "memory", "--log-backend", "null"],
+									stdout=subprocess.DEVNULL)
+		time.sleep(1)
+	# Keep async message records off the console, they are still formatted and written
+	log.configure(stream=open(os.devnull, "w"))
+
+	results = []
+	try:
+		for store in stores:
+			for log_backend in log_backends:
+				results.append((store, log_backend, run(args, store, log_backend)))
+	finally:
+		if acceptor is not None:
+			acceptor.terminate()
+			acceptor.wait()
+		log.stop()
+
+	print("Store and log backends ({} orders{})".format(args.number, ", {} msg/s".format(args.rate) if args.rate else ""))
+	print("="*70)
+	print(f"{'store':<8}{'log':<8}{'send/s':>11}{'done/s':>11}{'ack p50 us':>12}{'p99 us':>10}{'max us':>10}")
+	for store, log_backend, result in results:
+		if result is None:
+			print(f"{store:<8}{log_backend:<8}  did not log on")
+			continue
+		done_rate = f"{result['complete_rate']:>11,.0f}" if result["completed"] else f"{'timeout':>11}"
+		print(f"{store:<8}{log_backend:<8}{result['send_rate']:>11,.0f}{done_rate}"
+			  f"{result['p50']:>12.1f}{result['p99']:>10.1f}{result['max']:>10.1f}")
+	print("="*70)
+
+
+if __name__ == "__main__":
+	main()
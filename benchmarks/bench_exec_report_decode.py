@@ -0,0 +1,97 @@
+"""
+Benchmark decoding of inbound execution reports
+
+Compares the string based path previously used by FixClient.fromApp
+(str -> unicode_fix -> extract_tag_value_pair_from) against reading the
+required tags through quickfix getField, and against the path fromApp uses,
+one message.toString() scanned in place for the required tags. Every path
+starts from the quickfix message, so the string conversion is counted
+
+Usage: python -m benchmarks.bench_exec_report_decode [-n NUMBER]
+"""
+import argparse
+import timeit
+import quickfix as fix
+
+from app.client.fix_client import (FixClient)
+from app.utils.tools import (unicode_fix, extract_tag_value_pair_from,
+							 extract_fields_from, extract_fields_from_raw)
+
+
+def build_exec_report():
+	"""
+	Build a representative partially filled execution report
+	"""
+	msg = fix.Message()
+	header = msg.getHeader()
+	header.setField(fix.BeginString(fix.BeginString_FIX42))
+	header.setField(fix.MsgType(fix.MsgType_ExecutionReport))
+	header.setField(fix.SenderCompID("DTL"))
+	header.setField(fix.TargetCompID("OPS_CANDIDATE_1_8918"))
+	header.setField(fix.MsgSeqNum(1024))
+	header.setField(fix.StringField(fix.SendingTime().getField(), "20240315-14:30:15.123"))
+
+	msg.setField(fix.OrderID("ORD-1024"))
+	msg.setField(fix.ExecID("EXEC-1024"))
+	msg.setField(fix.ExecTransType(fix.ExecTransType_NEW))
+	msg.setField(fix.ExecType(fix.ExecType_PARTIAL_FILL))
+	msg.setField(fix.OrdStatus(fix.OrdStatus_PARTIALLY_FILLED))
+	msg.setField(fix.ClOrdID("1024-1710513015123456789"))
+	msg.setField(fix.Symbol("MSFT"))
+	msg.setField(fix.Side(fix.Side_BUY))
+	msg.setField(fix.OrderQty(10))
+	msg.setField(fix.LastShares(4))
+	msg.setField(fix.LastPx(204.31))
+	msg.setField(fix.LeavesQty(6))
+	msg.setField(fix.CumQty(4))
+	msg.setField(fix.AvgPx(204.31))
+	return msg
+
+
+def decode_legacy(message):
+	return extract_tag_value_pair_from(unicode_fix(str(message)))
+
+
+def decode_fields(message):
+	header_tags = (FixClient._sending_time_field,)
+	body_tags = tuple(tag for tag in FixClient._exec_report_tags if tag not in header_tags)
+	return extract_fields_from(message, body_tags, header_tags)
+
+
+def decode_raw(message):
+	raw = message.toString()
+	tags = extract_fields_from_raw(raw, FixClient._msg_typ_tags)
+	tags.update(extract_fields_from_raw(raw, FixClient._exec_report_tags))
+	return tags
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Execution report decode benchmark')
+	parser.add_argument('-n', '--number', type=int, nargs='?', default=100000, help='Number of decodes per path')
+	args = parser.parse_args()
+
+	message = build_exec_report()
+
+	# All paths should agree on the values of the tags the handler reads
+	expected = decode_fields(message)
+	legacy = decode_legacy(message)
+	assert all(legacy[tag] == value for tag, value in expected.items())
+	assert all(decode_raw(message)[tag] == value for tag, value in expected.items())
+
+	paths = {"legacy (str/unicode_fix/split)": lambda: decode_legacy(message),
+			 "quickfix message fields": lambda: decode_fields(message),
+			 "toString + raw scan (fromApp)": lambda: decode_raw(message)}
+
+	print("Execution report decode ({} iterations)".format(args.number))
+	print("="*70)
+	baseline = None
+	for label, func in paths.items():
+		elapsed = min(timeit.repeat(func, number=args.number, repeat=3))
+		per_msg = elapsed / args.number * 1e9
+		baseline = baseline or per_msg
+		print(f"{label:<34}{per_msg:>10.0f} ns/msg{baseline/per_msg:>8.2f}x")
+	print("="*70)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,101 @@
+"""
+Benchmark memory held per open order and per fill
+
+Open orders are held as Order objects in an AssetLedger, and fills as
+Trade objects in an AssetLedger or as rows in a ColumnarAssetLedger.
+Subclasses that re-introduce __dict__ show the cost without __slots__.
+The figures include the ledger dict entry and the ClOrdID string.
+
+Usage: python -m benchmarks.bench_memory [-n NUMBER]
+"""
+import argparse
+import gc
+import tracemalloc
+import quickfix as fix
+
+from app.common.interface_order import (AssetLedger, Order, OrderUpdateEvent, Trade)
+from app.common.columnar_ledger import (ColumnarAssetLedger, np)
+from app.utils.timestamps import (FixTimestamp)
+
+
+_timestamp = FixTimestamp.from_fix("20240315-14:30:15.123")
+
+
+class _DictOrder(Order):
+	# No __slots__, instances carry a __dict__ as before
+	pass
+
+
+class _DictTrade(Trade):
+	pass
+
+
+class _DictOrderUpdateEvent(OrderUpdateEvent):
+	pass
+
+
+def measure(label, build, number):
+	"""
+	Report the bytes still allocated per item after build(number) returns
+
+	:param label: str
+	:param build: callable(int) -> object kept alive during measurement
+	:param number: int
+	"""
+	gc.collect()
+	tracemalloc.start()
+	held = build(number)
+	current, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	print(f"{label:<40}{current/number:>10.1f} B/item{peak/number:>10.1f} B/item peak")
+	del held
+
+
+def build_orders(order_cls):
+	def build(number):
+		ledger = AssetLedger("MSFT")
+		for i in range(number):
+			order = order_cls("MSFT", fix.Side_BUY, 10, fix.OrdType_LIMIT, fix.SecurityType_COMMON_STOCK, 101.25)
+			order.id = str(i)
+			ledger.add_order(order)
+		return ledger
+	return build
+
+
+def build_trades(ledger_cls, trade_cls=Trade):
+	def build(number):
+		ledger = ledger_cls("MSFT")
+		for i in range(number):
+			ledger.add_trade(trade_cls(str(i), _timestamp, "MSFT", fix.Side_BUY, 10.0, 101.25))
+		return ledger
+	return build
+
+
+def build_events(event_cls):
+	def build(number):
+		# Events are transient, measure a batch held at once to expose the per object cost
+		return [event_cls(str(i), _timestamp, 10.0, 101.25, fix.OrdStatus_NEW, "MSFT", fix.Side_BUY)
+				for i in range(number)]
+	return build
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Order and trade memory benchmark')
+	parser.add_argument('-n', '--number', type=int, nargs='?', default=1_000_000, help='Number of orders/fills')
+	args = parser.parse_args()
+
+	print("Memory per record ({} records)".format(args.number))
+	print("="*70)
+	measure("Open order (Order, __slots__)", build_orders(Order), args.number)
+	measure("Open order (Order, __dict__)", build_orders(_DictOrder), args.number)
+	measure("Fill (Trade, __slots__)", build_trades(AssetLedger), args.number)
+	measure("Fill (Trade, __dict__)", build_trades(AssetLedger, _DictTrade), args.number)
+	if np is not None:
+		measure("Fill (ColumnarAssetLedger row)", build_trades(ColumnarAssetLedger), args.number)
+	measure("OrderUpdateEvent (__slots__)", build_events(OrderUpdateEvent), args.number)
+	measure("OrderUpdateEvent (__dict__)", build_events(_DictOrderUpdateEvent), args.number)
+	print("="*70)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,102 @@
+"""
+Benchmark encoding of outbound NewOrderSingle and OrderCancelRequest messages
+
+Compares building every field object per message, as FixClient did before
+the message templates, against copying the templates and setting only the
+per-order fields. Serialisation to the wire string can be included with -w
+
+Usage: python -m benchmarks.bench_order_encode [-n NUMBER] [-w]
+"""
+import argparse
+import time
+import quickfix as fix
+
+from app.client.msg_templates import (NewOrderTemplate, CancelTemplate)
+from app.common.interface_order import (Order)
+from app.utils.timestamps import (format_fix_timestamp)
+
+
+_transact_time_field = fix.TransactTime().getField()
+
+
+def encode_new_order_legacy(order, cl_ord_id, transact_time):
+	order_msg = fix.Message()
+	order_msg.getHeader().setField(fix.BeginString())
+	order_msg.getHeader().setField(fix.MsgType(fix.MsgType_NewOrderSingle))
+	order_msg.setField(fix.ClOrdID(cl_ord_id))
+	order_msg.setField(fix.TimeInForce(fix.TimeInForce_GOOD_TILL_CANCEL))
+	order_msg.setField(fix.SecurityType(order.security))
+	order_msg.setField(fix.Symbol(order.ticker))
+	order_msg.setField(fix.Side(order.side))
+	order_msg.setField(fix.OrdType(order.ordtyp))
+	order_msg.setField(fix.Price(order.price))
+	order_msg.setField(fix.OrderQty(order.qty))
+	order_msg.setField(fix.HandlInst(fix.HandlInst_AUTOMATED_EXECUTION_ORDER_PRIVATE_NO_BROKER_INTERVENTION))
+	order_msg.setField(fix.StringField(_transact_time_field, transact_time))
+	return order_msg
+
+
+def encode_cancel_legacy(order, cl_ord_id, transact_time):
+	order_msg = fix.Message()
+	order_msg.getHeader().setField(fix.BeginString())
+	order_msg.getHeader().setField(fix.MsgType(fix.MsgType_OrderCancelRequest))
+	order_msg.setField(fix.ClOrdID(cl_ord_id))
+	fix_repr = {
+		fix.Symbol().getField(): order.ticker,
+		fix.Side().getField(): order.side,
+		fix.OrderQty().getField(): order.qty,
+		fix.SecurityType().getField(): order.security,
+		fix.OrigClOrdID().getField(): order.id
+	}
+	for tag, value in fix_repr.items():
+		order_msg.setField(fix.StringField(int(tag), str(value)))
+	order_msg.setField(fix.StringField(_transact_time_field, transact_time))
+	return order_msg
+
+
+def run(label, encode, orders, wire):
+	"""
+	Encode every order once and print messages encoded per second
+
+	:param label: str
+	:param encode: callable(Order, str, str) -> fix.Message
+	:param orders: list[Order]
+	:param wire: bool - Also serialise each message to its wire string
+	"""
+	start = time.perf_counter()
+	for i, order in enumerate(orders):
+		order_msg = encode(order, str(i), format_fix_timestamp(time.time_ns()))
+		if wire:
+			order_msg.toString()
+	elapsed = time.perf_counter() - start
+	print(f"{label:<34}{len(orders)/elapsed:>12,.0f} msg/s{elapsed/len(orders)*1e6:>10.2f} us/msg")
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Order encode benchmark')
+	parser.add_argument('-n', '--number', type=int, nargs='?', default=100000, help='Number of messages per path')
+	parser.add_argument('-w', '--wire', action='store_true', help='Include serialisation to the wire string')
+	args = parser.parse_args()
+
+	orders = []
+	for i in range(args.number):
+		order = Order("MSFT", fix.Side_BUY, 1 + i % 10, fix.OrdType_LIMIT, fix.SecurityType_COMMON_STOCK, 100 + (i % 100) / 100)
+		order.id = str(i)
+		orders.append(order)
+
+	new_order_template = NewOrderTemplate()
+	cancel_template = CancelTemplate()
+
+	print("Order encode ({} messages{})".format(args.number, ", with serialisation" if args.wire else ""))
+	print("="*70)
+	run("NewOrderSingle (field objects)", encode_new_order_legacy, orders, args.wire)
+	run("NewOrderSingle (template)", new_order_template.encode, orders, args.wire)
+	run("OrderCancelRequest (field objects)", encode_cancel_legacy, orders, args.wire)
+	run("OrderCancelRequest (template)",
+		lambda order, cl_ord_id, transact_time: cancel_template.encode(order.to_fix_cancel(), cl_ord_id, transact_time),
+		orders, args.wire)
+	print("="*70)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,12 +1,36 @@
 import argparse
 
 from app.user_sessions.demo_session import (DemoSession)
+from app.utils.logger import (LEVELS)
+from app.client.session_router import (ROUTES, ROUTE_HASH)
+from app.utils.backends import (STORE_BACKENDS, LOG_BACKENDS)
 
 def main():
 	parser = argparse.ArgumentParser(description='FIX Client')
 	parser.add_argument('-cfg', '--config', type=str, help='Configuration filename')
 	parser.add_argument('-o', '--order', type=int, nargs='?', default=10, help='Number of orders to send')
-	parser.add_argument('-t', '--threshold', type=float, nargs='?', default=0.8, help='Threshold for send order frequency')
+	parser.add_argument('-t', '--threshold', type=float, nargs='?', default=0.8, help='Share of messages sent as new orders rather than cancels')
+	parser.add_argument('-r', '--rate', type=float, default=10.0, help='Target messages per second')
+	parser.add_argument('--burst', type=str, default=None, help='Repeating burst profile of RATE:SECONDS phases, e.g. 100:5,1000:1')
+	parser.add_argument('--drain-timeout', type=float, default=15.0, help='Maximum seconds to wait for open orders to complete before logging off')
+	parser.add_argument('--seed', type=int, default=None, help='Seed of the synthetic order stream')
+	parser.add_argument('--route', choices=ROUTES, default=ROUTE_HASH, help='Routing of orders across the sessions in the configuration')
+	parser.add_argument('--shard-procs', action='store_true', help='Run each session in its own process with its own trading book')
+	parser.add_argument('--batch-drain', action='store_true', help='Apply every queued book event per wakeup of the book thread, registering runs of new orders together')
+	parser.add_argument('--journal', type=str, default=None, help='Journal file to rebuild the trading book from on startup and record its changes in')
+	parser.add_argument('--store', choices=STORE_BACKENDS, default=None, help='Message store backend, overrides StoreBackend in the configuration (default file)')
+	parser.add_argument('--log-backend', choices=LOG_BACKENDS, default=None, help='FIX message log backend, overrides LogBackend in the configuration (default file)')
+	parser.add_argument('--max-order-qty', type=float, default=None, help='Pre-trade limit on the quantity of each new order')
+	parser.add_argument('--max-order-notional', type=float, default=None, help='Pre-trade limit on the notional of each new order')
+	parser.add_argument('--max-position', type=float, default=None, help='Pre-trade limit on the net long or short quantity per ticker, counting open orders as filled')
+	parser.add_argument('--max-gross-notional', type=float, default=None, help='Pre-trade limit on the notional traded plus open per ticker')
+	parser.add_argument('--metrics-port', type=int, default=None, help='Serve Prometheus metrics on this local port, at /metrics')
+	parser.add_argument('--profile', action='store_true', help='Time the FIX callbacks, send path and book callbacks per stage and print the totals')
+	parser.add_argument('--profile-out', type=str, default=None, help='Write a cProfile stats file of the session, readable with pstats')
+	parser.add_argument('--columnar', action='store_true', help='Store trades in NumPy columns (requires numpy)')
+	parser.add_argument('--log-level', type=str.upper, choices=LEVELS.keys(), default='INFO', help='Minimum level of log records')
+	parser.add_argument('--log-sample', type=int, default=1, help='Log one in every N FIX messages')
+	parser.add_argument('--log-compact', action='store_true', help='Log selected tags instead of full FIX messages')
 	args = parser.parse_args()
 
 	app = DemoSession(args)
@@ -0,0 +1,45 @@
+import argparse
+import multiprocessing
+from functools import partial
+
+from app.client.log_replay import (iter_log_files, replay_file)
+from app.common.interface_order import (AssetLedger, merge_ledger_totals)
+from app.common.columnar_ledger import (ColumnarAssetLedger)
+from app.utils.logger import (LEVELS)
+
+def main():
+	parser = argparse.ArgumentParser(description='Rebuild trading stats from quickfix message logs')
+	parser.add_argument('paths', nargs='+', help='Message log files, or directories searched for *.messages*.log')
+	parser.add_argument('-p', '--processes', type=int, default=None, help='Worker processes, one per CPU by default')
+	parser.add_argument('--columnar', action='store_true', help='Store trades in NumPy columns (requires numpy)')
+	parser.add_argument('--log-level', type=str.upper, choices=LEVELS.keys(), default='ERROR', help='Minimum level of log records from the workers')
+	args = parser.parse_args()
+
+	paths = list(iter_log_files(args.paths))
+	if not paths:
+		parser.error("No message logs found")
+	ledger_cls = ColumnarAssetLedger if args.columnar else AssetLedger
+	replay = partial(replay_file, ledger_cls=ledger_cls, log_level=LEVELS[args.log_level])
+	# Every log file is replayed into its own book in a worker, books are merged per ticker
+	context = multiprocessing.get_context("spawn")
+	with context.Pool(min(args.processes or multiprocessing.cpu_count(), len(paths))) as pool:
+		results = sorted(pool.imap_unordered(replay, paths), key=lambda result: result["path"])
+
+	totals = merge_ledger_totals(result["ledgers"] for result in results)
+	print("\n")
+	print("Replayed Message Logs")
+	print("="*70)
+	for result in results:
+		print(f"{result['path']}: {result['new_orders']} new orders, {result['exec_reports']} execution reports, "
+			  f"{result['open_orders']} orders open")
+	print("-"*70)
+	print(f"{'Ticker':<8}{'Trade Vol (USD)':>17}{'Net Cash (USD)':>17}{'Realized (USD)':>17}{'VWAP':>11}")
+	for ticker, (volume, cash, quantity, realized, _) in sorted(totals.items()):
+		print(f"{ticker:<8}{volume:>17.2f}{cash:>17.2f}{realized:>17.2f}{volume / quantity if quantity else 0:>11.2f}")
+	print(f"{'Total':<8}{sum(total[0] for total in totals.values()):>17.2f}{sum(total[1] for total in totals.values()):>17.2f}"
+		  f"{sum(total[3] for total in totals.values()):>17.2f}")
+	print("="*70)
+	print("\n")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,108 @@
+import pytest
+
+import quickfix as fix
+
+from app.common.interface_order import (AssetLedger, Order, Trade, OrderUpdateEvent, TradingBook)
+from app.common.columnar_ledger import (ColumnarAssetLedger)
+from app.common.journal import (BookJournal, RECORD_SIZE)
+from app.common.risk import (PositionEngine)
+from app.client.sequencer import (chain_handlers)
+from app.utils.timestamps import (FixTimestamp)
+
+
+ledger_classes = pytest.mark.parametrize("ledger_cls", [AssetLedger, ColumnarAssetLedger])
+
+
+def _fill(book, trade_id, side, qty, price, ticker="MSFT"):
+	book.log_transaction(Trade(trade_id, FixTimestamp.now(), ticker, side, qty, price))
+
+
+def _pnl_state(book):
+	return (book.get_book_realized_pnl(), book.get_book_unrealized_pnl(),
+			book.get_book_unrealized_pnl({"MSFT": 130.0}), book.get_ledger_positions())
+
+
+@ledger_classes
+def test_snapshot_recovers_fifo_state(tmp_path, ledger_cls):
+	path = str(tmp_path / "book.journal")
+	journal = BookJournal(path)
+	book = TradingBook("book", ["MSFT"], ledger_cls=ledger_cls, journal=journal)
+	# Partial fills of A on both sides of B's fill
+	_fill(book, "A", fix.Side_BUY, 5, 100.0)
+	_fill(book, "B", fix.Side_SELL, 5, 110.0)
+	_fill(book, "A", fix.Side_BUY, 5, 120.0)
+	live = _pnl_state(book)
+	assert live[0] == 50.0
+	assert live[3] == {"MSFT": (5, 120.0)}
+
+	journal.snapshot()
+	journal.close()
+	recovered = TradingBook("book", ["MSFT"], ledger_cls=ledger_cls, journal=BookJournal(path))
+	assert _pnl_state(recovered) == live
+	recovered.journal.close()
+
+
+def test_remove_trade_matches_across_ledgers():
+	books = [TradingBook("book", ["MSFT"], ledger_cls=ledger_cls) for ledger_cls in (AssetLedger, ColumnarAssetLedger)]
+	for book in books:
+		_fill(book, "A", fix.Side_BUY, 5, 100.0)
+		_fill(book, "B", fix.Side_SELL, 5, 110.0)
+		_fill(book, "C", fix.Side_BUY, 5, 90.0)
+		_fill(book, "A", fix.Side_BUY, 5, 120.0)
+		_fill(book, "D", fix.Side_SELL, 5, 125.0)
+		book.erase_transaction(Trade("C", FixTimestamp.now(), "MSFT", fix.Side_BUY, 5, 90.0))
+	states = [_pnl_state(book) for book in books]
+	# Without C, B closes A's first fill at 100 and D closes A's second fill at 120
+	assert states[0][0] == 75.0
+	assert states[0] == states[1]
+
+
+def test_refused_transactions_leave_book_and_risk_consistent(tmp_path):
+	ticker = "X" * 17	# Longer than the journal's ticker field
+	journal = BookJournal(str(tmp_path / "book.journal"))
+	book = TradingBook("book", [ticker], journal=journal)
+	risk = PositionEngine()
+	book_callbacks = {"add": book.log_transaction, "remove": book.erase_transaction,
+					  "update": book.update_transaction, "add_batch": book.log_orders}
+	handlers = chain_handlers(book_callbacks, risk.callbacks())
+
+	order = Order(ticker, fix.Side_BUY, 10, fix.OrdType_LIMIT, fix.SecurityType_COMMON_STOCK, 100.0)
+	order.id = "order-1"
+	order.timestamp = FixTimestamp.now()
+	assert risk.check(order) is None
+	with pytest.raises(ValueError):
+		handlers["add"](order)
+	with pytest.raises(ValueError):
+		handlers["add_batch"]([order])
+	handlers["update"](OrderUpdateEvent(order.id, FixTimestamp.now(), 4, 100.0, fix.OrdStatus_PARTIALLY_FILLED, ticker, fix.Side_BUY))
+	with pytest.raises(ValueError):
+		handlers["add"](Trade(order.id, FixTimestamp.now(), ticker, fix.Side_BUY, 10, 100.0))
+	handlers["remove"](OrderUpdateEvent(order.id, FixTimestamp.now(), 10, 100.0, fix.OrdStatus_FILLED, ticker, fix.Side_BUY))
+
+	ledger = book.ledgers[ticker]
+	assert not ledger.orders and not ledger.trades
+	assert book.count_open_orders() == 0 and book.locate_order(order.id) is None
+	assert ledger.calc_position() == 0
+	assert journal._seq == 0 and not journal._pending
+	# The removal reached the position engine, which released the order's exposure
+	assert risk.summary()["positions"][ticker] == (0.0, 0.0, 0.0, 0.0)
+	assert not risk._reserved and not risk._orders
+	journal.close()
+
+
+def test_snapshot_written_by_sync_thread(tmp_path):
+	path = str(tmp_path / "book.journal")
+	journal = BookJournal(path, sync_interval=60, snapshot_interval=4)
+	book = TradingBook("book", ["MSFT"], journal=journal)
+	for i in range(10):
+		_fill(book, "T{}".format(i % 4), fix.Side_BUY if i % 2 else fix.Side_SELL, 1, 100.0 + i)
+	# The writer only queued the snapshots
+	assert not (tmp_path / "book.journal.snap").exists()
+	live = _pnl_state(book)
+	journal.close()
+	# Two snapshots of 4 records, the last 2 records follow the latest in the journal
+	assert journal.synced == 2
+	assert (tmp_path / "book.journal").stat().st_size == 2 * RECORD_SIZE
+	recovered = TradingBook("book", ["MSFT"], journal=BookJournal(path))
+	assert _pnl_state(recovered) == live
+	recovered.journal.close()